@@ -1,6 +1,6 @@
 import logging
 import uuid
-from typing import List
+from typing import List, Tuple
 
 from geoalchemy2 import Geometry, WKBElement, WKTElement
 from sqlalchemy import Column, Enum, String, Date, ARRAY, Boolean, ForeignKey, event, func
@@ -160,36 +160,55 @@ class BP_Plan(XP_Plan):
         symbol.appendSymbolLayer(border)
         return QgsSingleSymbolRenderer(symbol)
 
-    def enforceFlaechenschluss(self):
-        from SAGisXPlanung.BPlan.BP_Sonstiges.feature_types import BP_FlaecheOhneFestsetzung
-
-        geltungsbereich_geom = self.geometry()
-        results = []
+    def enforceFlaechenschluss(self) -> Tuple[List[XPlanungItem], List[XPlanungItem]]:
+        """
+        Füllt die nicht von Flächenschlussobjekten abgedeckten Flächen jedes Bereichs mit einer
+        BP_FlaecheOhneFestsetzung. Vorhandene Flächen ohne Festsetzung werden angepasst, in vollständig abgedeckten
+        Bereichen werden sie gelöscht.
 
-        for bereich in self.bereich:  # type: BP_Bereich
-            # 1. build union of all flaechenschluss objects (without BP_FlaecheOhneFestsetzung)
-            flaechenschluss_geoms = [p.geometry() for p in bereich.planinhalt
-                                     if p.flaechenschluss and not isinstance(p, BP_FlaecheOhneFestsetzung)]
-            combined = QgsGeometry.unaryUnion(flaechenschluss_geoms)
+        Die Lücken werden für alle Bereiche gemeinsam in der Datenbank berechnet, die Geometrien der Planinhalte
+        werden nicht geladen.
 
-            # fill difference of 1. and Geltungsbereich with BP_FlaecheOhneFestsetzung
-            diff = geltungsbereich_geom.difference(combined)
+        Returns
+        -------
+        List[XPlanungItem], List[XPlanungItem]:
+            neue oder angepasste Flächen ohne Festsetzung, gelöschte Flächen ohne Festsetzung
+        """
+        from SAGisXPlanung.BPlan.BP_Sonstiges.feature_types import BP_FlaecheOhneFestsetzung
+        from SAGisXPlanung.core.flaechenschluss import uncovered_areas
+
+        session = object_session(self)
+        areas = uncovered_areas(session, self.__class__, self.id,
+                                exclude_types=[BP_FlaecheOhneFestsetzung.__mapper__.polymorphic_identity])
+
+        # query the existing areas directly, loading `bereich.planinhalt` would load all plan contents
+        bereich_ids = [bereich.id for bereich in self.bereich]
+        existing_areas = {}
+        deleted = []
+        for fl in session.query(BP_FlaecheOhneFestsetzung).filter(
+                BP_FlaecheOhneFestsetzung.gehoertZuBereich_id.in_(bereich_ids)):
+            # one area per bereich is reused for the remaining gap, all others would overlap it or cover nothing
+            if fl.gehoertZuBereich_id in areas and fl.gehoertZuBereich_id not in existing_areas:
+                existing_areas[fl.gehoertZuBereich_id] = fl
+                continue
+            session.delete(fl)
+            deleted.append(XPlanungItem(xtype=fl.__class__, xid=str(fl.id), parent_xid=str(fl.gehoertZuBereich_id)))
 
-            areas_without_usage = [p for p in bereich.planinhalt if p.type == 'bp_flaeche_ohne_festsetzung']
-            if areas_without_usage:
-                fl = areas_without_usage[0]
-                fl.setGeometry(diff, srid=QgsProject.instance().crs().postgisSrid())
-            else:
+        results = []
+        for bereich_id, geom in areas.items():
+            fl = existing_areas.get(bereich_id)
+            if fl is None:
                 fl = BP_FlaecheOhneFestsetzung()
                 fl.id = uuid.uuid4()
                 fl.flaechenschluss = True
                 fl.rechtscharakter = BP_Rechtscharakter.Unbekannt
-                fl.setGeometry(diff, srid=QgsProject.instance().crs().postgisSrid())
-                bereich.planinhalt.append(fl)
+                fl.gehoertZuBereich_id = bereich_id
+                session.add(fl)
+            fl.position = geom
 
-            results.append(XPlanungItem(xtype=fl.__class__, xid=str(fl.id), parent_xid=str(bereich.id)))
+            results.append(XPlanungItem(xtype=fl.__class__, xid=str(fl.id), parent_xid=str(bereich_id)))
 
-        return results
+        return results, deleted
 
 
 @event.listens_for(BP_Plan, 'before_insert')
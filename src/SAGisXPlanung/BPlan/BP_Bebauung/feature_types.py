@@ -189,6 +189,11 @@ class BP_BaugebietsTeilFlaeche(PolygonGeometry, FlaechenschlussObjekt, BP_Objekt
         self.xplan_item.plan_xid = str(plan_xid)
         super(BP_BaugebietsTeilFlaeche, self).toCanvas(layer_group, plan_xid)
 
+    @classmethod
+    def supportsDatabaseLayer(cls) -> bool:
+        # usage templates are placed while the features are created in `asFeature`
+        return False
+
     def asFeature(self, fields=None):
         feat = super(BP_BaugebietsTeilFlaeche, self).asFeature(fields)
 
@@ -1,16 +1,18 @@
 import datetime
 import logging
-import inspect
+from functools import lru_cache
+from typing import Callable
 
 from geoalchemy2 import Geometry, WKTElement
 from lxml import etree
 from osgeo import ogr
 from sqlalchemy import ARRAY
 
-from SAGisXPlanung import Base, XPlanVersion
+from SAGisXPlanung import XPlanVersion
+from SAGisXPlanung.GML.schema import XPlanSchema
 from SAGisXPlanung.XPlan.XP_Praesentationsobjekte.feature_types import XP_Nutzungsschablone
 from SAGisXPlanung.XPlan.types import RefURL
-from SAGisXPlanung.utils import CLASSES, query_existing, PRE_FILLED_CLASSES, OBJECT_BASE_TYPES
+from SAGisXPlanung.utils import CLASSES, query_existing, PRE_FILLED_CLASSES, OBJECT_BASE_TYPES, PreFilledObjectCache
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +29,7 @@ class GMLReader:
 
         self.warnings = []
         self.files = files if files else {}
+        self.pre_filled_cache = PreFilledObjectCache()
 
         parser = etree.XMLParser(remove_blank_text=True)
         self.root = etree.fromstring(gml, parser=parser)
@@ -36,6 +39,9 @@ class GMLReader:
         self.nsmap.pop(None, None)
         self.import_version = XPlanVersion.from_namespace(self.nsmap['xplan'])
 
+        # gml:id -> element, so that xlinks can be resolved without scanning the whole document
+        self.id_index = self.build_id_index()
+
         self.object_count = int(self.root.xpath("count(//gml:featureMember)", namespaces=self.nsmap))
         self.progress_callback = progress_callback
         self.current_progress = 0
@@ -46,6 +52,17 @@ class GMLReader:
         self.type = CLASSES[type_name]
         self.plan = self.read_xp_object(plan_element)
 
+    def build_id_index(self) -> dict:
+        """ Erstellt in einem Durchlauf über das Dokument ein Verzeichnis aller Knoten mit gml:id """
+        id_attr = f"{{{self.nsmap['gml']}}}id"
+        index = {}
+        for element in self.root.iter(etree.Element):
+            gml_id = element.get(id_attr)
+            if gml_id is not None:
+                # keep first occurrence if an id is not unique within the document
+                index.setdefault(gml_id, element)
+        return index
+
     def setProgress(self, progress):
         if not self.progress_callback:
             return
@@ -104,40 +121,24 @@ class GMLReader:
         obj_id = gml.xpath('@gml:id', namespaces=self.nsmap)[0]
         obj.id = obj_id[obj_id.find('_') + 1:]
 
+        schema = XPlanSchema.of(object_type, self.import_version)
         for node in gml.iterchildren():
-            node_name = etree.QName(node).localname
-            if not hasattr(obj, node_name):
-                continue
-            if node_name in ['gehoertZuBereich', 'praesentationsobjekt', 'dientZurDarstellungVon', 'boundedBy',
-                             'gehoertZuPlan']:
+            node_schema = schema.node(etree.QName(node).localname)
+            if node_schema is None:
                 continue
+            node_name = node_schema.attr
 
-            col = getattr(object_type, node_name)
-
-            if hasattr(col, 'import_attr') and col.import_attr is not None:
-                node_name = col.import_attr(self.import_version)
-
-            if node_name in [r[0] for r in obj.relationships()]:
+            if node_schema.is_relation:
                 # find node content if relationship is not immediately child but instead linked via xlink
                 if len(node) == 0:
                     xlink_refs = node.xpath('@xlink:href', namespaces=self.nsmap)
                     if not xlink_refs:
                         continue
                     linked_node_id = str(xlink_refs[0]).lstrip('#')
-                    linked_node = self.root.xpath(f"(//*[@gml:id='{linked_node_id}'])[1]", namespaces=self.nsmap)
-                    if not linked_node:
-                        self.warnings.append(f'xlink verweist auf ein Objekt, das nicht in der XPlanGML-Datei'
-                                             f' vorliegt. (ID: {linked_node_id}, Zeile: {node.sourceline})')
-                        continue
-
-                    node.append(linked_node[0])
-                    value = self.read_xp_object(linked_node[0])
+                    value = self.read_linked_object(obj, node_name, node, linked_node_id)
 
                     if isinstance(value, XP_Nutzungsschablone):
-                        value.hidden = False
-                        if value.zeilenAnz is not None:
-                            value.set_defaults(int(value.zeilenAnz))
-                        getattr(obj, node_name).append(value)
+                        self.add_template(obj, node_name, value)
                         continue
                 else:
                     value = self.read_data_object(node[0], files=self.files)
@@ -146,68 +147,91 @@ class GMLReader:
                 if value is None:
                     continue
 
-                pre_classes = [*PRE_FILLED_CLASSES]
-                if value.__class__ in pre_classes:
-                    obj_from_db = query_existing(value)
-                    value = obj_from_db if obj_from_db is not None else value
-                    if obj_from_db is not None and hasattr(obj, f'{node_name}_id'):
-                        # object could already be in session from previous loops, therefore store only id if possible
-                        node_name = f'{node_name}_id'
-                        value = obj_from_db.id
-                if (a := getattr(obj, node_name)) is not None:
-                    a.append(value)
-                else:
-                    setattr(obj, node_name, value)
+                self.set_relation(obj, node_name, value)
 
                 gml.remove(node)
                 del node
                 continue
 
-            # edge case where same named column exists in base class which should be used
-            if not obj.__class__.attr_fits_version(node_name, self.import_version):
-                base_classes = [c for c in list(inspect.getmro(obj.__class__)) if issubclass(c, Base)]
-                cls = next(c for c in reversed(base_classes) if hasattr(c, node_name))
-                col_type = getattr(cls, node_name).property.columns[0].type
-            else:
-                col_type = getattr(obj.__class__, node_name).property.columns[0].type
-
-            GMLReader.read_attribute(col_type, node_name, obj, node)
+            GMLReader.read_attribute(node_schema.col_type, node_name, obj, node)
 
         self.setProgress(self.current_progress + 1)
         return obj
 
-    @staticmethod
-    def read_attribute(col_type, node_name, obj, node):
-        if isinstance(col_type, Geometry):
-            value = GMLReader.readGeometry(node[0])
-            if value is None:
-                return
-            setattr(obj, node_name, value)
+    def read_linked_object(self, obj, node_name: str, node, linked_node_id: str):
+        """
+        Liest das über xlink referenzierte Objekt eines Relationsknotens ein.
+
+        Parameters
+        ----------
+        obj:
+            XPlanung-Objekt, das die Relation besitzt
+        node_name: str
+            Name der Relation
+        node: lxml.etree.Element
+            Relationsknoten ohne Inhalt, der über xlink auf ein anderes Objekt verweist
+        linked_node_id: str
+            gml:id des referenzierten Objekts
+
+        Returns
+        -------
+        any:
+            ORM-Objekt des referenzierten Knotens oder None, wenn das Objekt nicht gelesen werden konnte
+        """
+        linked_node = self.id_index.get(linked_node_id)
+        if linked_node is None:
+            self.warnings.append(f'xlink verweist auf ein Objekt, das nicht in der XPlanGML-Datei'
+                                 f' vorliegt. (ID: {linked_node_id}, Zeile: {node.sourceline})')
             return
 
-        value = node.text
-        if hasattr(col_type, 'enums'):
-            try:
-                if col_type.enum_class is not None:
-                    value = col_type.enum_class(int(value))
-                setattr(obj, node_name, value)
-            except ValueError:
-                setattr(obj, node_name, col_type.enum_class(value))
-        elif col_type.python_type == bool:
-            setattr(obj, node_name, str(value).lower() == 'true')
-        elif isinstance(col_type, ARRAY) and hasattr(col_type.item_type, 'enums'):
-            try:
-                value = col_type.item_type.enum_class(int(value))
-                getattr(obj, node_name).append(value)
-            except Exception as e:
-                setattr(obj, node_name, [value])
-        elif col_type.python_type == datetime.date:
-            setattr(obj, node_name, datetime.datetime.strptime(value, '%Y-%m-%d'))
-        elif col_type.python_type == list and col_type.item_type.python_type == datetime.date:
-            getattr(obj, node_name).append(datetime.datetime.strptime(value, '%Y-%m-%d'))
+        node.append(linked_node)
+        return self.read_xp_object(linked_node)
+
+    @staticmethod
+    def add_template(obj, node_name: str, template: XP_Nutzungsschablone):
+        """ Fügt eine importierte Nutzungsschablone zur Relation eines XPlanung-Objekts hinzu """
+        template.hidden = False
+        if template.zeilenAnz is not None:
+            template.set_defaults(int(template.zeilenAnz))
+        getattr(obj, node_name).append(template)
+
+    def set_relation(self, obj, node_name: str, value):
+        """ Setzt den Wert einer Relation, bereits in der Datenbank vorhandene Objekte werden wiederverwendet """
+        pre_classes = [*PRE_FILLED_CLASSES]
+        if value.__class__ in pre_classes:
+            obj_from_db = query_existing(value, self.pre_filled_cache)
+            value = obj_from_db if obj_from_db is not None else value
+            if obj_from_db is not None and hasattr(obj, f'{node_name}_id'):
+                # object could already be in session from previous loops, therefore store only id if possible
+                node_name = f'{node_name}_id'
+                value = obj_from_db.id
+        if (a := getattr(obj, node_name)) is not None:
+            a.append(value)
         else:
             setattr(obj, node_name, value)
 
+    @staticmethod
+    def read_attribute(col_type, node_name, obj, node):
+        GMLReader.attribute_reader(col_type)(col_type, node_name, obj, node)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def attribute_reader(col_type) -> Callable:
+        """ Wählt einmalig je Spaltentyp die Funktion, mit der ein Knotenwert in das Attribut übernommen wird """
+        if isinstance(col_type, Geometry):
+            return _read_geometry
+        if hasattr(col_type, 'enums'):
+            return _read_enum
+        if col_type.python_type == bool:
+            return _read_bool
+        if isinstance(col_type, ARRAY) and hasattr(col_type.item_type, 'enums'):
+            return _read_enum_array
+        if col_type.python_type == datetime.date:
+            return _read_date
+        if col_type.python_type == list and col_type.item_type.python_type == datetime.date:
+            return _read_date_array
+        return _read_text
+
     @staticmethod
     def read_data_object(gml, files=None, only_attributes=False):
         """
@@ -237,20 +261,199 @@ class GMLReader:
             return object_type.from_xplan_node(gml)
 
         obj = object_type()
+        schema = XPlanSchema.of(object_type)
         for node in gml.iterchildren():
             node_name = etree.QName(node).localname
             value = node.text
 
-            if hasattr(obj, node_name):
-                try:
-                    col_type = getattr(object_type, node_name).property.columns[0].type
-                except AttributeError as e:
-                    # continue when property is not a column (but a relation instead)
-                    # this fail check is a lot faster than doing a lookup whether attr is in relationship properties
-                    continue
-                GMLReader.read_attribute(col_type, node_name, obj, node)
+            # skip attributes which are not present or are not a column (but a relation instead)
+            col_type = schema.column_type(node_name)
+            if col_type is None:
+                continue
+            GMLReader.read_attribute(col_type, node_name, obj, node)
 
-                if isinstance(col_type, RefURL) and hasattr(obj, 'file') and value in files:
-                    setattr(obj, 'file', files[value])
+            if isinstance(col_type, RefURL) and hasattr(obj, 'file') and value in files:
+                setattr(obj, 'file', files[value])
 
         return obj
+
+
+def _read_geometry(col_type, node_name, obj, node):
+    value = GMLReader.readGeometry(node[0])
+    if value is None:
+        return
+    setattr(obj, node_name, value)
+
+
+def _read_enum(col_type, node_name, obj, node):
+    value = node.text
+    try:
+        if col_type.enum_class is not None:
+            value = col_type.enum_class(int(value))
+        setattr(obj, node_name, value)
+    except ValueError:
+        setattr(obj, node_name, col_type.enum_class(value))
+
+
+def _read_bool(col_type, node_name, obj, node):
+    setattr(obj, node_name, str(node.text).lower() == 'true')
+
+
+def _read_enum_array(col_type, node_name, obj, node):
+    value = node.text
+    try:
+        value = col_type.item_type.enum_class(int(value))
+        getattr(obj, node_name).append(value)
+    except Exception as e:
+        setattr(obj, node_name, [value])
+
+
+def _read_date(col_type, node_name, obj, node):
+    setattr(obj, node_name, datetime.datetime.strptime(node.text, '%Y-%m-%d'))
+
+
+def _read_date_array(col_type, node_name, obj, node):
+    getattr(obj, node_name).append(datetime.datetime.strptime(node.text, '%Y-%m-%d'))
+
+
+def _read_text(col_type, node_name, obj, node):
+    setattr(obj, node_name, node.text)
+
+
+class GMLStreamReader(GMLReader):
+    """
+    Speicherschonende Variante des GMLReader für sehr große XPlanGML-Dokumente.
+    Das Dokument wird mit `lxml.etree.iterparse` featureMember für featureMember eingelesen, bereits verarbeitete
+    Knoten werden sofort verworfen. Verweise über xlink werden erst in einem zweiten Durchlauf über die bereits
+    erstellten Objekte aufgelöst, sodass zu keinem Zeitpunkt das gesamte Dokument im Speicher gehalten wird.
+    Das XP_Plan-Objekt kann über das Attribut 'plan' abgerufen werden.
+    """
+
+    def __init__(self, source, files=None, progress_callback=None):
+        """
+        Parameters
+        ----------
+        source: str | typing.BinaryIO
+            Dateipfad oder (zurückspulbares) Dateiobjekt des XPlanGML-Dokuments
+        files: dict
+            Dictionary aus Dateiname und Datei
+        progress_callback: Callable[[Tuple[int, int]], None]
+            Callback, der über den Fortschritt des Imports informiert wird
+        """
+        self.warnings = []
+        self.files = files if files else {}
+        self.pre_filled_cache = PreFilledObjectCache()
+
+        self.root = None
+        self.nsmap = None
+        self.import_version = None
+        self.plan = None
+
+        # gml:id -> bereits eingelesenes Objekt
+        self._features = {}
+        # (Objekt, Relation, gml:id des verlinkten Objekts, Zeile) aller noch nicht aufgelösten xlinks
+        self._pending_links = []
+
+        self.object_count = self.count_features(source)
+        self.progress_callback = progress_callback
+        self.current_progress = 0
+        self.setProgress(0)
+
+        self.rewind(source)
+        for depth, element in self.iter_features(source, remove_blank_text=True):
+            if depth == 0:
+                self.read_document_info(element)
+                continue
+
+            # features are usually wrapped in gml:featureMember but might also be direct children of the root element
+            feature = element[0] if etree.QName(element).localname == 'featureMember' else element
+            if len(element):
+                self.read_feature(feature)
+
+            self.release(element)
+
+        if self.plan is None:
+            raise ValueError('XPlanGML-Dokument enthält keinen Plan.')
+
+        self.resolve_links()
+
+    @staticmethod
+    def rewind(source):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+    @staticmethod
+    def iter_features(source, **kwargs):
+        """
+        Iteriert über das Wurzelelement (Tiefe 0) und alle vollständig eingelesenen Objekte (Tiefe 1) eines
+        XPlanGML-Dokuments. Der umschließende gml:boundedBy-Knoten des Dokuments wird übersprungen.
+        """
+        depth = 0
+        for event, element in etree.iterparse(source, events=('start', 'end'), **kwargs):
+            if event == 'start':
+                if depth == 0:
+                    yield depth, element
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth == 1 and etree.QName(element).localname != 'boundedBy':
+                yield depth, element
+
+    @staticmethod
+    def release(element):
+        """ Gibt einen verarbeiteten Knoten und alle bereits verarbeiteten Geschwisterknoten frei """
+        element.clear(keep_tail=True)
+        while (previous := element.getprevious()) is not None and etree.QName(previous).localname != 'boundedBy':
+            previous.getparent().remove(previous)
+
+    @staticmethod
+    def count_features(source) -> int:
+        """ Zählt die Objekte eines XPlanGML-Dokuments, ohne das Dokument vollständig zu laden """
+        count = 0
+        for depth, element in GMLStreamReader.iter_features(source):
+            if depth == 0:
+                continue
+            count += 1
+            GMLStreamReader.release(element)
+        return count
+
+    def read_document_info(self, root):
+        self.root = root
+        self.nsmap = dict(root.nsmap)
+        # remove the None entry (top level namespace) if it exists - xpath does not allow it in the namespace map
+        self.nsmap.pop(None, None)
+        self.import_version = XPlanVersion.from_namespace(self.nsmap['xplan'])
+
+    def read_feature(self, gml):
+        obj = self.read_xp_object(gml)
+        if obj is None:
+            return
+
+        gml_id = gml.xpath('@gml:id', namespaces=self.nsmap)[0]
+        self._features[gml_id] = obj
+
+        if self.plan is None and '_Plan' in etree.QName(gml).localname:
+            self.plan = obj
+
+    def read_linked_object(self, obj, node_name: str, node, linked_node_id: str):
+        # linked feature might not have been read yet, therefore defer resolution until the whole document is read
+        self._pending_links.append((obj, node_name, linked_node_id, node.sourceline))
+
+    def resolve_links(self):
+        """ Löst alle xlink-Verweise zwischen den eingelesenen Objekten auf """
+        for obj, node_name, linked_node_id, line in self._pending_links:
+            value = self._features.get(linked_node_id)
+            if value is None:
+                self.warnings.append(f'xlink verweist auf ein Objekt, das nicht in der XPlanGML-Datei'
+                                     f' vorliegt. (ID: {linked_node_id}, Zeile: {line})')
+                continue
+
+            if isinstance(value, XP_Nutzungsschablone):
+                self.add_template(obj, node_name, value)
+                continue
+
+            self.set_relation(obj, node_name, value)
+
+        self._pending_links.clear()
+        self._features.clear()
@@ -1,16 +1,23 @@
 import logging
+import os
+import threading
+from contextlib import contextmanager
 from enum import Enum
 from io import BytesIO
 from pathlib import PurePath
+from typing import Dict, Iterator, List, Tuple, Optional
 from uuid import uuid4
 from zipfile import ZipFile
 
 from lxml import etree
 from geoalchemy2 import WKBElement, WKTElement
 from osgeo import ogr, osr
+from sqlalchemy import inspect
+from sqlalchemy.orm import object_session
 
 from SAGisXPlanung import XPlanVersion
-from SAGisXPlanung.GML.geometry import enforce_wkb_constraints
+from SAGisXPlanung.GML.geometry import ewkb_to_wkb, encode_geometries, EncodedGeometry
+from SAGisXPlanung.GML.schema import XPlanSchema
 from SAGisXPlanung.XPlan.XP_Praesentationsobjekte.feature_types import XP_AbstraktesPraesentationsobjekt, \
     XP_Nutzungsschablone
 from SAGisXPlanung.XPlan.data_types import XP_ExterneReferenz
@@ -39,21 +46,43 @@ class GMLWriter:
         XPlanVersion.SIX: "http://www.xplanung.de/xplangml/6/0"
     }
 
-    def __init__(self, plan: XP_Plan, version=XPlanVersion.FIVE_THREE, root_tag=None):
+    def __init__(self, plan: XP_Plan, version=XPlanVersion.FIVE_THREE, root_tag=None, server_side_geometries=False):
 
         self.files = {}
+        self.server_side_geometries = server_side_geometries
         self.version = version
-        self.nsmap['xplan'] = self.version_urls[version]
-
-        self.root = etree.Element(root_tag if root_tag else f"{{{self.nsmap['xplan']}}}XPlanAuszug",
-                                  {f"{{{self.nsmap['gml']}}}id": f"GML_{uuid4()}"}, nsmap=self.nsmap)
+        # copy instead of mutating the class attribute, writers for different versions may run concurrently
+        self.nsmap = {**GMLWriter.nsmap, 'xplan': self.version_urls[version]}
+        self.root_tag = root_tag if root_tag else f"{{{self.nsmap['xplan']}}}XPlanAuszug"
 
         self.plan_name = plan.name
 
-        self.root.append(self.writeEnvelope(plan.raeumlicherGeltungsbereich))
-        self.root.append(self.writePlan(plan))
+        self._spatial_references = {}
+        self._ogr_geometry = None
+        self._encoded_geometries = {}
+
+        self.root = self.build(plan)
+
+    def build(self, plan: XP_Plan) -> etree.Element:
+        """ Erstellt den vollständigen XPlanGML-Baum des Plans """
+        root = etree.Element(self.root_tag, {f"{{{self.nsmap['gml']}}}id": f"GML_{uuid4()}"}, nsmap=self.nsmap)
+        for feature in self.writeFeatures(plan):
+            root.append(feature)
+        return root
+
+    def writeFeatures(self, plan: XP_Plan) -> Iterator[etree.Element]:
+        """
+        Erzeugt nacheinander alle Kindknoten des Wurzelelements: die Ausdehnung des Plans gefolgt von den
+        featureMember-Knoten des Plans und seiner Bereiche.
+        """
+        if self.server_side_geometries:
+            self.prefetchGeometries([(plan, 'raeumlicherGeltungsbereich')] +
+                                    [(b, 'geltungsbereich') for b in plan.bereich])
+
+        yield self.writeEnvelope(plan.raeumlicherGeltungsbereich)
+        yield self.writePlan(plan)
         for b in plan.bereich:
-            self.root.append(self.writeXPBereich(b))
+            yield self.writeXPBereich(b)
 
     def toGML(self) -> bytes:
         xml = etree.tostring(self.root, pretty_print=True, xml_declaration=True, encoding='UTF-8', standalone=True)
@@ -62,23 +91,69 @@ class GMLWriter:
     def toArchive(self) -> BytesIO:
         zip_buffer = BytesIO()
         with ZipFile(zip_buffer, mode='w') as zip_file:
-            for elm in self.root.findall(".//xplan:referenzURL", namespaces=self.root.nsmap):
-                if not is_url(elm.text):
-                    if elm.text not in self.files:
-                        raise ValueError(f'Datei {elm.text} konnte nicht gefunden werden')
-
-                    from qgis.PyQt.QtCore import QSettings
-                    qs = QSettings()
-                    path_prefix = qs.value(f"plugins/xplanung/export_path", '')
-                    file = self.files[elm.text]
-                    elm.text = f'{path_prefix}{PurePath(elm.text).name}'
-                    zip_file.writestr(elm.text, file)
+            for file_name, file in self.collectReferences(self.root).items():
+                zip_file.writestr(file_name, file)
 
-            file_name = self.plan_name.replace("/", "-").replace('"', '\'')
-            zip_file.writestr(f"{file_name}.gml", self.toGML())
+            zip_file.writestr(f"{export_file_name(self.plan_name)}.gml", self.toGML())
 
         return zip_buffer
 
+    def collectReferences(self, node: etree.Element) -> Dict[str, bytes]:
+        """
+        Ersetzt alle lokalen Dateiverweise (referenzURL) unterhalb des Knotens durch ihren Pfad im ZIP-Archiv.
+
+        Returns
+        -------
+        dict:
+            Dateiinhalte der referenzierten Dateien mit ihrem Pfad im Archiv als Schlüssel
+        """
+        references = {}
+        for elm in node.iterfind(".//xplan:referenzURL", namespaces=self.nsmap):
+            if is_url(elm.text):
+                continue
+            if elm.text not in self.files:
+                raise ValueError(f'Datei {elm.text} konnte nicht gefunden werden')
+
+            from qgis.PyQt.QtCore import QSettings
+            qs = QSettings()
+            path_prefix = qs.value(f"plugins/xplanung/export_path", '')
+            file = self.files[elm.text]
+            elm.text = f'{path_prefix}{PurePath(elm.text).name}'
+            references[elm.text] = file
+        return references
+
+    def prefetchGeometries(self, objects: List[Tuple[object, str]]):
+        """
+        Lässt die Geometrien der übergebenen Objekte in einer Abfrage von PostGIS als GML kodieren. Beim Schreiben
+        werden dann die GML-Fragmente und Ausdehnungen aus der Datenbank übernommen, anstatt jede Geometrie mit OGR
+        umzuwandeln. Ungespeicherte Objekte und Geometrien mit ungespeicherten Änderungen werden übersprungen.
+
+        Parameters
+        ----------
+        objects: list
+            Liste aus Tupeln von XPlanung-Objekt und Name des Geometrieattributs
+        """
+        session = object_session(objects[0][0]) if objects else None
+        if session is None:
+            return
+
+        objects = [(obj, attr) for obj, attr in objects
+                   if obj.id is not None and not inspect(obj).attrs[attr].history.has_changes()]
+        encoded = encode_geometries(session.connection(), objects)
+
+        for obj, attr in objects:
+            geom = getattr(obj, attr)
+            encoded_geometry = encoded.get((str(obj.id), attr))
+            if geom is not None and encoded_geometry is not None:
+                # keep a reference to the element, so that its id can not be reused while the writer is alive
+                self._encoded_geometries[id(geom)] = (geom, encoded_geometry)
+
+    def encodedGeometry(self, geom) -> Optional[EncodedGeometry]:
+        """ Gibt die in der Datenbank kodierte Geometrie zurück, falls diese vorab abgefragt wurde """
+        entry = self._encoded_geometries.get(id(geom))
+        if entry is not None and entry[0] is geom:
+            return entry[1]
+
     def writeEnvelope(self, geom: WKBElement) -> etree.Element:
         """
         Erstellt einen boundedBy GML-Knoten aus einer beliebigen Geometrie
@@ -96,15 +171,9 @@ class GMLWriter:
         """
         srs = f'EPSG:{geom.srid}'
 
-        if isinstance(geom, WKBElement):
-            wkb_hex = enforce_wkb_constraints(geom.data.hex())
-            ogr_geom = ogr.CreateGeometryFromWkb(bytes.fromhex(wkb_hex))
-        elif isinstance(geom, WKTElement):
-            ogr_geom = ogr.CreateGeometryFromWkt(geom.data)
-        else:
-            raise AttributeError('unexpected geometry type')
-        bounds = ogr_geom.GetEnvelope()
-        boundedBy = etree.Element(f"{{{self.nsmap['gml']}}}boundedBy")
+        encoded = self.encodedGeometry(geom)
+        bounds = encoded.bounds if encoded is not None else self.ogrGeometry(geom).GetEnvelope()
+        boundedBy = etree.Element(f"{{{self.nsmap['gml']}}}boundedBy", nsmap=self.nsmap)
         envelope = etree.SubElement(boundedBy, f"{{{self.nsmap['gml']}}}Envelope", {"srsName": srs})
         etree.SubElement(envelope, f"{{{self.nsmap['gml']}}}lowerCorner").text = str(bounds[0]) + ' ' + str(bounds[2])
         etree.SubElement(envelope, f"{{{self.nsmap['gml']}}}upperCorner").text = str(bounds[1]) + ' ' + str(bounds[3])
@@ -130,9 +199,7 @@ class GMLWriter:
                                  {f"{{{self.nsmap['gml']}}}id": f"GML_{plan.id}"})
         xplan.append(self.writeEnvelope(plan.raeumlicherGeltungsbereich))
 
-        elements = plan.__class__.element_order(version=self.version)
-        rels = plan.relationships()
-        for attr in elements:
+        for attr in XPlanSchema.of(plan.__class__, self.version).element_order:
             value = getattr(plan, attr)
             if value is None:
                 continue
@@ -174,6 +241,34 @@ class GMLWriter:
 
         return feature
 
+    def ogrGeometry(self, geom) -> ogr.Geometry:
+        """
+        Wandelt eine Geometrie in eine OGR-Geometrie um. Die zuletzt umgewandelte Geometrie wird vorgehalten, da
+        boundedBy-Knoten und GML-Geometrie eines Objekts direkt nacheinander aus derselben Geometrie erzeugt werden.
+        """
+        if self._ogr_geometry is not None and self._ogr_geometry[0] is geom:
+            return self._ogr_geometry[1]
+
+        if isinstance(geom, WKBElement):
+            ogr_geom = ogr.CreateGeometryFromWkb(ewkb_to_wkb(geom.data))
+        elif isinstance(geom, WKTElement):
+            ogr_geom = ogr.CreateGeometryFromWkt(geom.data)
+        else:
+            raise AttributeError('unexpected geometry type')
+
+        self._ogr_geometry = (geom, ogr_geom)
+        return ogr_geom
+
+    def spatialReference(self, srid: int) -> osr.SpatialReference:
+        """ Gibt das Koordinatenreferenzsystem zu einer SRID zurück, ImportFromEPSG erfolgt je SRID nur einmal """
+        # kept per writer instead of module wide, OSR objects must not be shared between export threads
+        try:
+            return self._spatial_references[srid]
+        except KeyError:
+            srs = self._spatial_references[srid] = osr.SpatialReference()
+            srs.ImportFromEPSG(srid)
+            return srs
+
     def writeGeometry(self, geom):
         """
         Erstellt einen GML-Knoten für eine beliebige Geometrie
@@ -187,17 +282,13 @@ class GMLWriter:
         lxml.etree.Element
             GML-Knoten der Geometrie
         """
-        if isinstance(geom, WKBElement):
-            wkb_hex = enforce_wkb_constraints(geom.data.hex())
-            ogr_geom = ogr.CreateGeometryFromWkb(bytes.fromhex(wkb_hex))
-        elif isinstance(geom, WKTElement):
-            ogr_geom = ogr.CreateGeometryFromWkt(geom.data)
-        else:
-            raise AttributeError('unexpected geometry type')
+        encoded = self.encodedGeometry(geom)
+        if encoded is not None and encoded.gml is not None:
+            # ST_AsGML does not declare the gml namespace prefix of the fragment
+            return parse_etree(f'<fragment xmlns:gml="{self.nsmap["gml"]}">{encoded.gml}</fragment>')[0]
 
-        srs = osr.SpatialReference()
-        srs.ImportFromEPSG(geom.srid)
-        ogr_geom.AssignSpatialReference(srs)
+        ogr_geom = self.ogrGeometry(geom)
+        ogr_geom.AssignSpatialReference(self.spatialReference(geom.srid))
 
         gml = ogr_geom.ExportToGML(options=["FORMAT=GML32", f"GMLID=GML_{uuid4()}", "GML3_LONGSRS=NO", "NAMESPACE_DECL=YES"])
         return parse_etree(gml)
@@ -261,7 +352,7 @@ class GMLWriter:
         if bereich.geltungsbereich:
             xp_bereich.append(self.writeEnvelope(bereich.geltungsbereich))
 
-        for attr in bereich.__class__.element_order(version=self.version):
+        for attr in XPlanSchema.of(bereich.__class__, self.version).element_order:
             if attr in ['praesentationsobjekt', 'simple_geometry', 'planinhalt']:
                 continue
             value = getattr(bereich, attr)
@@ -305,7 +396,7 @@ class GMLWriter:
                                  {f"{{{self.nsmap['gml']}}}id": f"GML_{obj.id}"})
         xp_po.append(self.writeEnvelope(obj.position))
 
-        for attr in obj.__class__.element_order(version=self.version):
+        for attr in XPlanSchema.of(obj.__class__, self.version).element_order:
             value = getattr(obj, attr)
             if value is None:
                 continue
@@ -330,18 +421,14 @@ class GMLWriter:
     @staticmethod
     def writeUOM(node, attr, obj):
         """ Fügt einem XML-Knoten je nach Datentyp die passende XPlanGML-Einheit als Attribut hinzu"""
-        try:
-            node.attrib['uom'] = getattr(obj.__class__, attr).property.columns[0].type.UOM
-        except:
-            pass
+        uom = XPlanSchema.of(obj.__class__).uom.get(attr)
+        if uom is not None:
+            node.attrib['uom'] = uom
 
     @staticmethod
     def write_attributes(node, xplan_object, version: XPlanVersion):
-        rels = xplan_object.relationships()
-        for attr in xplan_object.__class__.element_order(version=version):
-            # don't process any relations at this point (this method only writes direct attributes)
-            if any(attr in rel for rel in rels):
-                continue
+        # relations are not part of `attributes`, this method only writes direct attributes
+        for attr in XPlanSchema.of(xplan_object.__class__, version).attributes:
             value = getattr(xplan_object, attr)
             if value is None:
                 continue
@@ -353,6 +440,84 @@ class GMLWriter:
             GMLWriter.writeUOM(field, attr, xplan_object)
 
 
+class GMLStreamWriter(GMLWriter):
+    """
+    Schreibt ein XPlanGML-Dokument schrittweise über `lxml.etree.xmlfile`. Jeder featureMember-Knoten wird direkt
+    nach seiner Erstellung ausgegeben und danach verworfen, der vollständige Baum liegt nie im Speicher.
+    ZIP-Archive werden direkt in den Archiveintrag auf dem Datenträger geschrieben.
+    """
+
+    def __init__(self, plan: XP_Plan, version=XPlanVersion.FIVE_THREE, root_tag=None, server_side_geometries=False):
+        self.plan = plan
+        super(GMLStreamWriter, self).__init__(plan, version=version, root_tag=root_tag,
+                                              server_side_geometries=server_side_geometries)
+
+    def build(self, plan: XP_Plan):
+        # features are only created while writing
+        return None
+
+    def write(self, target, references: Dict[str, bytes] = None):
+        """
+        Schreibt das XPlanGML-Dokument.
+
+        Parameters
+        ----------
+        target:
+            Dateipfad oder beschreibbarer binärer Stream
+        references: dict, optional
+            Wenn angegeben, werden lokale Dateiverweise auf ihren Pfad im ZIP-Archiv umgeschrieben und die
+            referenzierten Dateien in diesem Dictionary gesammelt
+        """
+        self.files = {}
+        with _remove_on_error(target), etree.xmlfile(target, encoding='UTF-8') as xf:
+            xf.write_declaration(standalone=True)
+            with xf.element(self.root_tag, {f"{{{self.nsmap['gml']}}}id": f"GML_{uuid4()}"}, nsmap=self.nsmap):
+                xf.write('\n')
+                for feature in self.writeFeatures(self.plan):
+                    if references is not None:
+                        references.update(self.collectReferences(feature))
+                    xf.write(feature, pretty_print=True)
+
+    def writeArchive(self, target):
+        """
+        Schreibt ein ZIP-Archiv mit dem XPlanGML-Dokument und allen lokal referenzierten Dateien.
+
+        Parameters
+        ----------
+        target:
+            Dateipfad oder beschreibbarer binärer Stream
+        """
+        references = {}
+        with _remove_on_error(target), ZipFile(target, mode='w') as zip_file:
+            # only one entry can be open for writing, referenced files are therefore added after the gml entry
+            with zip_file.open(f"{export_file_name(self.plan_name)}.gml", mode='w', force_zip64=True) as entry:
+                self.write(entry, references)
+
+            for file_name, file in references.items():
+                zip_file.writestr(file_name, file)
+
+    def toGML(self) -> bytes:
+        buffer = BytesIO()
+        self.write(buffer)
+        return buffer.getvalue()
+
+    def toArchive(self) -> BytesIO:
+        zip_buffer = BytesIO()
+        self.writeArchive(zip_buffer)
+        return zip_buffer
+
+
+@contextmanager
+def _remove_on_error(target):
+    """ Entfernt eine unvollständig geschriebene Zieldatei, wenn beim Schreiben ein Fehler auftritt """
+    try:
+        yield
+    except BaseException:
+        if isinstance(target, (str, os.PathLike)) and os.path.exists(target):
+            os.remove(target)
+        raise
+
+
 def writeTextNode(value):
     """
     Wandelt einen beliebigen Wert in eine Textrepräsentation um. Nützlich um diese danach als Inhalt
@@ -375,6 +540,17 @@ def writeTextNode(value):
     return str(value)
 
 
+def export_file_name(plan_name: str) -> str:
+    """ Gibt einen als Dateiname verwendbaren Plannamen zurück """
+    return plan_name.replace("/", "-").replace('"', '\'')
+
+
+_parser = threading.local()
+
+
 def parse_etree(xml_string: str) -> etree.Element:
-    parser = etree.XMLParser(recover=True, remove_blank_text=True)
+    # parsers are reused, but lxml parser instances must not be shared between threads
+    parser = getattr(_parser, 'parser', None)
+    if parser is None:
+        parser = _parser.parser = etree.XMLParser(recover=True, remove_blank_text=True)
     return etree.fromstring(xml_string, parser)
\ No newline at end of file
@@ -1,13 +1,23 @@
-from typing import Union
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Union, List, Tuple, Optional, Iterable, Dict
 
+import shapely
 from geoalchemy2 import WKBElement, WKTElement
+from geoalchemy2.shape import to_shape, from_shape
 from qgis.core import QgsGeometry, QgsWkbTypes
-from sqlalchemy import func, select
+from shapely.geometry import Polygon, MultiPolygon, GeometryCollection
+from shapely.geometry.base import BaseGeometry
+from shapely.geometry.polygon import orient
+from sqlalchemy import func, select, literal, union_all, Integer, case
 
 from SAGisXPlanung.XPlan.types import GeometryType
 from SAGisXPlanung.config import QgsConfig, GeometryCorrectionMethod
 
 SRID_FLAG = 0x20000000  # flag byte denoting that a srid is embedded within EWKB
+CORRECTION_BATCH_SIZE = 500  # max number of geometries corrected within one statement
+# ST_AsGML options: short srsName (EPSG:xxxx) and gml:LineString instead of gml:Curve, equal to the OGR GML32 output
+GML_ENCODING_OPTIONS = 4
 
 
 def enforce_wkb_constraints(ewkb: str) -> str:
@@ -21,15 +31,23 @@ def enforce_wkb_constraints(ewkb: str) -> str:
     return ewkb
 
 
+def ewkb_to_wkb(ewkb: bytes) -> bytes:
+    """ Binäre Variante von `enforce_wkb_constraints`: entfernt SRID-Flag und SRID aus EWKB ohne Umweg über Hex """
+    byteorder = 'little' if ewkb[0] == 1 else 'big'
+    geom_type = int.from_bytes(ewkb[1:5], byteorder)
+    if geom_type & SRID_FLAG != SRID_FLAG:
+        return bytes(ewkb)
+    return bytes(ewkb[:1]) + (geom_type & ~SRID_FLAG).to_bytes(4, byteorder) + bytes(ewkb[9:])
+
+
 def geometry_from_spatial_element(element: Union[WKBElement, WKTElement]) -> QgsGeometry:
     """ Converts a geometry coming from a ORM object to a QgsGeometry object"""
     if isinstance(element, WKTElement):
         geom = QgsGeometry.fromWkt(element.data)
         return geom
     elif isinstance(element, WKBElement):
-        wkb_hex = enforce_wkb_constraints(element.data.hex())
         geom = QgsGeometry()
-        geom.fromWkb(bytes.fromhex(wkb_hex))
+        geom.fromWkb(ewkb_to_wkb(element.data))
         return geom
     raise Exception('Could not convert to geometry. No WKBElement/WKTElement given')
 
@@ -56,32 +74,156 @@ def correct_geometry(connection, qgs_geom: QgsGeometry, geom_element: Union[WKBE
     if not validation_config.correct_geometries:
         return
 
-    if QgsWkbTypes.isCurvedType(qgs_geom.wkbType()):
-        # if curved type is found, don't apply DP simplification
-        return connection.scalar(
-            select(
-                func.ST_ForcePolygonCCW(
-                    func.ST_RemoveRepeatedPoints(
-                        geom_element
-                    )
+    # if curved type is found, don't apply DP simplification
+    curved = QgsWkbTypes.isCurvedType(qgs_geom.wkbType())
+    if validation_config.correct_locally and not curved:
+        return correct_geometry_locally(geom_element, validation_config.correct_method)
+
+    return connection.scalar(correction_statement(geom_element, curved, validation_config.correct_method))
+
+
+def correct_geometries(connection, geometries: List[Tuple[QgsGeometry, Union[WKBElement, WKTElement]]]) \
+        -> List[Optional[WKBElement]]:
+    """
+    Bulk version of `correct_geometry`. All geometries which need to be corrected in the database are processed with
+    one statement per batch instead of one round trip per geometry.
+    Returns the corrected geometries in the same order as the input, None if a geometry was not corrected.
+    """
+    corrected = [None] * len(geometries)
+
+    validation_config = QgsConfig.geometry_validation_config()
+    if not validation_config.correct_geometries:
+        return corrected
+
+    statements = []
+    for i, (qgs_geom, geom_element) in enumerate(geometries):
+        curved = QgsWkbTypes.isCurvedType(qgs_geom.wkbType())
+        if validation_config.correct_locally and not curved:
+            corrected[i] = correct_geometry_locally(geom_element, validation_config.correct_method)
+            continue
+        stmt = correction_statement(geom_element, curved, validation_config.correct_method)
+        statements.append(stmt.add_columns(literal(i, Integer).label('index')))
+
+    for batch_start in range(0, len(statements), CORRECTION_BATCH_SIZE):
+        batch = statements[batch_start:batch_start + CORRECTION_BATCH_SIZE]
+        stmt = batch[0] if len(batch) == 1 else union_all(*batch)
+        for geom, index in connection.execute(stmt):
+            corrected[index] = geom
+
+    return corrected
+
+
+def correction_statement(geom_element: Union[WKBElement, WKTElement], curved: bool, method: GeometryCorrectionMethod):
+    """ Select statement which returns the corrected geometry, or no row if the geometry is not a polygon """
+    if curved:
+        return select(
+            func.ST_ForcePolygonCCW(
+                func.ST_RemoveRepeatedPoints(
+                    geom_element
                 )
-            ).where(func.ST_Dimension(geom_element) == 2)
-        )
+            )
+        ).where(func.ST_Dimension(geom_element) == 2)
 
+    # Apply ST_RemoveRepeatedPoints and DP-Simplification to remove repeated points
+    # considers trade-off between preservation of topology and finding all duplicates
+    if method == GeometryCorrectionMethod.PreserveTopology:
+        simplify_func = func.ST_SimplifyPreserveTopology
     else:
-        # Apply ST_RemoveRepeatedPoints and DP-Simplification to remove repeated points
-        # considers trade-off between preservation of topology and finding all duplicates
-        if validation_config.correct_method == GeometryCorrectionMethod.PreserveTopology:
-            simplify_func = func.ST_SimplifyPreserveTopology
-        else:
-            simplify_func = func.ST_Simplify
-
-        return connection.scalar(
-            select(
-                func.ST_ForcePolygonCCW(
-                    func.ST_RemoveRepeatedPoints(
-                        simplify_func(geom_element, 0)
-                    )
-                )
-            ).where(func.ST_Dimension(geom_element) == 2)
+        simplify_func = func.ST_Simplify
+
+    return select(
+        func.ST_ForcePolygonCCW(
+            func.ST_RemoveRepeatedPoints(
+                simplify_func(geom_element, 0)
+            )
         )
+    ).where(func.ST_Dimension(geom_element) == 2)
+
+
+def correct_geometry_locally(geom_element: Union[WKBElement, WKTElement],
+                             method: GeometryCorrectionMethod) -> Optional[WKBElement]:
+    """
+    Applies the same correction as `correct_geometry` with GEOS/shapely, without a round trip to the database.
+    Curved geometries are not supported by GEOS and have to be corrected in the database.
+    """
+    geom = to_shape(geom_element)
+    if geom.is_empty or shapely.get_dimensions(geom) != 2:
+        return
+
+    geom = shapely.simplify(geom, 0, preserve_topology=method == GeometryCorrectionMethod.PreserveTopology)
+    geom = shapely.remove_repeated_points(geom)
+    geom = force_polygon_ccw(geom)
+
+    return from_shape(geom, srid=geom_element.srid, extended=True)
+
+
+def force_polygon_ccw(geom: BaseGeometry) -> BaseGeometry:
+    """ Equivalent of ST_ForcePolygonCCW: exterior rings counter-clockwise, interior rings clockwise """
+    if isinstance(geom, Polygon):
+        return orient(geom, sign=1.0)
+    if isinstance(geom, MultiPolygon):
+        return MultiPolygon([orient(p, sign=1.0) for p in geom.geoms])
+    if isinstance(geom, GeometryCollection):
+        return GeometryCollection([force_polygon_ccw(g) for g in geom.geoms])
+    return geom
+
+
+@dataclass(frozen=True)
+class EncodedGeometry:
+    """ GML fragment and bounds of a geometry, encoded by PostGIS """
+    gml: Optional[str]
+    bounds: Tuple[float, float, float, float]  # (minx, maxx, miny, maxy) as returned by OGR's GetEnvelope
+
+
+def gml_encoding_statement(geom_column, id_column, attr: str, ids: list):
+    """
+    Select statement which encodes the geometry column of all rows with the given ids as GML 3 fragment.
+    Curved geometries are not encoded (gml is NULL) since ST_AsGML output differs from the GML 3.2 curve encoding.
+    """
+    gml_id = func.concat('GML_', id_column, f'_{attr}')
+    return select(
+        id_column.label('id'),
+        literal(attr).label('attr'),
+        case(
+            (func.ST_HasArc(geom_column), None),
+            else_=func.ST_AsGML(3, geom_column, 15, GML_ENCODING_OPTIONS, 'gml', gml_id)
+        ).label('gml'),
+        func.ST_XMin(geom_column).label('xmin'),
+        func.ST_XMax(geom_column).label('xmax'),
+        func.ST_YMin(geom_column).label('ymin'),
+        func.ST_YMax(geom_column).label('ymax')
+    ).where(id_column.in_(ids), geom_column.isnot(None))
+
+
+def encode_geometries(connection, objects: Iterable[Tuple[object, str]]) -> Dict[Tuple[str, str], EncodedGeometry]:
+    """
+    Encodes the geometries of many ORM objects in the database with a single set based query.
+
+    Parameters
+    ----------
+    connection:
+        sqlalchemy connection
+    objects:
+        tuples of ORM object and the name of its geometry attribute
+
+    Returns
+    -------
+    dict:
+        encoded geometries keyed by (str(object id), attribute name)
+    """
+    # group by the table holding the geometry column, so that inherited columns are selected without joins
+    ids_by_column = defaultdict(list)
+    for obj, attr in objects:
+        column = getattr(obj.__class__, attr).property.columns[0]
+        ids_by_column[(column.table, column.name, attr)].append(obj.id)
+
+    statements = [gml_encoding_statement(table.c[column_name], table.c.id, attr, ids)
+                  for (table, column_name, attr), ids in ids_by_column.items()]
+    if not statements:
+        return {}
+
+    stmt = statements[0] if len(statements) == 1 else union_all(*statements)
+    return {
+        (str(row.id), row.attr): EncodedGeometry(row.gml, (row.xmin, row.xmax, row.ymin, row.ymax))
+        for row in connection.execute(stmt)
+    }
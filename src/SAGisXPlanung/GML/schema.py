@@ -0,0 +1,114 @@
+import inspect
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Optional, Dict
+
+import sqlalchemy
+
+from SAGisXPlanung import Base, XPlanVersion
+
+# Relationen, die beim Einlesen übersprungen werden, da sie die Rückrichtung einer anderen Relation darstellen
+IGNORED_NODES = frozenset(['gehoertZuBereich', 'praesentationsobjekt', 'dientZurDarstellungVon', 'boundedBy',
+                           'gehoertZuPlan'])
+
+
+@dataclass(frozen=True)
+class NodeSchema:
+    """ Schemainformationen zu einem XPlanGML-Knoten einer XPlanung-Klasse """
+    attr: str
+    col_type: Any = None
+    target: Optional[type] = None
+
+    @property
+    def is_relation(self) -> bool:
+        return self.target is not None
+
+
+class XPlanSchema:
+    """
+    Schemainformationen einer XPlanung-Klasse in einer Version des Standards.
+    Alle Tabellen werden einmalig je Klasse und Version beim Erzeugen aufgebaut und sind danach unveränderlich, sodass
+    eine Instanz ohne Sperren von mehreren Threads (Import und Export) gemeinsam genutzt werden kann.
+    Instanzen werden über `XPlanSchema.of(object_type, version)` abgerufen.
+
+    Attributes
+    ----------
+    nodes: Mapping[str, NodeSchema]
+        Schemainformationen je XPlanGML-Knoten, der beim Einlesen berücksichtigt wird
+    columns: Mapping[str, Any]
+        Spaltentyp je Attribut, das eine Spalte ist
+    element_order: Tuple[str, ...]
+        Reihenfolge der Attribute beim Schreiben von XPlanGML
+    attributes: Tuple[str, ...]
+        Attribute in `element_order`, die keine Relationen sind
+    uom: Mapping[str, str]
+        XPlanGML-Einheit je Attribut mit Maßeinheit
+    """
+
+    def __init__(self, object_type: type, version: Optional[XPlanVersion]):
+        self.object_type = object_type
+        self.version = version
+
+        mapper = sqlalchemy.inspect(object_type, raiseerr=False)
+        relationships = dict(mapper.relationships.items()) if mapper is not None else {}
+        column_names = mapper.column_attrs.keys() if mapper is not None else []
+
+        self.columns = MappingProxyType({name: col_type for name in column_names
+                                         if (col_type := self._column_type(name)) is not None})
+        nodes = {name: self._node_schema(name, relationships) for name in [*column_names, *relationships]}
+        self.nodes = MappingProxyType({name: node for name, node in nodes.items() if node is not None})
+
+        if hasattr(object_type, 'element_order'):
+            self.element_order = tuple(object_type.element_order(version=version))
+        else:
+            self.element_order = ()
+        self.attributes = tuple(attr for attr in self.element_order if attr not in relationships)
+        self.uom = MappingProxyType({name: col_type.UOM for name, col_type in self.columns.items()
+                                     if hasattr(col_type, 'UOM')})
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def of(cls, object_type: type, version: Optional[XPlanVersion] = None) -> 'XPlanSchema':
+        return cls(object_type, version)
+
+    def node(self, node_name: str) -> Optional[NodeSchema]:
+        """
+        Gibt die Schemainformationen eines XPlanGML-Knotens eines XP_Objekts zurück.
+
+        Returns
+        -------
+        NodeSchema:
+            Schemainformationen oder None, wenn der Knoten beim Einlesen ignoriert wird
+        """
+        return self.nodes.get(node_name)
+
+    def column_type(self, node_name: str):
+        """ Gibt den Spaltentyp eines Attributs zurück oder None, wenn das Attribut keine Spalte ist """
+        return self.columns.get(node_name)
+
+    def _column_type(self, node_name: str):
+        try:
+            return getattr(self.object_type, node_name).property.columns[0].type
+        except AttributeError:
+            # property is not a column (but a relation instead)
+            return None
+
+    def _node_schema(self, node_name: str, relationships: Dict[str, Any]) -> Optional[NodeSchema]:
+        if node_name in IGNORED_NODES:
+            return None
+
+        col = getattr(self.object_type, node_name)
+        if hasattr(col, 'import_attr') and col.import_attr is not None:
+            node_name = col.import_attr(self.version)
+
+        if (rel := relationships.get(node_name)) is not None:
+            return NodeSchema(attr=node_name, target=rel.mapper.class_)
+
+        # edge case where same named column exists in base class which should be used
+        cls = self.object_type
+        if not cls.attr_fits_version(node_name, self.version):
+            base_classes = [c for c in list(inspect.getmro(self.object_type)) if issubclass(c, Base)]
+            cls = next(c for c in reversed(base_classes) if hasattr(c, node_name))
+
+        return NodeSchema(attr=node_name, col_type=getattr(cls, node_name).property.columns[0].type)
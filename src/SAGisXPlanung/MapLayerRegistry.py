@@ -1,18 +1,19 @@
 import logging
 from dataclasses import dataclass
-from typing import Union, List
+from typing import Union, List, Dict, Tuple, Any, Optional, Set
 
 from qgis.PyQt.QtCore import pyqtSlot
 from qgis.PyQt import QtCore
 from qgis.gui import QgsMapCanvasItem
 from qgis.core import (QgsVectorLayer, QgsProject, QgsMapLayer, QgsAnnotationLayer, QgsLayerTreeGroup, QgsLayerTreeNode,
-                       QgsLayerTreeLayer)
+                       QgsLayerTreeLayer, QgsFeatureRequest, QgsExpression)
 from qgis.utils import iface
 
 from SAGisXPlanung import Session
 from SAGisXPlanung.XPlan.types import GeometryType
 from SAGisXPlanung.XPlanungItem import XPlanungItem
 from SAGisXPlanung.config import QgsConfig
+from SAGisXPlanung.core.database_layers import is_database_layer
 
 logger = logging.getLogger(__name__)
 
@@ -37,10 +38,26 @@ class CanvasItemRegistryItem:
     canvas_item: QgsMapCanvasItem
 
 
+# hidden attribute of canvas vector layers holding the id of the displayed XPlanung object
+XID_FIELD = 'xplanung_id'
+# per-feature layer properties used before the id was stored as attribute, see `migrate_feature_properties`
+LEGACY_FEATURE_PROPERTY_PREFIX = 'xplanung/feat-'
+
+
 class MapLayerRegistry(Singleton):
     _layers = []
     _canvasItems: List[CanvasItemRegistryItem] = []
 
+    # secondary indexes over `_layers`, kept consistent by addLayer/removeLayer, registerFeature/unregisterFeature
+    # and onLayerNameChanged
+    _layers_by_id: Dict[str, QgsMapLayer] = {}
+    _features_by_xid: Dict[str, Tuple[QgsMapLayer, Any]] = {}  # feat_xid -> (layer, feat_id)
+    _layers_by_type: Dict[Tuple[str, str], List[QgsMapLayer]] = {}  # (xtype, plan_xid) -> layers
+    _layers_by_name: Dict[Tuple[str, str], List[QgsMapLayer]] = {}  # (plan_xid, layer name) -> layers
+    _name_keys: Dict[str, Tuple[str, str]] = {}  # layer_id -> (plan_xid, layer name) as indexed in `_layers_by_name`
+    _feature_xids: Dict[str, Dict[Any, str]] = {}  # layer_id -> {feat_id: feat_xid}
+    _unresolved_xids: Dict[str, Set[str]] = {}  # layer_id -> {feat_xid}, objects shown in database layers
+
     def init(self):
         QgsProject.instance().layerStore().layerWillBeRemoved.connect(self.removeLayer)
 
@@ -54,6 +71,18 @@ class MapLayerRegistry(Singleton):
     def layers(self):
         return self._layers
 
+    def clear(self):
+        """ Entfernt alle Layer und Canvas-Items aus der Registry """
+        self._layers = []
+        self._canvasItems = []
+        self._layers_by_id = {}
+        self._features_by_xid = {}
+        self._layers_by_type = {}
+        self._layers_by_name = {}
+        self._name_keys = {}
+        self._feature_xids = {}
+        self._unresolved_xids = {}
+
     def canvas_items_at_feat(self, feat_xid: str):
         registry_items = list(filter(lambda r_item: r_item.feat_xid == feat_xid, self._canvasItems))
         return [r.canvas_item for r in registry_items]
@@ -82,7 +111,7 @@ class MapLayerRegistry(Singleton):
         if not (isinstance(layer, QgsVectorLayer) or isinstance(layer, QgsAnnotationLayer)):
             return
 
-        if layer in self._layers:
+        if layer.id() in self._layers_by_id:
             return
 
         if add_to_legend:
@@ -116,17 +145,146 @@ class MapLayerRegistry(Singleton):
 
         if isinstance(layer, QgsVectorLayer):
             layer.committedGeometriesChanges.connect(self.onGeometriesChanged)
+            layer.committedFeaturesRemoved.connect(self.onFeaturesRemoved)
+        layer.nameChanged.connect(self.onLayerNameChanged)
 
         self._layers.append(layer)
+        self._index_layer(layer)
+
+    def _index_layer(self, layer: QgsMapLayer):
+        self._layers_by_id[layer.id()] = layer
+        xtype = layer.customProperty('xplanung/type')
+        plan_xid = layer.customProperty('xplanung/plan-xid')
+        self._layers_by_type.setdefault((xtype, plan_xid), []).append(layer)
+        self._index_layer_name(layer)
+
+        self._feature_xids.setdefault(layer.id(), {})
+        if not isinstance(layer, QgsVectorLayer) or is_database_layer(layer) \
+                or (xid_index := layer.fields().indexOf(XID_FIELD)) < 0:
+            return
+
+        # features added before the layer was registered (e.g. layers restored from a project)
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([xid_index])
+        for feat in layer.getFeatures(request):
+            if feat_xid := feat[xid_index]:
+                self.registerFeature(layer, feat.id(), feat_xid)
+
+    def _unindex_layer(self, layer: QgsMapLayer):
+        self._layers_by_id.pop(layer.id(), None)
+
+        type_key = (layer.customProperty('xplanung/type'), layer.customProperty('xplanung/plan-xid'))
+        type_layers = self._layers_by_type.get(type_key, [])
+        if layer in type_layers:
+            type_layers.remove(layer)
+        if not type_layers:
+            self._layers_by_type.pop(type_key, None)
+
+        self._unindex_layer_name(layer)
+
+        for feat_xid in [*self._feature_xids.pop(layer.id(), {}).values(), *self._unresolved_xids.pop(layer.id(), ())]:
+            if self.layerByFeature(feat_xid) is layer:
+                del self._features_by_xid[feat_xid]
+
+    def _index_layer_name(self, layer: QgsMapLayer):
+        name_key = (layer.customProperty('xplanung/plan-xid'), layer.name())
+        self._name_keys[layer.id()] = name_key
+        self._layers_by_name.setdefault(name_key, []).append(layer)
+
+    def _unindex_layer_name(self, layer: QgsMapLayer):
+        name_key = self._name_keys.pop(layer.id(), None)
+        name_layers = self._layers_by_name.get(name_key, [])
+        if layer in name_layers:
+            name_layers.remove(layer)
+        if not name_layers:
+            self._layers_by_name.pop(name_key, None)
+
+    @pyqtSlot()
+    def onLayerNameChanged(self):
+        layer = self.sender()
+        # layers of a cleared registry are still connected
+        if not isinstance(layer, QgsMapLayer) or self.layerById(layer.id()) is not layer:
+            return
+        self._unindex_layer_name(layer)
+        self._index_layer_name(layer)
+
+    def registerFeature(self, layer: QgsMapLayer, feat_id, feat_xid: str):
+        """
+        Verknüpft ein Feature bzw. Annotation-Item eines Layers mit der ID des dargestellten XPlanung-Objekts.
+        Features von Vektorlayern führen die ID zusätzlich im Attribut `XID_FIELD`, Annotation-Items werden nur
+        hier verknüpft.
+
+        Parameters
+        ----------
+        layer: QgsMapLayer
+            Vektor- oder Annotationlayer
+        feat_id:
+            Feature-ID bzw. ID des Annotation-Items; None bei Datenbanklayern, deren Feature-IDs erst beim Abruf
+            der Features vergeben werden
+        feat_xid: str
+            ID des XPlanung-Objekts
+        """
+        if feat_id is None:
+            # resolved from the xid attribute on first access, see `featureId` and `featureXid`
+            self._unresolved_xids.setdefault(layer.id(), set()).add(feat_xid)
+        else:
+            self._feature_xids.setdefault(layer.id(), {})[feat_id] = feat_xid
+            self._unresolved_xids.get(layer.id(), set()).discard(feat_xid)
+        self._features_by_xid[feat_xid] = (layer, feat_id)
+
+    def unregisterFeature(self, layer: QgsMapLayer, feat_id):
+        """ Entfernt die Verknüpfung eines Features bzw. Annotation-Items mit seinem XPlanung-Objekt """
+        feat_xid = self._feature_xids.get(layer.id(), {}).pop(feat_id, None)
+        if feat_xid is not None and self.layerByFeature(feat_xid) is layer:
+            del self._features_by_xid[feat_xid]
+
+    def unregisterFeatures(self, layer: QgsMapLayer):
+        """ Entfernt die Verknüpfungen aller Features bzw. Annotation-Items eines Layers """
+        for feat_xid in [*self._feature_xids.get(layer.id(), {}).values(), *self._unresolved_xids.get(layer.id(), ())]:
+            if self.layerByFeature(feat_xid) is layer:
+                del self._features_by_xid[feat_xid]
+        if layer.id() in self._feature_xids:
+            self._feature_xids[layer.id()] = {}
+        self._unresolved_xids.pop(layer.id(), None)
+
+    def featureXid(self, layer: QgsMapLayer, feat_id) -> Optional[str]:
+        """ Gibt die ID des XPlanung-Objekts zurück, das durch das Feature bzw. Annotation-Item dargestellt wird """
+        feat_xid = self._feature_xids.get(layer.id(), {}).get(feat_id)
+        if feat_xid is not None or not self._unresolved_xids.get(layer.id()):
+            return feat_xid
+
+        request = QgsFeatureRequest(feat_id).setFlags(QgsFeatureRequest.NoGeometry)
+        feat = next(layer.getFeatures(request), None)
+        if feat is None or feat[XID_FIELD] not in self._unresolved_xids[layer.id()]:
+            return
+        self.registerFeature(layer, feat_id, feat[XID_FIELD])
+        return feat[XID_FIELD]
+
+    def featureId(self, feat_xid: str):
+        """ Gibt die Feature-ID bzw. ID des Annotation-Items zurück, welches das XPlanung-Objekt darstellt """
+        layer, feat_id = self._features_by_xid.get(feat_xid, (None, None))
+        if layer is None or feat_id is not None:
+            return feat_id
+
+        expression = f'{QgsExpression.quotedColumnRef(XID_FIELD)} = {QgsExpression.quotedString(feat_xid)}'
+        request = QgsFeatureRequest().setFilterExpression(expression).setFlags(QgsFeatureRequest.NoGeometry)
+        feat = next(layer.getFeatures(request), None)
+        if feat is None:
+            return
+        self.registerFeature(layer, feat.id(), feat_xid)
+        return feat.id()
+
+    def onFeaturesRemoved(self, layer_id, feature_ids):
+        layer = self.layerById(layer_id)
+        if not layer:
+            return
+        for feat_id in feature_ids:
+            self.unregisterFeature(layer, feat_id)
 
     @pyqtSlot(QgsLayerTreeLayer)
     def on_layer_visibility_changed(self, tree_node: QgsLayerTreeLayer):
         layer = tree_node.layer()
-        for key in layer.customPropertyKeys():
-            if 'xplanung/feat-' not in key:
-                continue
-            feat_id = layer.customProperty(key)
-            canvas_items = self.canvas_items_at_feat(feat_id)
+        for feat_xid in self._feature_xids.get(layer.id(), {}).values():
+            canvas_items = self.canvas_items_at_feat(feat_xid)
             for c_item in canvas_items:
                 c_item.setVisible(not c_item.isVisible())
 
@@ -145,63 +303,50 @@ class MapLayerRegistry(Singleton):
 
         # remove template items from canvas
         if layer.customProperty('xplanung/type') == 'BP_BaugebietsTeilFlaeche':
-            for key in layer.customPropertyKeys():
-                if 'xplanung/feat-' not in key:
-                    continue
-                feat_id = layer.customProperty(key)
-                self.remove_canvas_items(feat_id)
+            for feat_xid in list(self._feature_xids.get(layer_id, {}).values()):
+                self.remove_canvas_items(feat_xid)
+
+        try:
+            layer.nameChanged.disconnect(self.onLayerNameChanged)
+        except TypeError:
+            pass
 
         self._layers.remove(layer)
+        self._unindex_layer(layer)
 
     def layerById(self, layer_id) -> Union[QgsVectorLayer, QgsAnnotationLayer]:
-        for lyr in self._layers:
-            if lyr.id() == layer_id:
-                return lyr
+        return self._layers_by_id.get(layer_id)
 
     def featureIsShown(self, feat_xid: str) -> bool:
-        for lyr in self._layers:
-            for key in lyr.customPropertyKeys():
-                if 'xplanung/feat-' not in key:
-                    continue
-                if lyr.customProperty(key) == feat_xid:
-                    return True
-        return False
+        return feat_xid in self._features_by_xid
 
     def layerByFeature(self, feat_xid: str) -> Union[None, QgsVectorLayer, QgsAnnotationLayer]:
-        for lyr in self._layers:
-            for key in lyr.customPropertyKeys():
-                if 'xplanung/feat-' not in key:
-                    continue
-                if lyr.customProperty(key) == feat_xid:
-                    return lyr
+        layer, feat_id = self._features_by_xid.get(feat_xid, (None, None))
+        return layer
 
     def layerByXid(self, xplan_item: XPlanungItem, geom_type: GeometryType = None) -> Union[None, QgsVectorLayer, QgsAnnotationLayer]:
         # if not already defined, try if geom type is available on the given xplan item
         if geom_type is None:
             geom_type = xplan_item.geom_type
 
-        for lyr in self._layers:
-            xtype = lyr.customProperty('xplanung/type')
-            xid = lyr.customProperty('xplanung/plan-xid')
-            if xtype == xplan_item.xtype.__name__ and xid == xplan_item.plan_xid:
-                # make sure only layers of correct geometry type are returned (for vector layers only)
-                if geom_type is not None and isinstance(lyr, QgsVectorLayer) and geom_type != lyr.geometryType():
-                    continue
-                return lyr
+        for lyr in self._layers_by_type.get((xplan_item.xtype.__name__, xplan_item.plan_xid), []):
+            # make sure only layers of correct geometry type are returned (for vector layers only)
+            if geom_type is not None and isinstance(lyr, QgsVectorLayer) and geom_type != lyr.geometryType():
+                continue
+            return lyr
 
     def layer_by_display_name(self, display_name: str, plan_xid: str) -> Union[None, QgsVectorLayer, QgsAnnotationLayer]:
-        for lyr in self._layers:
-            xid = lyr.customProperty('xplanung/plan-xid')
-            if display_name == lyr.name() and xid == plan_xid:
-                return lyr
+        name_layers = self._layers_by_name.get((plan_xid, display_name))
+        if name_layers:
+            return name_layers[0]
 
     def onGeometriesChanged(self, layer_id, changed_geometries):
         layer = self.layerById(layer_id)
         for feat_id, geometry in changed_geometries.items():
-            if not layer.customProperties().contains(f'xplanung/feat-{feat_id}'):
+            xplanung_id = self.featureXid(layer, feat_id)
+            if xplanung_id is None:
                 raise KeyError('Geometrieänderung einer XPlanung Fläche detektiert, '
                                'aber kein zugehöriges Objekt gefunden ')
-            xplanung_id = layer.customProperties().value(f'xplanung/feat-{feat_id}')
             xplanung_type = layer.customProperties().value('xplanung/type')
 
             from SAGisXPlanung.utils import CLASSES
@@ -12,9 +12,11 @@ from qgis.PyQt.QtGui import QShowEvent, QCloseEvent, QIcon
 from qgis.PyQt.QtWidgets import QDialog
 
 from SAGisXPlanung import VERSION, XPlanVersion, BASE_DIR
-from SAGisXPlanung.config import QgsConfig, GeometryValidationConfig, GeometryCorrectionMethod, export_version
+from SAGisXPlanung.config import QgsConfig, GeometryValidationConfig, GeometryCorrectionMethod, export_version, \
+    CanvasDisplayMode
 from SAGisXPlanung.config.layer_symbology import load_symbol_defaults
 from SAGisXPlanung.gui.style import load_svg, ApplicationColor, SVGButtonEventFilter
+from SAGisXPlanung.core.mixins.mixins import ElementOrderMixin
 # don't remove following import: all classes need to be imported at plugin startup for ORM to work correctly
 from SAGisXPlanung.gui.widgets import QAttributeConfigView
 from SAGisXPlanung.gui.widgets.settings.basepage import SettingsPage
@@ -43,13 +45,20 @@ class Settings(QDialog, FORM_CLASS):
         self.info_clean_geometry.setIcon(info_icon)
         self.info_preserve_topology.setIcon(info_icon)
         self.info_repeated_points.setIcon(info_icon)
+        self.info_correct_locally.setIcon(info_icon)
         self.info_clean_geometry.installEventFilter(self.info_button_highlight_filter)
         self.info_preserve_topology.installEventFilter(self.info_button_highlight_filter)
         self.info_repeated_points.installEventFilter(self.info_button_highlight_filter)
+        self.info_correct_locally.installEventFilter(self.info_button_highlight_filter)
+        self.info_database_layers.setIcon(info_icon)
+        self.info_database_layers.installEventFilter(self.info_button_highlight_filter)
         self.info_clean_geometry.setToolTip('<qt>Beim Erfassen neuer Geometrien, wird automatisch der Umlaufsinn aller Stützpunkte angepasst und eventuell doppelt erfasste Stützpunkte werden entfernt.</qt>')
         self.info_preserve_topology.setToolTip('<qt>Die Geometriebereinigung erhält die topologische Struktur der Geometrien. Es werden nur doppelte, aufeinanderfolgende Stützpunkte entfernt.</qt>')
         self.info_repeated_points.setToolTip('<qt>Eine genauere Erkennung doppelter Stützpunkte wird angewendet. Die Geometriebereinigung entfernt auch doppelte Stützpunkte, die nicht aufeinanderfolgend sind. Dies kann jedoch zu Änderungen in der Topologie führen.</qt>')
+        self.info_correct_locally.setToolTip('<qt>Die Geometriebereinigung wird lokal mit GEOS statt in der Datenbank ausgeführt. Dadurch entfällt eine Datenbankabfrage je Geometrie. Kurvengeometrien werden weiterhin in der Datenbank bereinigt.</qt>')
+        self.info_database_layers.setToolTip('<qt>Planinhalte werden als PostGIS-Layer angezeigt, die nur die Objekte im aktuellen Kartenausschnitt aus der Datenbank abrufen. Empfohlen für Pläne mit sehr vielen Objekten. Gilt für neu geladene Pläne.</qt>')
         self.set_validation_options()
+        self.set_canvas_display_options()
 
         self.status_label.hide()
 
@@ -62,11 +71,12 @@ class Settings(QDialog, FORM_CLASS):
         asyncio.create_task(coro)
 
         self.tabs.setCurrentIndex(0)
-        self.validation_options_group.setStyleSheet('''
-            QToolButton {
-                border: 0px;
-            }
-        ''')
+        for group in [self.validation_options_group, self.canvas_display_group]:
+            group.setStyleSheet('''
+                QToolButton {
+                    border: 0px;
+                }
+            ''')
 
     def navigate_to_page(self, page_type: type) -> Union[None, SettingsPage]:
         if not issubclass(page_type, SettingsPage):
@@ -82,6 +92,7 @@ class Settings(QDialog, FORM_CLASS):
         super(Settings, self).showEvent(e)
         self.setXPlanVersion()
         self.set_validation_options()
+        self.set_canvas_display_options()
 
         for i in range(1, self.tabs.count()):
             self.tabs.widget(i).setupData()
@@ -107,10 +118,11 @@ class Settings(QDialog, FORM_CLASS):
 
         # invalidate cache of export_version
         export_version.cache_clear()
+        ElementOrderMixin.clear_element_order_cache()
 
     @qasync.asyncSlot(int)
     async def checkbox_clean_geometry_state_changed(self, state):
-        for row in range(1, 3):
+        for row in range(1, 4):
             for column in range(self.validation_options_group.layout().columnCount()):
                 widget = self.validation_options_group.layout().itemAtPosition(row, column)
                 if widget is not None:
@@ -130,6 +142,10 @@ class Settings(QDialog, FORM_CLASS):
             self.radiobutton_preserve_topology.setChecked(True)
         else:
             self.radiobutton_repeated_points.setChecked(True)
+        self.checkbox_correct_locally.setChecked(validation_config.correct_locally)
+
+    def set_canvas_display_options(self):
+        self.checkbox_database_layers.setChecked(QgsConfig.canvas_display_mode() == CanvasDisplayMode.Database)
 
     def saveSettings(self):
         qs = QSettings()
@@ -140,8 +156,12 @@ class Settings(QDialog, FORM_CLASS):
 
         validation_config = GeometryValidationConfig(
             correct_geometries=self.checkbox_clean_geometry.isChecked(),
-            correct_method=GeometryCorrectionMethod.PreserveTopology if self.radiobutton_preserve_topology.isChecked() else GeometryCorrectionMethod.RigorousRemoval
+            correct_method=GeometryCorrectionMethod.PreserveTopology if self.radiobutton_preserve_topology.isChecked() else GeometryCorrectionMethod.RigorousRemoval,
+            correct_locally=self.checkbox_correct_locally.isChecked()
         )
         QgsConfig.set_geometry_validation_config(validation_config)
+        QgsConfig.set_canvas_display_mode(
+            CanvasDisplayMode.Database if self.checkbox_database_layers.isChecked() else CanvasDisplayMode.Memory
+        )
 
         self.accept()
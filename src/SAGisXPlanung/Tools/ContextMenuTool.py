@@ -16,6 +16,7 @@ from SAGisXPlanung import BASE_DIR
 from SAGisXPlanung.core.buildingtemplate.template_item import BuildingTemplateItem
 from SAGisXPlanung.XPlan.feature_types import XP_Objekt
 from SAGisXPlanung.core.mixins.mixins import PolygonGeometry
+from SAGisXPlanung.MapLayerRegistry import MapLayerRegistry
 from SAGisXPlanung.XPlanungItem import XPlanungItem
 from SAGisXPlanung.gui.po_annotations_dialog import CreateAnnotateDialog
 from SAGisXPlanung.gui.actions import EditBuildingTemplateAction, MoveAnnotationItemAction
@@ -92,7 +93,7 @@ class ContextMenuTool(QgsMapToolIdentify):
                                                                   self.menu_action_hovered(lyr, geom))
 
                 # get details from custom property, add common actions + move annatotation action
-                xplanung_id = layer.customProperties().value(f'xplanung/feat-{item_detail.itemId()}')
+                xplanung_id = MapLayerRegistry().featureXid(layer, item_detail.itemId())
                 plan_xid = layer.customProperties().value(f'xplanung/plan-xid')
                 xplan_item = XPlanungItem(xid=xplanung_id, xtype=CLASSES[xtype], plan_xid=plan_xid)
 
@@ -108,7 +109,7 @@ class ContextMenuTool(QgsMapToolIdentify):
             layer_menu = menu.addMenu(self.iconForWkbType(layer.wkbType()), layer.name())
             menu_action = layer_menu.menuAction()
             menu_action.hovered.connect(lambda lyr=layer, feat=feature: self.menu_action_hovered(lyr, feat))
-            if layer.customProperties().contains(f'xplanung/feat-{feature.id()}'):
+            if MapLayerRegistry().featureXid(layer, feature.id()) is not None:
                 # simple geometries don't have attributes to show
                 xtype = layer.customProperties().value(f'xplanung/type')
                 if xtype == 'XP_SimpleGeometry':
@@ -125,7 +126,7 @@ class ContextMenuTool(QgsMapToolIdentify):
 
     def createCommonMenuEntries(self, menu: QMenu, layer: QgsMapLayer, feat_id: str, is_annotation=False):
         xtype = layer.customProperties().value(f'xplanung/type')
-        xplanung_id = layer.customProperties().value(f'xplanung/feat-{feat_id}')
+        xplanung_id = MapLayerRegistry().featureXid(layer, feat_id)
         plan_xid = layer.customProperties().value(f'xplanung/plan-xid')
         xplan_item = XPlanungItem(xid=xplanung_id, xtype=CLASSES[xtype], plan_xid=plan_xid)
 
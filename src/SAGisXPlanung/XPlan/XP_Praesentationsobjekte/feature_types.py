@@ -72,11 +72,9 @@ class XP_AbstraktesPraesentationsobjekt(RelationshipMixin, ElementOrderMixin, Ba
         if not layer:
             return
 
-        for item_id in layer.items().keys():
-            id_prop = layer.customProperties().value(f'xplanung/feat-{item_id}')
-            if id_prop == str(self.id):
-                layer.removeItem(item_id)
-                break
+        item_id = MapLayerRegistry().featureId(str(self.id))
+        layer.removeItem(item_id)
+        MapLayerRegistry().unregisterFeature(layer, item_id)
 
 
 @event.listens_for(XP_AbstraktesPraesentationsobjekt, 'after_delete', propagate=True)
@@ -153,17 +151,17 @@ def update_map_display(mapper, connection, xp_ppo: XP_PPO):
     if not layer:
         return
 
-    for item_id, item in layer.items().items():
-        id_prop = layer.customProperties().value(f'xplanung/feat-{item_id}')
-        if id_prop == str(xp_ppo.id):
-            background_setting = item.format().background()
-            path = os.path.abspath(os.path.join(BASE_DIR, xp_ppo.symbol_path))
-            background_setting.setSvgFile(path)
+    item = layer.item(MapLayerRegistry().featureId(str(xp_ppo.id)))
+    if item is None:
+        return
+
+    background_setting = item.format().background()
+    path = os.path.abspath(os.path.join(BASE_DIR, xp_ppo.symbol_path))
+    background_setting.setSvgFile(path)
 
-            item.format().setBackground(background_setting)
+    item.format().setBackground(background_setting)
 
-            layer.triggerRepaint()
-            break
+    layer.triggerRepaint()
 
 
 class XP_PTO(PointGeometry, MapCanvasMixin, XP_AbstraktesPraesentationsobjekt):
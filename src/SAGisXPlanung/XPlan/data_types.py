@@ -46,9 +46,13 @@ class XP_Gemeinde(RelationshipMixin, ElementOrderMixin, Base):
 
     def __eq__(self, other):
         if type(other) is type(self):
-            return self.ags == other.ags and self.ortsteilName == other.ortsteilName
+            return self.natural_key() == other.natural_key()
         return False
 
+    def natural_key(self) -> tuple:
+        """ Attribute, über die eine Gemeinde eindeutig identifiziert wird """
+        return self.ags, self.ortsteilName
+
     def validate(self):
         if not self.ags and not self.rs:
             raise ConformityException('Die Attribute <code>ags</code> und <code>rs</code> dürfen nicht beide unbelegt sein',
@@ -178,9 +182,13 @@ class XP_Plangeber(RelationshipMixin, ElementOrderMixin, Base):
 
     def __eq__(self, other):
         if type(other) is type(self):
-            return self.name == other.name
+            return self.natural_key() == other.natural_key()
         return False
 
+    def natural_key(self) -> tuple:
+        """ Attribute, über die ein Plangeber eindeutig identifiziert wird """
+        return self.name,
+
 
 @event.listens_for(XP_Plangeber, 'before_insert')
 @event.listens_for(XP_Plangeber, 'before_update')
@@ -262,9 +270,13 @@ class XP_GesetzlicheGrundlage(RelationshipMixin, ElementOrderMixin, Base):
 
     def __eq__(self, other):
         if type(other) is type(self):
-            return self.name == other.name and str(self.datum) == str(other.datum)
+            return self.natural_key() == other.natural_key()
         return False
 
+    def natural_key(self) -> tuple:
+        """ Attribute, über die eine gesetzliche Grundlage eindeutig identifiziert wird """
+        return self.name, str(self.datum)
+
 
 class XP_Hoehenangabe(RelationshipMixin, ElementOrderMixin, Base):
     """ Spezifikation einer Angabe zur vertikalen Höhe oder zu einem Bereich vertikaler Höhen. Es ist möglich,
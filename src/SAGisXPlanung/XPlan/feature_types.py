@@ -1,4 +1,6 @@
+import itertools
 import logging
+import weakref
 from typing import List
 from uuid import uuid4
 
@@ -9,9 +11,9 @@ from geoalchemy2 import Geometry, WKTElement
 
 from sqlalchemy import Column, String, Date, Integer, Float, Enum, ForeignKey, event, CheckConstraint, Computed
 from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, object_session, Session as OrmSession
 
-from qgis.core import (QgsCoordinateReferenceSystem, QgsGeometry, QgsVectorLayer, QgsFeatureRequest, edit,
+from qgis.core import (QgsCoordinateReferenceSystem, QgsGeometry, QgsVectorLayer, edit,
                        QgsSymbolLayerUtils, QgsRuleBasedRenderer)
 
 from .XP_Praesentationsobjekte.feature_types import XP_Nutzungsschablone
@@ -19,11 +21,13 @@ from .conversions import XP_Rechtscharakter_EnumType
 from .core import XPCol, LayerPriorityType, XPRelationshipProperty
 from .enums import XP_BedeutungenBereich, XP_Rechtsstand, XP_Rechtscharakter
 from SAGisXPlanung import Base, XPlanVersion
-from SAGisXPlanung.GML.geometry import geometry_from_spatial_element, correct_geometry
+from SAGisXPlanung.GML.geometry import geometry_from_spatial_element, correct_geometry, correct_geometries
 from SAGisXPlanung.config import export_version
 from SAGisXPlanung.core.mixins.mixins import ElementOrderMixin, PolygonGeometry, MapCanvasMixin, RelationshipMixin, RendererMixin
 from .types import LargeString, Angle, Length, GeometryType
 from ..MapLayerRegistry import MapLayerRegistry
+from ..core.database_layers import is_database_layer, reload_database_layer
+from ..core.validation import ValidationCache
 
 logger = logging.getLogger(__name__)
 
@@ -260,7 +264,7 @@ class XP_Bereich(RendererMixin, PolygonGeometry, ElementOrderMixin, Relationship
             layer = self.asLayer(srs, plan_xid, name=self.displayName(), geom_type=self.__geometry_type__)
 
         feat_id = self.addFeatureToLayer(layer, self.asFeature(layer.fields()))
-        layer.setCustomProperty(f'xplanung/feat-{feat_id}', str(self.id))
+        MapLayerRegistry().registerFeature(layer, feat_id, str(self.id))
         MapLayerRegistry().addLayer(layer, group=layer_group)
 
     @classmethod
@@ -396,20 +400,62 @@ def receive_after_delete(mapper, connection, target: XP_Objekt):
     if not layer:
         return
 
-    fr = QgsFeatureRequest().setNoAttributes().setFlags(QgsFeatureRequest.NoGeometry)
-    for feature in layer.getFeatures(fr):
-        id_prop = layer.customProperties().value(f'xplanung/feat-{feature.id()}')
-        if id_prop == str(target.id):
-            with edit(layer):
-                res = layer.deleteFeature(feature.id())
-                if not res:
-                    logger.warning(f'{target.displayName()}:{target.id} Feature wurde nicht von der Karte entfernt')
+    feat_id = MapLayerRegistry().featureId(str(target.id))
+    if is_database_layer(layer):
+        # the row is removed by the current transaction, the layer only needs to query its features again
+        MapLayerRegistry().unregisterFeature(layer, feat_id)
+        reload_database_layer(layer)
+    else:
+        with edit(layer):
+            res = layer.deleteFeature(feat_id)
+            if not res:
+                logger.warning(f'{target.displayName()}:{target.id} Feature wurde nicht von der Karte entfernt')
 
-            while len(target.annotation_delete_queue) > 0:
-                po = target.annotation_delete_queue.pop(0)
-                po.remove_from_canvas()
+    while len(target.annotation_delete_queue) > 0:
+        po = target.annotation_delete_queue.pop(0)
+        po.remove_from_canvas()
 
-            break
+
+@event.listens_for(XP_Objekt, 'before_update', propagate=True)
+@event.listens_for(XP_Objekt, 'after_delete', propagate=True)
+@event.listens_for(XP_Bereich, 'before_update', propagate=True)
+@event.listens_for(XP_Bereich, 'after_delete', propagate=True)
+@event.listens_for(XP_Plan, 'before_update', propagate=True)
+@event.listens_for(XP_Plan, 'after_delete', propagate=True)
+def invalidate_validation_result(mapper, connection, target):
+    """ Changed objects are re-tested on the next incremental validation of their plan """
+    ValidationCache().invalidate(str(target.id))
+
+
+# session.info key of the objects whose geometries were already corrected in bulk during the current flush
+CORRECTED_GEOMETRIES_KEY = 'xplanung_corrected_geometries'
+
+
+@event.listens_for(OrmSession, 'before_flush')
+def correct_geometries_before_flush(session, flush_context, instances):
+    """ Corrects the geometries of all pending objects with a single statement instead of one query per object """
+    targets = [t for t in itertools.chain(session.new, session.dirty)
+               if isinstance(t, (XP_Objekt, XP_Plan, XP_Bereich))
+               and getattr(t, t.__geometry_column_name__) is not None]
+    if not targets:
+        return
+
+    geometries = [(t.geometry(), getattr(t, t.__geometry_column_name__)) for t in targets]
+    corrected_geometries = correct_geometries(session.connection(), geometries)
+
+    # the instances themselves are stored, ids of objects from a failed flush could be reused by other objects
+    corrected_objects = session.info.setdefault(CORRECTED_GEOMETRIES_KEY, weakref.WeakSet())
+    for target, corrected_geom in zip(targets, corrected_geometries):
+        corrected_objects.add(target)
+        if corrected_geom is not None:
+            setattr(target, target.__geometry_column_name__, corrected_geom)
+
+
+@event.listens_for(OrmSession, 'after_flush')
+@event.listens_for(OrmSession, 'after_flush_postexec')
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def reset_corrected_geometries(session, *args):
+    session.info.pop(CORRECTED_GEOMETRIES_KEY, None)
 
 
 @event.listens_for(XP_Objekt, 'before_insert', propagate=True)
@@ -419,6 +465,11 @@ def receive_after_delete(mapper, connection, target: XP_Objekt):
 @event.listens_for(XP_Bereich, 'before_insert', propagate=True)
 @event.listens_for(XP_Bereich, 'before_update', propagate=True)
 def correct_geometry_trigger(mapper, connection, target):
+    # only objects which became part of the flush after `correct_geometries_before_flush` are corrected one by one
+    session = object_session(target)
+    if session is not None and target in session.info.get(CORRECTED_GEOMETRIES_KEY, ()):
+        return
+
     geom_element = getattr(target, target.__geometry_column_name__)
     if geom_element is None:
         return
@@ -21,6 +21,7 @@ from SAGisXPlanung.Settings import Settings
 from SAGisXPlanung.core.connection import attempt_connection, verify_db_connection
 from SAGisXPlanung.gui.XPEditPreFilledObjects import XPEditPreFilledObjectsDialog
 from SAGisXPlanung.core.canvas_display import plan_to_map, load_on_canvas
+from SAGisXPlanung.core.helper.layer import migrate_feature_properties
 from SAGisXPlanung.gui.XPlanungDialog import XPlanungDialog
 from SAGisXPlanung.gui.widgets import DatabaseConfigPage
 from SAGisXPlanung.processing.provider import SAGisProvider
@@ -270,6 +271,8 @@ class XPlanung(QObject):
                     if isinstance(tree_layer.layer(), QgsAnnotationLayer):
                         QgsProject().instance().removeMapLayer(tree_layer.layer())
                         continue
+                    # projects saved with previous versions store feature ids as layer properties
+                    migrate_feature_properties(tree_layer.layer())
                     MapLayerRegistry().addLayer(tree_layer.layer(), add_to_legend=False)
                 load_on_canvas(group.customProperty('xplanung_id'), layer_group=group)
             except Exception as e:
@@ -2,7 +2,7 @@ import logging
 import typing
 from dataclasses import dataclass
 from enum import Enum
-from typing import Union
+from typing import Union, Dict, Optional
 
 from qgis.PyQt.QtXml import QDomDocument
 from qgis.core import QgsFeatureRenderer, QgsReadWriteContext
@@ -23,10 +23,17 @@ class GeometryCorrectionMethod(Enum):
     RigorousRemoval = 2
 
 
+class CanvasDisplayMode(Enum):
+    """ Art der Layer, in denen Planinhalte auf der Karte dargestellt werden """
+    Memory = 1  # features are copied into memory layers
+    Database = 2  # postgres layers query the features of the current extent from the database
+
+
 @dataclass
 class GeometryValidationConfig:
     correct_geometries: bool
     correct_method: GeometryCorrectionMethod
+    correct_locally: bool = False
 
 
 class QgsConfig:
@@ -35,21 +42,42 @@ class QgsConfig:
     CONNECTION = 'plugins/xplanung/connection'
     CORRECT_GEOMETRIES = 'plugins/xplanung/correct_geometries'
     CORRECT_GEOMETRIES_METHOD = 'plugins/xplanung/correct_geometries_method'
+    CORRECT_GEOMETRIES_LOCALLY = 'plugins/xplanung/correct_geometries_locally'
     NEXUS_SETTINGS = 'plugins/xplanung/nexus/settings'
     LAST_EXPORT_PATH = 'plugins/xplanung/last_export_dir'
+    CANVAS_DISPLAY_MODE = 'plugins/xplanung/canvas_display_mode'
+
+    # parsed renderers by settings key, `class_renderer` only hands out clones
+    _renderer_cache: Dict[str, Optional[QgsFeatureRenderer]] = {}
 
     @staticmethod
     def remove_section(settings_key: str):
         qs = QSettings()
         qs.remove(f'{settings_key}/')
 
+        if settings_key.startswith(QgsConfig.STYLES) or QgsConfig.STYLES.startswith(settings_key):
+            QgsConfig.clear_renderer_cache()
+
+    @staticmethod
+    def clear_renderer_cache():
+        QgsConfig._renderer_cache.clear()
+
     @staticmethod
     def class_renderer(xplan_class: type, geometry_type: GeometryType) -> Union[None, QgsFeatureRenderer]:
         if geometry_type is None:
             return
 
+        key = f"{QgsConfig.STYLES}/{xplan_class.__name__}/{geometry_type}/renderer"
+        if key not in QgsConfig._renderer_cache:
+            QgsConfig._renderer_cache[key] = QgsConfig._load_renderer(key)
+
+        renderer = QgsConfig._renderer_cache[key]
+        return renderer.clone() if renderer is not None else None
+
+    @staticmethod
+    def _load_renderer(settings_key: str) -> Union[None, QgsFeatureRenderer]:
         qs = QSettings()
-        xml = qs.value(f"{QgsConfig.STYLES}/{xplan_class.__name__}/{geometry_type}/renderer", None)
+        xml = qs.value(settings_key, None)
 
         if xml is None:
             return
@@ -62,6 +90,8 @@ class QgsConfig:
 
     @staticmethod
     def set_class_renderer(xplan_class: type, geometry_type: GeometryType, renderer: QgsFeatureRenderer):
+        QgsConfig._renderer_cache.pop(f"{QgsConfig.STYLES}/{xplan_class.__name__}/{geometry_type}/renderer", None)
+
         qs = QSettings()
 
         doc = QDomDocument()
@@ -115,7 +145,8 @@ class QgsConfig:
         qs = QSettings()
         return GeometryValidationConfig(
             correct_geometries=bool(int(qs.value(QgsConfig.CORRECT_GEOMETRIES, 1))),
-            correct_method=GeometryCorrectionMethod(int(qs.value(QgsConfig.CORRECT_GEOMETRIES_METHOD, 1)))
+            correct_method=GeometryCorrectionMethod(int(qs.value(QgsConfig.CORRECT_GEOMETRIES_METHOD, 1))),
+            correct_locally=bool(int(qs.value(QgsConfig.CORRECT_GEOMETRIES_LOCALLY, 0)))
         )
 
     @staticmethod
@@ -123,6 +154,17 @@ class QgsConfig:
         qs = QSettings()
         qs.setValue(QgsConfig.CORRECT_GEOMETRIES, int(config.correct_geometries))
         qs.setValue(QgsConfig.CORRECT_GEOMETRIES_METHOD, config.correct_method.value)
+        qs.setValue(QgsConfig.CORRECT_GEOMETRIES_LOCALLY, int(config.correct_locally))
+
+    @staticmethod
+    def canvas_display_mode() -> CanvasDisplayMode:
+        qs = QSettings()
+        return CanvasDisplayMode(int(qs.value(QgsConfig.CANVAS_DISPLAY_MODE, CanvasDisplayMode.Memory.value)))
+
+    @staticmethod
+    def set_canvas_display_mode(mode: CanvasDisplayMode):
+        qs = QSettings()
+        qs.setValue(QgsConfig.CANVAS_DISPLAY_MODE, mode.value)
 
     @staticmethod
     def nexus_settings() -> str:
@@ -1,19 +1,114 @@
 import logging
 import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Tuple, Optional, Iterator, Set
 
 from qgis.core import QgsRasterLayer, QgsProject, QgsLayerTreeGroup, QgsLayerTreeLayer, QgsVectorLayer, \
-    QgsAnnotationLayer
+    QgsAnnotationLayer, QgsFeature, QgsTask, QgsApplication, Qgis
+from qgis.PyQt.QtCore import Qt, pyqtSignal, pyqtSlot
 from qgis.utils import iface
 
-from SAGisXPlanung import Session
+from SAGisXPlanung import Session, Base
 from SAGisXPlanung.MapLayerRegistry import MapLayerRegistry
 from SAGisXPlanung.XPlan.enums import XP_ExterneReferenzArt
-from SAGisXPlanung.XPlan.feature_types import XP_Plan
+from SAGisXPlanung.XPlan.data_types import XP_ExterneReferenz
+from SAGisXPlanung.XPlan.feature_types import XP_Plan, XP_Objekt
+from SAGisXPlanung.core.database_layers import is_database_layer
+from SAGisXPlanung.core.export_loader import ExportLoader, count_queries
 from SAGisXPlanung.utils import createXPlanungIndicators
 
 logger = logging.getLogger(__name__)
 
 
+class CanvasFeatureBatch:
+    """
+    Sammelt die Features mehrerer Planinhalte je Ziellayer, um sie gemeinsam mit einem Aufruf von `addFeatures`
+    einzufügen, statt für jedes Objekt einzeln.
+    Solange ein Batch über `batch_canvas_features` aktiv ist, legt `MapCanvasMixin.toCanvas` die erzeugten Features
+    hier ab. Layer werden weiterhin sofort in der `MapLayerRegistry` registriert, damit nachfolgende Objekte denselben
+    Layer finden.
+    """
+
+    active: Optional['CanvasFeatureBatch'] = None
+
+    def __init__(self):
+        self._features: Dict[str, Tuple[QgsVectorLayer, List[QgsFeature], List[str]]] = {}
+
+    def addFeature(self, layer: QgsVectorLayer, feat: QgsFeature, feat_xid: str):
+        """
+        Merkt ein Feature zum Einfügen in den Layer vor.
+
+        Parameters
+        ----------
+        layer: QgsVectorLayer
+            Ziellayer
+        feat: QgsFeature
+            einzufügendes Feature
+        feat_xid: str
+            ID des dargestellten XPlanung-Objekts
+        """
+        _, features, xids = self._features.setdefault(layer.id(), (layer, [], []))
+        features.append(feat)
+        xids.append(feat_xid)
+
+    def flush(self):
+        """ Fügt alle vorgemerkten Features mit einem Aufruf je Layer ein und registriert sie in der Registry """
+        registry = MapLayerRegistry()
+        for layer, features, xids in self._features.values():
+            success, new_features = layer.dataProvider().addFeatures(features)
+            if not success:
+                logger.warning(f'Features konnten nicht vollständig zum Layer {layer.name()} hinzugefügt werden')
+            for feat, feat_xid in zip(new_features, xids):
+                registry.registerFeature(layer, feat.id(), feat_xid)
+            layer.updateExtents()
+            layer.triggerRepaint()
+        self._features.clear()
+
+
+class CanvasLoader(ExportLoader):
+    """
+    Lädt alle Objekte eines Plans, die auf der Karte dargestellt werden, vorab mit einer festen Anzahl von Abfragen.
+
+    Im Unterschied zum `ExportLoader` werden nur die Relationen verfolgt, über die `load_on_canvas` zu den
+    dargestellten Objekten gelangt. Die übrigen abhängigen Objekte von Plan und Bereichen (Texte, Begründungen, ...)
+    werden nicht geladen. Datentypen der Planinhalte werden weiterhin mitgeladen, da sie in Attributen und
+    Nutzungsschablonen angezeigt werden.
+    """
+
+    CANVAS_RELATIONS = frozenset(['bereich', 'externeReferenz', 'planinhalt', 'praesentationsobjekt',
+                                  'simple_geometry', 'refScan', 'wirdDargestelltDurch'])
+
+    def strategy(self, cls) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        return CanvasLoader.canvas_strategy(cls)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def canvas_strategy(cls) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        eager, children = ExportLoader.loader_strategy(cls)
+        displayed = tuple(name for name in children if name in CanvasLoader.CANVAS_RELATIONS)
+        if not issubclass(cls, XP_Objekt):
+            eager = tuple(name for name in eager if name not in children or name in displayed)
+        return eager, displayed
+
+
+@contextmanager
+def batch_canvas_features():
+    """
+    Kontext, in dem alle über `toCanvas` dargestellten Features gesammelt und beim Verlassen je Layer gemeinsam
+    eingefügt werden.
+    """
+    batch = CanvasFeatureBatch()
+    CanvasFeatureBatch.active = batch
+    try:
+        yield batch
+    finally:
+        CanvasFeatureBatch.active = None
+        # also insert collected features on errors, so that registered layers match the registry
+        batch.flush()
+
+
 def create_raster_layer(layer_name, file, group=None):
     """
     Fügt dem aktuellen QGIS-Projekt ein neuen Rasterlayer hinzu
@@ -56,68 +151,195 @@ def plan_to_map(plan_xid):
     load_on_canvas(plan_xid)
 
 
-def load_on_canvas(plan_xid, layer_group=None):
+def canvas_contents(plan: XP_Plan) -> Iterator[Base]:
     """
-    Fügt den aktuell gewählten Plan als Layer zur Karte hinzu
+    Liefert alle Objekte eines Plans, die auf der Karte dargestellt werden, in der Reihenfolge ihrer Darstellung.
+    Georeferenzierte Rasterpläne werden als `XP_ExterneReferenz` geliefert.
     """
-    iface.mainWindow().statusBar().showMessage('Planwerk wird geladen...')
-    with Session.begin() as session:
-        plan: XP_Plan = session.query(XP_Plan).get(plan_xid)
-        if plan is None:
-            raise Exception(f'plan with id {plan_xid} not found')
+    yield plan
+
+    for b in [b for b in plan.bereich]:  # if b.geltungsbereich? only load if geltungsbereich has geom
+        yield from b.planinhalt
+
+        # display "free" annotations which are not bound to a 'planinhalt'
+        for po in b.praesentationsobjekt:
+            if po.dientZurDarstellungVon_id:
+                continue
+            yield po
+
+        yield from b.simple_geometry
+
+        if b.geltungsbereich:
+            yield b
+
+        for refScan in b.refScan:
+            if refScan.art == XP_ExterneReferenzArt.PlanMitGeoreferenz and refScan.file is not None:
+                yield refScan
+
+    for ext_ref in plan.externeReferenz:
+        if ext_ref.art == XP_ExterneReferenzArt.PlanMitGeoreferenz and ext_ref.file is not None:
+            yield ext_ref
+
+
+def display_content(obj, layer_group: QgsLayerTreeGroup, plan_xid):
+    """ Stellt ein Objekt aus `canvas_contents` auf der Karte dar """
+    if isinstance(obj, XP_ExterneReferenz):
+        create_raster_layer(obj.referenzName, obj.file, group=layer_group)
+    else:
+        obj.toCanvas(layer_group, plan_xid=plan_xid)
+
+
+def prepare_layer_group(plan: XP_Plan, layer_group: QgsLayerTreeGroup = None) -> QgsLayerTreeGroup:
+    """
+    Erstellt die Gruppe eines Plans im LayerTree bzw. entfernt alle Inhalte einer bestehenden Gruppe, bevor der Plan
+    neu geladen wird.
+    """
+    root = QgsProject.instance().layerTreeRoot()
+
+    if not layer_group:
+        layer_group = root.insertGroup(0, plan.name)
+        layer_group.setCustomProperty('xplanung_id', str(plan.id))
+        layer_group.visibilityChanged.connect(MapLayerRegistry().on_group_node_visibility_changed)
+
+        xp_indicator, reload_indicator = createXPlanungIndicators()
+        reload_indicator.clicked.connect(lambda i, p=str(plan.id): plan_to_map(p))
+
+        iface.layerTreeView().addIndicator(layer_group, xp_indicator)
+        iface.layerTreeView().addIndicator(layer_group, reload_indicator)
+        return layer_group
+
+    for tree_layer in layer_group.findLayers():  # type: QgsLayerTreeLayer
+        map_layer = tree_layer.layer()
+        if is_database_layer(map_layer):
+            # never truncate, the provider would empty the underlying table
+            map_layer.dataProvider().reloadData()
+        elif isinstance(map_layer, QgsVectorLayer):
+            truncate_success = map_layer.dataProvider().truncate()
+            if not truncate_success:
+                logger.warning(f'Could not truncate features of vector layer {map_layer.name()}')
+        elif isinstance(map_layer, QgsAnnotationLayer):
+            map_layer.clear()
+        elif isinstance(map_layer, QgsRasterLayer):
+            QgsProject.instance().removeMapLayer(map_layer)
+
+        MapLayerRegistry().unregisterFeatures(map_layer)
+
+    return layer_group
+
+
+class LoadPlanTask(QgsTask):
+    """
+    Lädt einen Plan im Hintergrund auf die Karte.
+
+    Der Plan wird mit dem `CanvasLoader` in einem eigenen Thread und einer eigenen Session aus der Datenbank abgerufen.
+    Die geladenen Objekte werden anschließend in Teilmengen an den Hauptthread übergeben, der sie auf der Karte
+    darstellt, sodass sich die Layer schrittweise füllen und QGIS bedienbar bleibt. Die nächste Teilmenge wird erst
+    übergeben, wenn die vorherige dargestellt wurde; ein Abbruch über den Taskmanager verwirft damit alle noch
+    ausstehenden Objekte.
+    """
+
+    BATCH_SIZE = 250
+
+    batchReady = pyqtSignal(list)
+
+    def __init__(self, plan_xid, layer_group: QgsLayerTreeGroup = None):
+        super(LoadPlanTask, self).__init__('Planwerk wird geladen', QgsTask.CanCancel)
+        self.plan_xid = str(plan_xid)
+        self.layer_group = layer_group
+        self.exception = None
 
-        root = QgsProject.instance().layerTreeRoot()
+        self._displayed = threading.Semaphore(0)
+        self._layer_group_ready = False
+        # emitted from the task thread, displayed on the main thread
+        self.batchReady.connect(self.displayBatch, Qt.QueuedConnection)
 
-        if not layer_group:
-            layer_group = root.insertGroup(0, plan.name)
-            layer_group.setCustomProperty('xplanung_id', str(plan.id))
-            layer_group.visibilityChanged.connect(MapLayerRegistry().on_group_node_visibility_changed)
+    def run(self) -> bool:
+        try:
+            with Session.begin() as session:
+                with count_queries(session) as counter:
+                    plan: XP_Plan = CanvasLoader(session).load(self.plan_xid)
+                if plan is None:
+                    raise ValueError(f'plan with id {self.plan_xid} not found')
+                logger.info(f'Planwerk {plan.name} mit {counter[0]} Datenbankabfragen geladen')
 
-            xp_indicator, reload_indicator = createXPlanungIndicators()
-            reload_indicator.clicked.connect(lambda i, p=plan_xid: plan_to_map(p))
+                self.setDescription(f'Planwerk {plan.name} wird geladen')
+                contents = list(canvas_contents(plan))
+                # the objects are displayed on the main thread and must not be expired or lazy loaded by this session
+                session.expunge_all()
+        except Exception as e:
+            self.exception = e
+            return False
 
-            iface.layerTreeView().addIndicator(layer_group, xp_indicator)
-            iface.layerTreeView().addIndicator(layer_group, reload_indicator)
+        for i in range(0, len(contents), self.BATCH_SIZE):
+            if self.isCanceled():
+                return False
+
+            self.batchReady.emit(contents[i:i + self.BATCH_SIZE])
+            while not self._displayed.acquire(timeout=0.1):
+                if self.isCanceled():
+                    return False
+            self.setProgress(100 * min(i + self.BATCH_SIZE, len(contents)) / len(contents))
+
+        return True
+
+    @pyqtSlot(list)
+    def displayBatch(self, contents: list):
+        try:
+            if self.isCanceled():
+                return
+
+            if not self._layer_group_ready:
+                self.layer_group = prepare_layer_group(contents[0], self.layer_group)
+                self._layer_group_ready = True
+
+            with batch_canvas_features():
+                for obj in contents:
+                    try:
+                        display_content(obj, self.layer_group, self.plan_xid)
+                    except Exception as e:
+                        logger.exception(f'{obj.__class__.__name__}:{obj.id} konnte nicht dargestellt werden: {e}')
+        finally:
+            self._displayed.release()
+
+    def finished(self, result: bool):
+        # on a reload the entry already belongs to the task that replaced this cancelled one
+        if _running_tasks.get(self.plan_xid) is self:
+            del _running_tasks[self.plan_xid]
+        _cancelled_tasks.discard(self)
+
+        if result:
+            iface.mainWindow().statusBar().showMessage('Planwerk auf der Karte geladen.')
+        elif self.exception is not None:
+            logger.error(f'Planwerk konnte nicht geladen werden: {self.exception}')
+            iface.messageBar().pushMessage('XPlanung', f'Planwerk konnte nicht geladen werden: {self.exception}',
+                                           level=Qgis.Critical)
         else:
-            for tree_layer in layer_group.findLayers():  # type: QgsLayerTreeLayer
-                map_layer = tree_layer.layer()
-                if isinstance(map_layer, QgsVectorLayer):
-                    truncate_success = map_layer.dataProvider().truncate()
-                    if not truncate_success:
-                        logger.warning(f'Could not truncate features of vector layer {map_layer.name()}')
-                elif isinstance(map_layer, QgsAnnotationLayer):
-                    map_layer.clear()
-                elif isinstance(map_layer, QgsRasterLayer):
-                    QgsProject.instance().removeMapLayer(map_layer)
-
-                for key in map_layer.customPropertyKeys():
-                    if 'xplanung/feat-' in key:
-                        map_layer.removeCustomProperty(key)
-
-        plan.toCanvas(layer_group)
-
-        for b in [b for b in plan.bereich]:  # if b.geltungsbereich? only load if geltungsbereich has geom
-            for planinhalt in b.planinhalt:
-                planinhalt.toCanvas(layer_group, plan_xid=plan.id)
-
-            # display "free" annotations which are not bound to a 'planinhalt'
-            for po in b.praesentationsobjekt:
-                if po.dientZurDarstellungVon_id:
-                    continue
-                po.toCanvas(layer_group, plan_xid=plan.id)
-
-            for simple_object in b.simple_geometry:
-                simple_object.toCanvas(layer_group, plan_xid=plan.id)
-
-            if b.geltungsbereich:
-                b.toCanvas(layer_group, plan_xid=plan.id)
-
-            for refScan in b.refScan:
-                if refScan.art == XP_ExterneReferenzArt.PlanMitGeoreferenz and refScan.file is not None:
-                    create_raster_layer(refScan.referenzName, refScan.file, group=layer_group)
-
-        for ext_ref in plan.externeReferenz:
-            if ext_ref.art == XP_ExterneReferenzArt.PlanMitGeoreferenz and ext_ref.file is not None:
-                create_raster_layer(ext_ref.referenzName, ext_ref.file, group=layer_group)
-
-    iface.mainWindow().statusBar().showMessage('Planwerk auf der Karte geladen.')
+            iface.mainWindow().statusBar().showMessage('Laden des Planwerks abgebrochen.')
+
+
+# running tasks by plan id, python references are required until the task manager finished the task
+_running_tasks: Dict[str, LoadPlanTask] = {}
+# tasks replaced by a reload of their plan, referenced until they stopped as well
+_cancelled_tasks: Set[LoadPlanTask] = set()
+
+
+def load_on_canvas(plan_xid, layer_group=None) -> LoadPlanTask:
+    """
+    Fügt den aktuell gewählten Plan als Layer zur Karte hinzu. Der Plan wird im Hintergrund geladen, ein bereits
+    laufender Ladevorgang desselben Plans wird abgebrochen.
+
+    Returns
+    -------
+    LoadPlanTask:
+        gestarteter Task
+    """
+    previous_task = _running_tasks.get(str(plan_xid))
+    if previous_task is not None:
+        previous_task.cancel()
+        _cancelled_tasks.add(previous_task)
+
+    iface.mainWindow().statusBar().showMessage('Planwerk wird geladen...')
+    task = LoadPlanTask(plan_xid, layer_group=layer_group)
+    _running_tasks[task.plan_xid] = task
+    QgsApplication.taskManager().addTask(task)
+    return task
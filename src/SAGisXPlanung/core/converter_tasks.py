@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import os
 from collections import namedtuple
 from pathlib import PurePath, Path
 from typing import Callable, Tuple
@@ -10,8 +11,9 @@ from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
 from SAGisXPlanung import Session
-from SAGisXPlanung.GML.GMLReader import GMLReader
-from SAGisXPlanung.GML.GMLWriter import GMLWriter
+from SAGisXPlanung.GML.GMLReader import GMLReader, GMLStreamReader
+from SAGisXPlanung.GML.GMLWriter import GMLStreamWriter
+from SAGisXPlanung.core.export_loader import ExportLoader, count_queries
 from SAGisXPlanung.Settings import Settings
 from SAGisXPlanung.XPlan.feature_types import XP_Plan
 from SAGisXPlanung.config import export_version, QgsConfig
@@ -21,6 +23,9 @@ logger = logging.getLogger(__name__)
 
 ImportResult = namedtuple('ImportResult', ['plan_name', 'warnings'])
 
+# XPlanGML-Dokumente ab dieser Größe (in Bytes) werden speicherschonend mit dem GMLStreamReader importiert
+STREAMING_IMPORT_THRESHOLD = 50 * 1024 * 1024
+
 
 class ActionCanceledException(Exception):
     pass
@@ -50,18 +55,15 @@ async def export_action(parent: QWidget, plan_xid: str, out_file_format: str = '
 
 
 def export_plan(out_file_format: str, export_filepath: str, plan_xid: str = None):
-    with Session.begin() as session:
-        plan = session.get(XP_Plan, plan_xid)
-        writer = GMLWriter(plan, version=export_version())
+    with Session.begin() as session, count_queries(session) as query_count:
+        plan = ExportLoader(session).load(plan_xid)
+        logger.debug(f'Plan {plan_xid} mit {query_count[0]} Abfragen geladen')
+        writer = GMLStreamWriter(plan, version=export_version(), server_side_geometries=True)
 
         if out_file_format == "gml":
-            gml = writer.toGML()
-            with open(export_filepath, 'wb') as f:
-                f.write(gml)
+            writer.write(export_filepath)
         elif out_file_format == "zip":
-            archive = writer.toArchive()
-            with open(export_filepath, 'wb') as f:
-                f.write(archive.getvalue())
+            writer.writeArchive(export_filepath)
 
 
 def import_plan(filepath: str, progress_callback: Callable[[Tuple[int, int]], None]) -> ImportResult:
@@ -70,24 +72,34 @@ def import_plan(filepath: str, progress_callback: Callable[[Tuple[int, int]], No
 
     # read contents of gml file
     if extension == '.gml':
-        with open(filepath, 'rb') as f:
-            gml_file_content = f.read()
+        if os.path.getsize(filepath) >= STREAMING_IMPORT_THRESHOLD:
+            reader = GMLStreamReader(filepath, progress_callback=progress_callback)
+        else:
+            with open(filepath, 'rb') as f:
+                gml_file_content = f.read()
+            reader = GMLReader(gml_file_content, progress_callback=progress_callback)
 
     # extract gml and references from zip archive
     elif extension == '.zip':
-        archive = ZipFile(filepath, mode='r')
-        if not archive.namelist():
-            raise ValueError('ZIP-Archiv enthält keine Dateien.')
-        if not any(PurePath(file_name).suffix == '.gml' for file_name in archive.namelist()):
-            raise ValueError('ZIP-Archiv enthält keine XPlanGML Datei.')
-        gml_file_index = next(i for i, name in enumerate(archive.namelist()) if PurePath(name).suffix == '.gml')
-        gml_file_content = archive.read(archive.namelist()[gml_file_index])
-
-        files = {file: archive.read(file) for i, file in enumerate(archive.namelist()) if i != gml_file_index}
+        with ZipFile(filepath, mode='r') as archive:
+            if not archive.namelist():
+                raise ValueError('ZIP-Archiv enthält keine Dateien.')
+            if not any(PurePath(file_name).suffix == '.gml' for file_name in archive.namelist()):
+                raise ValueError('ZIP-Archiv enthält keine XPlanGML Datei.')
+            gml_file_index = next(i for i, name in enumerate(archive.namelist()) if PurePath(name).suffix == '.gml')
+            gml_file_info = archive.infolist()[gml_file_index]
+
+            files = {file: archive.read(file) for i, file in enumerate(archive.namelist()) if i != gml_file_index}
+
+            if gml_file_info.file_size >= STREAMING_IMPORT_THRESHOLD:
+                with archive.open(gml_file_info) as gml_file:
+                    reader = GMLStreamReader(gml_file, files=files, progress_callback=progress_callback)
+            else:
+                gml_file_content = archive.read(gml_file_info)
+                reader = GMLReader(gml_file_content, files=files, progress_callback=progress_callback)
     else:
         raise ValueError('Dateipfad muss mit .gml oder .zip enden.')
 
-    reader = GMLReader(gml_file_content, files=files, progress_callback=progress_callback)
     result = ImportResult(reader.plan.name, reader.warnings)
 
     save_plan(reader.plan)
@@ -0,0 +1,162 @@
+import logging
+import uuid
+from typing import List, Iterable, Optional
+
+from qgis.core import QgsVectorLayer, QgsDataSourceUri, QgsProviderRegistry, QgsWkbTypes, QgsMapLayer
+from qgis.PyQt.QtCore import QSettings, QTimer
+from qgis.PyQt import sip
+from sqlalchemy import select, cast, Text, case, func, null, literal_column, type_coerce, union_all, Boolean, Enum, \
+    ARRAY
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import ColumnProperty
+from sqlalchemy.types import NullType
+
+from SAGisXPlanung.XPlan.types import GeometryType
+from SAGisXPlanung.config import QgsConfig, export_version
+
+logger = logging.getLogger(__name__)
+
+DATABASE_PROVIDER = 'postgres'
+
+# dimension (ST_Dimension) and layer type of the geometries shown in a layer of the given geometry type
+GEOMETRY_DIMENSIONS = {
+    QgsWkbTypes.PointGeometry: 0,
+    QgsWkbTypes.LineGeometry: 1,
+    QgsWkbTypes.PolygonGeometry: 2
+}
+LAYER_WKB_TYPES = {
+    QgsWkbTypes.PointGeometry: QgsWkbTypes.MultiPoint,
+    QgsWkbTypes.LineGeometry: QgsWkbTypes.MultiLineString,
+    QgsWkbTypes.PolygonGeometry: QgsWkbTypes.MultiPolygon
+}
+
+
+def is_database_layer(layer: QgsMapLayer) -> bool:
+    """ Gibt zurück, ob der Layer seine Features über den PostGIS-Provider direkt aus der Datenbank abruft """
+    return isinstance(layer, QgsVectorLayer) and layer.providerType() == DATABASE_PROVIDER
+
+
+def reload_database_layer(layer: QgsVectorLayer):
+    """ Lädt die Features eines Datenbanklayers neu, nachdem die laufende Transaktion abgeschlossen wurde """
+    def _reload():
+        if sip.isdeleted(layer):
+            return
+        layer.dataProvider().reloadData()
+        layer.triggerRepaint()
+
+    # the provider uses its own connection, changes of the current session are only visible after the commit
+    QTimer.singleShot(0, _reload)
+
+
+def layer_field_names(cls) -> List[str]:
+    """ Attribute eines Layers der Klasse, entspricht den Feldern von `MapCanvasMixin.asLayer` """
+    field_names = cls.element_order(only_columns=True, include_base=True, with_geometry=False,
+                                    version=export_version())
+    return list(dict.fromkeys(field_names + ['drehwinkel', 'skalierung']))
+
+
+def field_expression(cls, field_name: str, legacy_fields: Iterable[str]):
+    """
+    SQL-Ausdruck eines Layerattributs. Werte werden in derselben Textdarstellung wie in `MapCanvasMixin.asFeature`
+    abgefragt, damit die Filterausdrücke der Renderer unverändert gelten.
+    """
+    prop = cls.__mapper__.attrs.get(field_name)
+    if not isinstance(prop, ColumnProperty):
+        return cast(null(), Text).label(field_name)
+
+    column = getattr(cls, field_name)
+    column_type = prop.columns[0].type
+    if isinstance(column_type, Boolean):
+        expression = case((column, 'True'), (~column, 'False'))
+    elif isinstance(column_type, Enum) and column_type.enum_class is not None and field_name in legacy_fields:
+        # legacy layer fields display the enum value instead of its name
+        expression = case({e.name: str(e.value) for e in column_type.enum_class}, value=cast(column, Text))
+    elif isinstance(column_type, ARRAY):
+        expression = func.array_to_string(cast(column, ARRAY(Text)), ', ')
+    else:
+        expression = cast(column, Text)
+    return expression.label(field_name)
+
+
+def layer_query(cls, plan_xid, geom_type: GeometryType = None) -> str:
+    """
+    Erstellt die SQL-Abfrage aller Objekte einer Klasse in einem Plan.
+
+    QGIS ergänzt die Abfrage beim Rendern um einen Filter auf den aktuellen Kartenausschnitt, der von PostgreSQL in
+    die Abfrage übernommen wird, sodass der räumliche Index der Geometriespalte genutzt wird.
+
+    Parameters
+    ----------
+    cls:
+        Klasse der Planinhalte
+    plan_xid:
+        ID des Plans
+    geom_type: GeometryType
+        Geometrietyp der Objekte, die im Layer dargestellt werden (nur bei Klassen mit variablem Raumbezug)
+
+    Returns
+    -------
+    str:
+        SQL-Abfrage als Datenquelle eines PostGIS-Layers
+    """
+    from SAGisXPlanung.MapLayerRegistry import XID_FIELD
+    from SAGisXPlanung.XPlan.feature_types import XP_Bereich
+
+    # validated uuid literal, the query is embedded into the data source and can't use bind parameters
+    plan_id = literal_column(f"'{uuid.UUID(str(plan_xid))}'::uuid")
+    bereich_ids = union_all(*(
+        select(mapper.local_table.c.id).where(mapper.local_table.c.gehoertZuPlan_id == plan_id)
+        for mapper in XP_Bereich.__mapper__.self_and_descendants if 'gehoertZuPlan_id' in mapper.local_table.c
+    ))
+
+    legacy_fields = cls().layer_fields().keys() if hasattr(cls, 'layer_fields') else ()
+    geometry_column = getattr(cls, cls.__geometry_column_name__)
+    stmt = select(
+        cls.id,
+        cast(cls.id, Text).label(XID_FIELD),
+        # select the plain geometry, geoalchemy would otherwise wrap the column with ST_AsEWKB
+        type_coerce(geometry_column, NullType()).label(cls.__geometry_column_name__),
+        *(field_expression(cls, name, legacy_fields) for name in layer_field_names(cls))
+    ).where(
+        cls.gehoertZuBereich_id.in_(bereich_ids),
+        cls.__mapper__.polymorphic_on.in_([cls.__mapper__.polymorphic_identity])
+    )
+    if geom_type in GEOMETRY_DIMENSIONS:
+        stmt = stmt.where(func.ST_Dimension(geometry_column) == GEOMETRY_DIMENSIONS[geom_type])
+
+    compiled = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+    return str(compiled).replace('\n', ' ')
+
+
+def database_layer(cls, srid: int, plan_xid, name: str, geom_type: GeometryType) -> Optional[QgsVectorLayer]:
+    """
+    Erstellt einen PostGIS-Layer über alle Objekte einer Klasse in einem Plan mit der aktuell konfigurierten
+    Datenbankverbindung.
+
+    Returns
+    -------
+    QgsVectorLayer:
+        gültiger Layer oder None, wenn der Layer nicht erstellt werden konnte
+    """
+    connection_name = QSettings().value(QgsConfig.CONNECTION)
+    metadata = QgsProviderRegistry.instance().providerMetadata(DATABASE_PROVIDER)
+    try:
+        connection = metadata.findConnection(connection_name)
+    except Exception:
+        connection = None
+    if connection is None:
+        logger.warning(f'Datenbankverbindung {connection_name} nicht gefunden')
+        return
+
+    uri = QgsDataSourceUri(connection.uri())
+    uri.setDataSource('', f'({layer_query(cls, plan_xid, geom_type)})', cls.__geometry_column_name__, '', 'id')
+    uri.setSrid(str(srid))
+    uri.setWkbType(LAYER_WKB_TYPES.get(geom_type, QgsWkbTypes.Unknown))
+    uri.setUseEstimatedMetadata(True)
+
+    layer = QgsVectorLayer(uri.uri(False), name, DATABASE_PROVIDER)
+    if not layer.isValid():
+        logger.warning(f'Datenbanklayer {name} konnte nicht erstellt werden: {layer.error().summary()}')
+        return
+
+    return layer
@@ -0,0 +1,164 @@
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import List, Tuple, Optional, Iterator
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import selectinload, undefer, RelationshipProperty
+from sqlalchemy.orm.interfaces import MANYTOONE
+
+from SAGisXPlanung.XPlan.feature_types import XP_Plan
+
+logger = logging.getLogger(__name__)
+
+
+class ExportLoader:
+    """
+    Lädt den vollständigen Objektgraphen eines Plans für den Export.
+
+    Die Ladestrategie wird aus den Relationen der Klassen abgeleitet: Relationen mit delete-Cascade (Bereiche,
+    Planinhalte, Präsentationsobjekte, Datentypen) bilden den Objektgraphen und werden rekursiv geladen, Verweise auf
+    vorbelegte Objekte (Gemeinde, Plangeber, ...) werden eager geladen, aber nicht weiter verfolgt. Rückverweise
+    auf das übergeordnete Objekt werden übersprungen, da dieses bereits geladen ist.
+
+    Je konkreter Klasse im Graphen wird eine Abfrage mit selectinload-Optionen für deren Relationen ausgeführt, die
+    Anzahl der Abfragen hängt damit nur von den vorkommenden Klassen ab und nicht von der Anzahl der Objekte.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._loaded = defaultdict(set)
+
+    def load(self, plan_id) -> Optional[XP_Plan]:
+        """
+        Lädt einen Plan mit allen abhängigen Objekten.
+
+        Parameters
+        ----------
+        plan_id:
+            ID des Plans
+
+        Returns
+        -------
+        XP_Plan:
+            vollständig geladener Plan oder None, wenn kein Plan mit der ID existiert
+        """
+        plan = self.session.get(XP_Plan, plan_id)
+        if plan is None:
+            return
+
+        pending = [plan]
+        while pending:
+            objects_by_class = defaultdict(list)
+            for obj in pending:
+                identity = inspect(obj).identity
+                if identity is None or identity in self._loaded[obj.__class__]:
+                    continue
+                self._loaded[obj.__class__].add(identity)
+                objects_by_class[obj.__class__].append(obj)
+
+            pending = []
+            for cls, objects in objects_by_class.items():
+                pending.extend(self.load_class(cls, objects))
+
+        return plan
+
+    def load_class(self, cls, objects: list) -> list:
+        """
+        Lädt alle Spalten und eager zu ladenden Relationen der Objekte einer Klasse in einer Abfrage je Relation.
+
+        Returns
+        -------
+        list:
+            abhängige Objekte, die im nächsten Schritt geladen werden müssen
+        """
+        eager, children = self.strategy(cls)
+
+        pk = cls.__mapper__.primary_key[0]
+        ids = [inspect(obj).identity[0] for obj in objects]
+        # loads subclass tables and deferred columns of polymorphically loaded objects as well
+        self.session.query(cls).filter(pk.in_(ids)).options(
+            undefer('*'), *(selectinload(getattr(cls, name)) for name in eager)
+        ).all()
+
+        related = []
+        for obj in objects:
+            for name in children:
+                value = getattr(obj, name)
+                if value is None:
+                    continue
+                if isinstance(value, list):
+                    related.extend(value)
+                else:
+                    related.append(value)
+        return related
+
+    def strategy(self, cls) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        """ Ladestrategie einer Klasse, kann in abgeleiteten Loadern eingeschränkt werden """
+        return ExportLoader.loader_strategy(cls)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def loader_strategy(cls) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        """
+        Leitet die Ladestrategie einer Klasse aus ihren Relationen ab.
+
+        Returns
+        -------
+        tuple, tuple:
+            Namen der eager zu ladenden Relationen, Namen der Relationen zu abhängigen Objekten
+        """
+        eager = []
+        children = []
+        for name, rel in cls.__mapper__.relationships.items():
+            if is_composition(rel):
+                eager.append(name)
+                children.append(name)
+            elif rel.direction is MANYTOONE and (reverse := reverse_relationship(rel)) is not None \
+                    and is_composition(reverse):
+                # back reference to the owning object, which is always loaded before
+                continue
+            else:
+                eager.append(name)
+        return tuple(eager), tuple(children)
+
+
+def is_composition(rel: RelationshipProperty) -> bool:
+    """ Gibt zurück, ob die Relation auf abhängige Objekte verweist, die mit dem Objekt gelöscht werden """
+    return rel.direction is not MANYTOONE and rel.secondary is None and rel.cascade.delete
+
+
+def reverse_relationship(rel: RelationshipProperty) -> Optional[RelationshipProperty]:
+    if not rel.back_populates:
+        return
+    for mapper in rel.mapper.self_and_descendants:
+        if rel.back_populates in mapper.relationships:
+            return mapper.relationships[rel.back_populates]
+
+
+@contextmanager
+def count_queries(session) -> Iterator[List[int]]:
+    """
+    Zählt die innerhalb des Kontexts über die Session ausgeführten SQL-Abfragen. Gezählt werden nur Abfragen über die
+    Verbindung der laufenden Transaktion der Session, Abfragen anderer Sessions auf derselben Engine nicht.
+
+    Examples
+    --------
+    >>> with count_queries(session) as counter:
+    ...     ExportLoader(session).load(plan_id)
+    >>> counter[0]
+    12
+    """
+    counter = [0]
+    # listening on the engine would count the queries of all threads using the shared engine
+    connection = session.connection()
+
+    def before_cursor_execute(*args):
+        counter[0] += 1
+
+    event.listen(connection, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(connection, 'before_cursor_execute', before_cursor_execute)
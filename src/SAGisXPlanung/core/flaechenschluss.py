@@ -0,0 +1,87 @@
+import logging
+from typing import Dict, Iterable
+from uuid import UUID as PyUUID
+
+from geoalchemy2 import Geometry, WKBElement
+from sqlalchemy import text, bindparam, String, Boolean
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
+from sqlalchemy.sql.elements import TextClause
+
+logger = logging.getLogger(__name__)
+
+# tables of all object types with a flaechenschluss attribute, SO objects can be part of BP and FP plans
+FLAECHENSCHLUSS_TABLES = ['bp_objekt', 'fp_objekt', 'so_objekt']
+
+# vertices of the flaechenschluss objects within this distance (map units) to the Geltungsbereich are snapped onto it,
+# so that small digitizing inaccuracies along the border don't leave slivers
+SNAP_TOLERANCE = 0.001
+
+
+def uncovered_areas_statement(plan_class: type) -> TextClause:
+    """
+    Abfrage der Flächen je Bereich eines Plans (Parameter `plan_id`), die nicht von Flächenschlussobjekten abgedeckt
+    sind.
+
+    Die Flächenschlussobjekte werden je Bereich in der Datenbank vereinigt (`ST_UnaryUnion(ST_Collect(..))`), an den
+    Geltungsbereich gesnappt (Parameter `tolerance`) und vom Geltungsbereich abgezogen. Ohne eigenen Geltungsbereich
+    wird der Geltungsbereich des Plans verwendet. Objekte der Klassen in `exclude_types` (polymorphe Identitäten)
+    werden nicht berücksichtigt.
+    """
+    # table prefix of the plan type (bp, fp, ...), identifiers can't be passed as bind parameters
+    p = str(plan_class.__name__[:2]).lower()
+    objects = ' UNION ALL '.join(f'SELECT id, position FROM {table} WHERE flaechenschluss = True'
+                                 for table in FLAECHENSCHLUSS_TABLES)
+    stmt = text(f"""
+        WITH bereich_areas AS (
+            SELECT b.id AS bereich_id,
+                COALESCE(xp_b.geltungsbereich, xp_p."raeumlicherGeltungsbereich") AS geltungsbereich
+            FROM {p}_bereich b
+            JOIN xp_bereich xp_b ON xp_b.id = b.id
+            JOIN xp_plan xp_p ON xp_p.id = b."gehoertZuPlan_id"
+            WHERE b."gehoertZuPlan_id" = :plan_id
+        ),
+        coverage AS (
+            SELECT xp_o."gehoertZuBereich_id" AS bereich_id, ST_UnaryUnion(ST_Collect(o.position)) AS geom
+            FROM ({objects}) o
+            JOIN xp_objekt xp_o ON xp_o.id = o.id
+            WHERE xp_o."gehoertZuBereich_id" IN (SELECT bereich_id FROM bereich_areas)
+                AND xp_o.type <> ALL(:exclude_types)
+            GROUP BY xp_o."gehoertZuBereich_id"
+        ),
+        differences AS (
+            SELECT a.bereich_id,
+                ST_Multi(ST_CollectionExtract(
+                    CASE WHEN c.geom IS NULL THEN a.geltungsbereich
+                    ELSE ST_Difference(a.geltungsbereich, ST_Snap(c.geom, a.geltungsbereich, :tolerance)) END,
+                3)) AS geom
+            FROM bereich_areas a
+            LEFT JOIN coverage c ON c.bereich_id = a.bereich_id
+            WHERE a.geltungsbereich IS NOT NULL
+        )
+        SELECT bereich_id, ST_AsEWKB(geom) AS geom, ST_IsEmpty(geom) AS is_empty
+        FROM differences
+    """)
+    return stmt.bindparams(
+        bindparam('plan_id', type_=UUID(as_uuid=True)),
+        bindparam('exclude_types', type_=ARRAY(String)),
+        bindparam('tolerance')
+    ).columns(bereich_id=UUID(as_uuid=True), geom=Geometry(), is_empty=Boolean)
+
+
+def uncovered_areas(session, plan_class: type, plan_id, exclude_types: Iterable[str] = (),
+                    tolerance: float = SNAP_TOLERANCE) -> Dict[PyUUID, WKBElement]:
+    """
+    Ermittelt die Flächen ohne Flächenschlussobjekt aller Bereiche eines Plans in einer Abfrage. Die Geometrien der
+    Planinhalte werden dabei nicht geladen.
+
+    Returns
+    -------
+    Dict[UUID, WKBElement]:
+        nicht abgedeckte Fläche (MultiPolygon) je Bereich-ID, Bereiche ohne Lücken sind nicht enthalten
+    """
+    rows = session.execute(uncovered_areas_statement(plan_class), {
+        'plan_id': plan_id,
+        'exclude_types': list(exclude_types),
+        'tolerance': tolerance
+    })
+    return {row.bereich_id: row.geom for row in rows if not row.is_empty}
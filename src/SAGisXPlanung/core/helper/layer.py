@@ -1,10 +1,12 @@
 import logging
 from typing import List, Any
 
-from qgis.core import QgsFeatureRequest
+from qgis.core import QgsMapLayer, QgsVectorLayer, QgsVectorDataProvider, QgsField, QgsEditorWidgetSetup
+from qgis.PyQt.QtCore import QVariant
 
-from SAGisXPlanung.MapLayerRegistry import MapLayerRegistry
+from SAGisXPlanung.MapLayerRegistry import MapLayerRegistry, XID_FIELD, LEGACY_FEATURE_PROPERTY_PREFIX
 from SAGisXPlanung.XPlanungItem import XPlanungItem
+from SAGisXPlanung.core.database_layers import is_database_layer, reload_database_layer
 
 logger = logging.getLogger(__name__)
 
@@ -34,14 +36,12 @@ def update_field_values(xplan_items: List[XPlanungItem], update_map: dict[str, A
     if not layer:
         logger.warning(f"QAttributeEdit::update_layer_field_value: layer is None")
         return
+    if is_database_layer(layer):
+        reload_database_layer(layer)
+        return
 
-    feature_ids = []
-    xids = [item.xid for item in xplan_items]
-    cp = layer.customProperties()
-    for feat in layer.getFeatures(QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setNoAttributes()):
-        id_prop = cp.value(f'xplanung/feat-{feat.id()}')
-        if id_prop in xids:
-            feature_ids.append(feat.id())
+    registry = MapLayerRegistry()
+    feature_ids = [feat_id for item in xplan_items if (feat_id := registry.featureId(str(item.xid))) is not None]
 
     # change update_map from [str, Any] entries to [int, Any] where int is the QGIS field id
     fields = layer.fields()
@@ -67,3 +67,66 @@ def update_field_values(xplan_items: List[XPlanungItem], update_map: dict[str, A
     else:
         logger.warning('attribute changes not persisted to dataprovider')
 
+
+def add_xid_field(layer: QgsVectorLayer) -> int:
+    """
+    Fügt dem Layer das versteckte Attribut `XID_FIELD` hinzu, welches die ID des dargestellten XPlanung-Objekts
+    enthält, und erstellt einen Attributindex darauf.
+
+    Returns
+    -------
+    int:
+        Index des Attributs
+    """
+    dp = layer.dataProvider()
+    dp.addAttributes([QgsField(XID_FIELD, QVariant.String, 'string')])
+    layer.updateFields()
+
+    field_index = layer.fields().indexOf(XID_FIELD)
+    if dp.capabilities() & QgsVectorDataProvider.CreateAttributeIndex:
+        dp.createAttributeIndex(field_index)
+
+    hide_field(layer, field_index)
+    return field_index
+
+
+def hide_field(layer: QgsVectorLayer, field_index: int):
+    """ Blendet ein Attribut im Formular und in der Attributtabelle des Layers aus """
+    layer.setEditorWidgetSetup(field_index, QgsEditorWidgetSetup('Hidden', {}))
+
+    field_name = layer.fields().at(field_index).name()
+    table_config = layer.attributeTableConfig()
+    table_config.update(layer.fields())
+    columns = table_config.columns()
+    for column in columns:
+        if column.name == field_name:
+            column.hidden = True
+    table_config.setColumns(columns)
+    layer.setAttributeTableConfig(table_config)
+
+
+def migrate_feature_properties(layer: QgsMapLayer):
+    """
+    Überführt die in Projekten älterer Versionen als Layer-Eigenschaften `xplanung/feat-<id>` gespeicherten
+    Verknüpfungen von Features und XPlanung-Objekten in das Attribut `XID_FIELD` und entfernt die Eigenschaften.
+    Vektorlayern ohne das Attribut wird dieses hinzugefügt.
+    """
+    keys = [key for key in layer.customPropertyKeys() if key.startswith(LEGACY_FEATURE_PROPERTY_PREFIX)]
+
+    if isinstance(layer, QgsVectorLayer):
+        field_index = layer.fields().indexOf(XID_FIELD)
+        if field_index < 0:
+            field_index = add_xid_field(layer)
+
+        changes = {}
+        for key in keys:
+            try:
+                feat_id = int(key[len(LEGACY_FEATURE_PROPERTY_PREFIX):])
+            except ValueError:
+                continue
+            changes[feat_id] = {field_index: layer.customProperty(key)}
+        if changes and not layer.dataProvider().changeAttributeValues(changes):
+            logger.warning(f'XPlanung-IDs konnten nicht in die Features des Layers {layer.name()} übernommen werden')
+
+    for key in keys:
+        layer.removeCustomProperty(key)
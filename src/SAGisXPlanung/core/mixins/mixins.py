@@ -1,6 +1,6 @@
 import logging
 from inspect import signature
-from typing import Tuple, Union, Any, Iterator, Iterable
+from typing import Tuple, Union, Any, Iterator, Iterable, Dict, List
 
 from qgis.core import (QgsFields, QgsFeature, QgsVectorLayer, QgsField, QgsEditorWidgetSetup, QgsAnnotationLayer,
                        QgsWkbTypes)
@@ -13,7 +13,7 @@ from SAGisXPlanung.GML.geometry import geom_type_as_layer_url
 from SAGisXPlanung.XPlan.types import GeometryType
 from SAGisXPlanung.XPlanungItem import XPlanungItem
 
-from SAGisXPlanung.config import xplan_tooltip, export_version, QgsConfig
+from SAGisXPlanung.config import xplan_tooltip, export_version, QgsConfig, CanvasDisplayMode
 
 logger = logging.getLogger(__name__)
 
@@ -148,7 +148,21 @@ class ElementOrderDeclarativeInheritanceFixMixin:
 class ElementOrderMixin:
     """ Mixin, dass eine Methode zur Auflösung der Reihenfolge der Attribute jedes XPlanung-Objekts bietet.
         Ist das XPlanung-Objekt in eine Vererbungshierarchie eingebunden, muss die XPlanung-Basisklasse in der
-        Deklaration aller Basisklassen immer zuerst stehen, damit die Methode element_order korrekt funktioniert. """
+        Deklaration aller Basisklassen immer zuerst stehen, damit die Methode element_order korrekt funktioniert.
+
+        Die Ergebnisse von `element_order` und `attr_fits_version` hängen nur von der Klassendeklaration und den
+        Parametern ab und werden daher zwischengespeichert. """
+
+    # (cls, parameters) -> attribute names, shared by all classes
+    _element_order_cache: Dict[tuple, Tuple[str, ...]] = {}
+    # (cls, attr_name, version) -> bool
+    _attr_version_cache: Dict[tuple, bool] = {}
+
+    @staticmethod
+    def clear_element_order_cache():
+        """ Verwirft alle zwischengespeicherten Attributreihenfolgen, z.B. wenn die XPlanung-Version gewechselt wird """
+        ElementOrderMixin._element_order_cache.clear()
+        ElementOrderMixin._attr_version_cache.clear()
 
     @classmethod
     def element_order(cls,
@@ -157,7 +171,28 @@ class ElementOrderMixin:
                       export=True,
                       with_geometry=True,
                       geometry_column_name='',
-                      version=XPlanVersion.FIVE_THREE):
+                      version=XPlanVersion.FIVE_THREE) -> List[str]:
+        key = (cls, include_base, only_columns, export, with_geometry, geometry_column_name, version)
+        order = ElementOrderMixin._element_order_cache.get(key)
+        if order is None:
+            order = tuple(cls._element_order(include_base=include_base, only_columns=only_columns, export=export,
+                                             with_geometry=with_geometry, geometry_column_name=geometry_column_name,
+                                             version=version))
+            ElementOrderMixin._element_order_cache[key] = order
+        # callers are free to modify the returned list
+        return list(order)
+
+    @classmethod
+    def _element_order(cls,
+                       include_base=True,
+                       only_columns=False,
+                       export=True,
+                       with_geometry=True,
+                       geometry_column_name='',
+                       version=XPlanVersion.FIVE_THREE,
+                       cached=True) -> List[str]:
+        """ Ermittelt die Reihenfolge der Attribute ohne Cache der Klasse selbst, Basisklassen werden bei
+            `cached=False` ebenfalls neu ausgewertet """
         if only_columns:
             order = cls.__table__.columns.keys()
             order = [cls.normalize_column_name(x) for x in order if cls.attr_is_treated_as_column(x)]
@@ -170,38 +205,57 @@ class ElementOrderMixin:
                           or isinstance(value, classmethod))]
 
         if version is not None:
-            order = [x for x in order if cls.attr_fits_version(x, version)]
+            if cached:
+                order = [x for x in order if cls.attr_fits_version(x, version)]
+            else:
+                order = [x for x in order if cls._attr_fits_version(x, version)]
 
         if not export and hasattr(cls, 'hidden_inputs'):
-            order = [x for x in order if x not in cls.hidden_inputs()]
+            hidden = set(cls.hidden_inputs())
+            order = [x for x in order if x not in hidden]
         elif export and hasattr(cls, 'avoid_export'):
-            order = [x for x in order if x not in cls.avoid_export()]
+            avoided = set(cls.avoid_export())
+            order = [x for x in order if x not in avoided]
 
         # remove sqlalchemy utility attributes and geometry column
-        exclude = ['type', 'id']
+        exclude = {'type', 'id'}
         if not with_geometry:
             if hasattr(cls, '__geometry_column_name__'):
                 geometry_column_name = cls.__geometry_column_name__
-            exclude.append(geometry_column_name)
+            exclude.add(geometry_column_name)
         order = [x for x in order if x not in exclude]
 
         try:
             bases = cls.__bases__[-1]
-            base_order = bases.element_order(only_columns=only_columns, export=export, with_geometry=with_geometry,
-                                             geometry_column_name=geometry_column_name, version=version)
+            kwargs = dict(only_columns=only_columns, export=export, with_geometry=with_geometry,
+                          geometry_column_name=geometry_column_name, version=version)
+            if cached:
+                base_order = bases.element_order(**kwargs)
+            else:
+                base_order = bases._element_order(**kwargs, cached=False)
+            base_names = set(base_order)
 
             if not include_base and not hasattr(cls, 'is_declarative_base'):
-                return [x for x in order if x not in base_order]
+                return [x for x in order if x not in base_names]
             # why was this check even introduced?
             # if only_columns:
             #     return order
-            return base_order + [x for x in order if x not in base_order]
+            return base_order + [x for x in order if x not in base_names]
         except Exception as e:
             return order
 
     @classmethod
     def attr_fits_version(cls, attr_name: str, version: XPlanVersion) -> bool:
         """ Überprüft, ob ein XPlanung-Attribut zur gegebenen Version des Standards gehört"""
+        key = (cls, attr_name, version)
+        fits = ElementOrderMixin._attr_version_cache.get(key)
+        if fits is None:
+            fits = cls._attr_fits_version(attr_name, version)
+            ElementOrderMixin._attr_version_cache[key] = fits
+        return fits
+
+    @classmethod
+    def _attr_fits_version(cls, attr_name: str, version: XPlanVersion) -> bool:
         attr = getattr(cls, attr_name)
         if hasattr(attr, "version") and attr.version != version:
             return False
@@ -279,6 +333,8 @@ class MapCanvasMixin:
 
     def toCanvas(self, layer_group, plan_xid=None):
         from SAGisXPlanung.MapLayerRegistry import MapLayerRegistry
+        from SAGisXPlanung.core.canvas_display import CanvasFeatureBatch
+        from SAGisXPlanung.core.database_layers import is_database_layer, reload_database_layer
 
         try:
             srs = self.srs().postgisSrid()
@@ -296,15 +352,33 @@ class MapCanvasMixin:
         plan_id = str(plan_xid) if plan_xid else str(self.id)
         layer = MapLayerRegistry().layerByXid(XPlanungItem(xid=self.id, xtype=self.__class__, plan_xid=plan_id),
                                               geom_type=geom_type)
+        if not layer and self.supportsDatabaseLayer() \
+                and QgsConfig.canvas_display_mode() == CanvasDisplayMode.Database:
+            layer = self.asDatabaseLayer(srs, plan_id, name=self.displayName(), geom_type=geom_type)
         if not layer:
             layer = self.asLayer(srs, plan_id, name=self.displayName(), geom_type=geom_type)
 
+        if is_database_layer(layer):
+            # features are queried by the provider, only the displayed object needs to be known
+            if MapLayerRegistry().layerById(layer.id()) is not None and CanvasFeatureBatch.active is None:
+                reload_database_layer(layer)
+            MapLayerRegistry().registerFeature(layer, None, str(self.id))
+            MapLayerRegistry().addLayer(layer, group=layer_group)
+            return
+
+        batch = CanvasFeatureBatch.active
+        if batch is not None and isinstance(layer, QgsVectorLayer):
+            # inserted together with all other features of the layer when the batch is flushed
+            batch.addFeature(layer, self.asFeature(layer.fields()), str(self.id))
+            MapLayerRegistry().addLayer(layer, group=layer_group)
+            return
+
         feat_id = None
         if isinstance(layer, QgsVectorLayer):
             feat_id = self.addFeatureToLayer(layer, self.asFeature(layer.fields()))
         elif isinstance(layer, QgsAnnotationLayer):
             feat_id = layer.addItem(self.asFeature())
-        layer.setCustomProperty(f'xplanung/feat-{feat_id}', str(self.id))
+        MapLayerRegistry().registerFeature(layer, feat_id, str(self.id))
         MapLayerRegistry().addLayer(layer, group=layer_group)
 
     def asFeature(self, fields: QgsFields = None) -> QgsFeature:
@@ -330,6 +404,10 @@ class MapCanvasMixin:
             except KeyError as e:
                 pass
 
+        from SAGisXPlanung.MapLayerRegistry import XID_FIELD
+        if fields is not None and fields.indexOf(XID_FIELD) >= 0:
+            feat[XID_FIELD] = str(self.id)
+
         return feat
 
     def addFeatureToLayer(self, layer, feat):
@@ -354,11 +432,7 @@ class MapCanvasMixin:
         if issubclass(cls, XP_Objekt):
             layer.setReadOnly(True)
 
-        if hasattr(cls, 'renderer'):
-            if signature(cls.renderer).parameters.get("geom_type"):
-                layer.setRenderer(cls.renderer(geom_type))
-            else:
-                layer.setRenderer(cls.renderer())
+        cls.setLayerRenderer(layer, geom_type)
 
         field_names = cls.element_order(only_columns=True, include_base=True,
                                         with_geometry=False, version=export_version())
@@ -369,6 +443,9 @@ class MapCanvasMixin:
         layer.dataProvider().addAttributes(fields)
         layer.updateFields()
 
+        from SAGisXPlanung.core.helper.layer import add_xid_field
+        add_xid_field(layer)
+
         for i, field_name in enumerate(field_names):
             # exclude relationship columns
             if (rel := next((r for r in cls.relationships() if r[0] == field_name), None)) is not None:
@@ -378,3 +455,39 @@ class MapCanvasMixin:
             layer.setEditorWidgetSetup(i, widget_setup)
 
         return layer
+
+    @classmethod
+    def setLayerRenderer(cls, layer: QgsVectorLayer, geom_type=None):
+        if not hasattr(cls, 'renderer'):
+            return
+        if signature(cls.renderer).parameters.get("geom_type"):
+            layer.setRenderer(cls.renderer(geom_type))
+        else:
+            layer.setRenderer(cls.renderer())
+
+    @classmethod
+    def supportsDatabaseLayer(cls) -> bool:
+        """ Gibt zurück, ob Objekte der Klasse in Layern dargestellt werden können, die ihre Features direkt aus der
+            Datenbank abrufen (`CanvasDisplayMode.Database`) """
+        from SAGisXPlanung.XPlan.feature_types import XP_Objekt
+
+        return issubclass(cls, XP_Objekt)
+
+    @classmethod
+    def asDatabaseLayer(cls, srid, plan_xid, name=None, geom_type=None) -> Union[None, QgsVectorLayer]:
+        from SAGisXPlanung.core.database_layers import database_layer
+        from SAGisXPlanung.core.helper.layer import hide_field
+        from SAGisXPlanung.MapLayerRegistry import XID_FIELD
+
+        geom_type = geom_type if geom_type is not None else cls.__geometry_type__
+        layer = database_layer(cls, srid, plan_xid, cls.__name__ if not name else name, geom_type)
+        if layer is None:
+            return
+
+        layer.setCustomProperty('xplanung/type', cls.__name__)
+        layer.setCustomProperty('xplanung/plan-xid', str(plan_xid))
+        layer.setReadOnly(True)
+        cls.setLayerRenderer(layer, geom_type)
+        hide_field(layer, layer.fields().indexOf(XID_FIELD))
+
+        return layer
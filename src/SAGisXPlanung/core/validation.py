@@ -0,0 +1,463 @@
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import List, Optional, Sequence, Union, Dict
+
+import numpy as np
+import shapely
+from geoalchemy2 import WKBElement, WKTElement
+
+logger = logging.getLogger(__name__)
+
+# QgsGeometry.removeDuplicateNodes default tolerance
+DUPLICATE_VERTEX_TOLERANCE = 4 * np.finfo(float).eps
+
+
+class GeometryIntersectionType(Enum):
+    """ Gibt an, welcher Grund einen Überschneidungsfehler hevorgerufen hat. """
+
+    Planinhalt = 'Flächenschlussobjekt weist Überschneidung auf'
+    Bereich = 'Planinhalt liegt nicht vollständig im Bereich'
+    Plan = 'Bereich liegt nicht vollständig im Geltungsbereich des Plans'
+    NotCovered = 'Kein Flächenschluss vorliegend'
+
+
+@dataclass
+class ValidationResult:
+    xid: str
+    xtype: type
+    error_msg: str = None
+    geom_wkt: str = None
+    intersection_type: GeometryIntersectionType = None
+    other_xid: str = None
+    other_xtype: type = None
+
+
+@dataclass
+class ValidationFeature:
+    """ Geometrie eines XPlanung-Objekts als Eingabe der `GeometryValidationEngine` """
+    xid: str
+    xtype: type
+    wkb: Union[bytes, str, None]
+    parent_xid: Optional[str] = None  # Bereich of plan contents
+    flaechenschluss: bool = False
+
+    def fingerprint(self) -> str:
+        """ Hash über alle Eingaben der Validierung des Objekts: Geometrie, Bereich und Flächenschluss """
+        wkb = self.wkb.encode() if isinstance(self.wkb, str) else bytes(self.wkb or b'')
+        h = hashlib.blake2b(wkb, digest_size=16)
+        h.update(f'{self.parent_xid}|{bool(self.flaechenschluss)}'.encode())
+        return h.hexdigest()
+
+
+@dataclass
+class ValidationSnapshot:
+    """ Ergebnis einer Validierung zusammen mit den Fingerprints (`ValidationFeature.fingerprint`) aller Objekte """
+    fingerprints: Dict[str, str] = field(default_factory=dict)
+    results: List[ValidationResult] = field(default_factory=list)
+
+
+class GeometryValidationEngine:
+    """
+    Lokale Geometrievalidierung eines Plans mit shapely.
+
+    Alle Geometrien werden einmalig in NumPy-Arrays eingelesen, die Prüfungen werden anschließend vektorisiert über
+    alle Objekte ausgeführt. Überlappungen werden über einen STRtree nur für Objekte geprüft, deren Bounding Boxes sich
+    schneiden. Es wird keine Datenbankverbindung benötigt.
+
+    Parameters
+    ----------
+    plan: ValidationFeature
+        Plan mit dem räumlichen Geltungsbereich
+    bereiche: Sequence[ValidationFeature]
+        Bereiche des Plans
+    objects: Sequence[ValidationFeature]
+        Planinhalte aller Bereiche, `parent_xid` verweist auf den Bereich
+    """
+
+    def __init__(self, plan: ValidationFeature, bereiche: Sequence[ValidationFeature],
+                 objects: Sequence[ValidationFeature]):
+        self.plan = plan
+        self.bereiche = list(bereiche)
+        # sorted by id, so that overlapping pairs are reported like in the database check (a.id < b.id)
+        self.objects = sorted(objects, key=lambda f: str(f.xid))
+
+        self.plan_geometry = _from_wkb([plan.wkb])[0]
+        self.bereich_geometries = _from_wkb([b.wkb for b in self.bereiche])
+        self.object_geometries = _from_wkb([o.wkb for o in self.objects])
+
+        bereich_index = {str(b.xid): i for i, b in enumerate(self.bereiche)}
+        self.object_bereich = np.array([bereich_index.get(str(o.parent_xid), -1) for o in self.objects], dtype=int)
+        self.flaechenschluss = np.array([bool(o.flaechenschluss) for o in self.objects], dtype=bool)
+
+    @classmethod
+    def from_plan(cls, plan) -> 'GeometryValidationEngine':
+        """ Erstellt die Eingabe aus einem geladenen Plan, dessen Bereiche und Planinhalte bereits geladen sind """
+        bereiche = []
+        objects = []
+        for b in plan.bereich:
+            bereiche.append(ValidationFeature(str(b.id), b.__class__, _spatial_element_wkb(b.geltungsbereich)))
+            for p in b.planinhalt:
+                objects.append(ValidationFeature(str(p.id), p.__class__, _spatial_element_wkb(p.position),
+                                                 parent_xid=str(b.id),
+                                                 flaechenschluss=bool(getattr(p, 'flaechenschluss', False))))
+
+        plan_feature = ValidationFeature(str(plan.id), plan.__class__,
+                                         _spatial_element_wkb(plan.raeumlicherGeltungsbereich))
+        return cls(plan_feature, bereiche, objects)
+
+    def validate(self) -> List[ValidationResult]:
+        """ Führt alle Prüfungen aus """
+        return [
+            *self.validate_within_bounds(),
+            *self.validate_overlaps(),
+            *self.validate_coverage(),
+            *self.validate_duplicate_vertices()
+        ]
+
+    def validate_plan(self) -> List[ValidationResult]:
+        """ Prüfungen des Plans und seiner Bereiche einschließlich des Flächenschlusses über alle Planinhalte """
+        return [
+            *self.validate_bereiche(),
+            *self.validate_coverage(),
+            *duplicate_vertex_results([self.plan, *self.bereiche],
+                                      np.concatenate([np.array([self.plan_geometry], dtype=object),
+                                                      self.bereich_geometries]))
+        ]
+
+    def validate_objects(self, objects: np.ndarray) -> List[ValidationResult]:
+        """ Prüfungen der Planinhalte mit den Indizes `objects`, Überlappungen werden mit allen Planinhalten geprüft """
+        return [
+            *self.validate_within_bounds(objects),
+            *self.validate_overlaps(objects),
+            *self.validate_duplicate_vertices(objects)
+        ]
+
+    def fingerprints(self) -> Dict[str, str]:
+        return {str(f.xid): f.fingerprint() for f in [self.plan, *self.bereiche, *self.objects]}
+
+    def validate_incremental(self, previous: Optional[ValidationSnapshot]) -> ValidationSnapshot:
+        """
+        Validiert nur die seit der vorherigen Validierung geänderten Planinhalte.
+
+        Geänderte Objekte werden über ihren Fingerprint erkannt. Ergebnisse unveränderter Objekte werden übernommen,
+        Überlappungen werden nur zwischen geänderten Objekten und ihren räumlichen Nachbarn neu geprüft. Hat sich der
+        Geltungsbereich des Plans oder eines Bereichs geändert, wird der gesamte Plan validiert.
+
+        Parameters
+        ----------
+        previous: ValidationSnapshot
+            Ergebnis der vorherigen Validierung desselben Plans oder None
+
+        Returns
+        -------
+        ValidationSnapshot:
+            Ergebnis der Validierung des aktuellen Stands
+        """
+        fingerprints = self.fingerprints()
+        if previous is None or any(previous.fingerprints.get(str(f.xid)) != fingerprints[str(f.xid)]
+                                   for f in [self.plan, *self.bereiche]):
+            return ValidationSnapshot(fingerprints, self.validate())
+
+        changed = np.array([i for i, o in enumerate(self.objects)
+                            if previous.fingerprints.get(str(o.xid)) != fingerprints[str(o.xid)]], dtype=int)
+        affected = {str(self.objects[i].xid) for i in changed} | (previous.fingerprints.keys() - fingerprints.keys())
+        if not affected:
+            return ValidationSnapshot(fingerprints, list(previous.results))
+
+        logger.debug(f'Inkrementelle Validierung von {len(affected)} geänderten Objekten')
+        results = [r for r in previous.results
+                   if r.xid not in affected and r.other_xid not in affected
+                   and r.intersection_type != GeometryIntersectionType.NotCovered]
+        results.extend([
+            *self.validate_objects(changed),
+            *self.validate_coverage()
+        ])
+        return ValidationSnapshot(fingerprints, results)
+
+    def _fs_mask(self) -> np.ndarray:
+        return self.flaechenschluss & ~shapely.is_missing(self.object_geometries)
+
+    def _candidates(self, objects: np.ndarray = None) -> np.ndarray:
+        """ Indizes der zu prüfenden Flächenschlussobjekte, optional eingeschränkt auf `objects` """
+        candidates = np.flatnonzero(self._fs_mask())
+        if objects is not None:
+            candidates = candidates[np.isin(candidates, objects)]
+        return candidates
+
+    def validate_bereiche(self) -> List[ValidationResult]:
+        """ Bereiche müssen im Geltungsbereich des Plans liegen """
+        if self.plan_geometry is None:
+            return []
+
+        differences = shapely.difference(self.bereich_geometries, self.plan_geometry)
+        return [
+            ValidationResult(
+                xid=str(self.bereiche[i].xid),
+                xtype=self.bereiche[i].xtype,
+                geom_wkt=_to_wkt(differences[i]),
+                intersection_type=GeometryIntersectionType.Plan,
+                other_xid=str(self.plan.xid),
+                other_xtype=self.plan.xtype
+            )
+            for i in np.flatnonzero(~shapely.is_empty(differences) & ~shapely.is_missing(differences))
+        ]
+
+    def validate_within_bounds(self, objects: np.ndarray = None) -> List[ValidationResult]:
+        """
+        Bereiche müssen im Geltungsbereich des Plans, Flächenschlussobjekte in ihrem Bereich liegen.
+        Ist `objects` angegeben, werden nur die Planinhalte mit diesen Indizes geprüft, die Bereiche nicht.
+        """
+        results = self.validate_bereiche() if objects is None else []
+
+        candidates = self._candidates(objects)
+        is_valid = shapely.is_valid(self.object_geometries[candidates])
+        for i in candidates[~is_valid]:
+            results.append(ValidationResult(
+                xid=str(self.objects[i].xid),
+                xtype=self.objects[i].xtype,
+                geom_wkt=_to_wkt(self.object_geometries[i]),
+                error_msg=shapely.is_valid_reason(self.object_geometries[i])
+            ))
+
+        valid = candidates[is_valid]
+        valid = valid[self.object_bereich[valid] >= 0]
+        bereich_geometries = self.bereich_geometries[self.object_bereich[valid]]
+        differences = shapely.difference(self.object_geometries[valid], bereich_geometries)
+        outside = ~shapely.is_empty(differences) & ~shapely.is_missing(differences)
+        for i, difference in zip(valid[outside], differences[outside]):
+            bereich = self.bereiche[self.object_bereich[i]]
+            results.append(ValidationResult(
+                xid=str(self.objects[i].xid),
+                xtype=self.objects[i].xtype,
+                geom_wkt=_to_wkt(difference),
+                intersection_type=GeometryIntersectionType.Bereich,
+                other_xid=str(bereich.xid),
+                other_xtype=bereich.xtype
+            ))
+
+        return results
+
+    def validate_overlaps(self, objects: np.ndarray = None) -> List[ValidationResult]:
+        """
+        Flächenschlussobjekte eines Bereichs dürfen sich nicht überlappen.
+        Ist `objects` angegeben, werden nur Überlappungen geprüft, an denen einer dieser Planinhalte beteiligt ist.
+        """
+        candidates = self._candidates()
+        candidates = candidates[shapely.is_valid(self.object_geometries[candidates])]
+        queried = candidates if objects is None else candidates[np.isin(candidates, objects)]
+        if len(candidates) < 2 or len(queried) == 0:
+            return []
+
+        tree = shapely.STRtree(self.object_geometries[candidates])
+        left, right = tree.query(self.object_geometries[queried], predicate='overlaps')
+        a, b = queried[left], candidates[right]
+        # every pair is reported once as (a < b), even if it was found from both sides
+        a, b = np.unique(np.stack([np.minimum(a, b), np.maximum(a, b)]), axis=1)
+        pairs = (a < b) & (self.object_bereich[a] == self.object_bereich[b])
+        a, b = a[pairs], b[pairs]
+
+        intersections = shapely.intersection(self.object_geometries[a], self.object_geometries[b])
+        return [
+            ValidationResult(
+                xid=str(self.objects[i].xid),
+                xtype=self.objects[i].xtype,
+                geom_wkt=_to_wkt(_collection_extract(intersection)),
+                intersection_type=GeometryIntersectionType.Planinhalt,
+                other_xid=str(self.objects[j].xid),
+                other_xtype=self.objects[j].xtype
+            )
+            for i, j, intersection in zip(a, b, intersections)
+        ]
+
+    def validate_coverage(self) -> List[ValidationResult]:
+        """ Die Vereinigung aller Flächenschlussobjekte muss den Geltungsbereich des Plans abdecken """
+        geometries = self.object_geometries[self._fs_mask()]
+        if self.plan_geometry is None or len(geometries) == 0:
+            return []
+
+        # invalid geometries are reported by `validate_within_bounds`, but must not break the union
+        invalid = ~shapely.is_valid(geometries)
+        geometries[invalid] = shapely.make_valid(geometries[invalid])
+        uncovered = shapely.difference(self.plan_geometry, shapely.union_all(geometries))
+        return [
+            ValidationResult(
+                xid=str(self.plan.xid),
+                xtype=self.plan.xtype,
+                geom_wkt=_to_wkt(part),
+                intersection_type=GeometryIntersectionType.NotCovered
+            )
+            for part in shapely.get_parts(uncovered) if not part.is_empty
+        ]
+
+    def validate_duplicate_vertices(self, objects: np.ndarray = None) -> List[ValidationResult]:
+        """ Geometrien von Plan, Bereichen und Planinhalten dürfen keine doppelten, aufeinanderfolgenden
+            Stützpunkte besitzen. Ist `objects` angegeben, werden nur die Planinhalte mit diesen Indizes geprüft. """
+        if objects is None:
+            features = [self.plan, *self.bereiche, *self.objects]
+            geometries = np.concatenate([np.array([self.plan_geometry], dtype=object), self.bereich_geometries,
+                                         self.object_geometries])
+        else:
+            features = [self.objects[i] for i in objects]
+            geometries = self.object_geometries[objects]
+
+        return duplicate_vertex_results(features, geometries)
+
+
+class ValidationCache:
+    """
+    Hält das Ergebnis der letzten Validierung je Plan für die Dauer der QGIS-Sitzung.
+
+    Objekte, die über die ORM-Events oder Undo-Befehle als geändert gemeldet werden (`invalidate`), verlieren ihren
+    Fingerprint und werden bei der nächsten Validierung in jedem Fall neu geprüft. Änderungen außerhalb der Sitzung
+    werden über den Vergleich der Fingerprints erkannt.
+    """
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(ValidationCache, cls).__new__(cls)
+            cls._instance.snapshots = {}
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    def validate(self, engine: GeometryValidationEngine) -> List[ValidationResult]:
+        """ Validiert den Plan der Engine inkrementell zur letzten Validierung desselben Plans """
+        plan_xid = str(engine.plan.xid)
+        with self._lock:
+            previous = self.snapshots.get(plan_xid)
+            # copy, objects may get invalidated while the validation runs on another thread
+            if previous is not None:
+                previous = ValidationSnapshot(dict(previous.fingerprints), list(previous.results))
+
+        snapshot = engine.validate_incremental(previous)
+        with self._lock:
+            self.snapshots[plan_xid] = snapshot
+        return list(snapshot.results)
+
+    def invalidate(self, xid: str):
+        """ Markiert ein Objekt als geändert, ist `xid` ein Plan wird dessen gesamtes Ergebnis verworfen """
+        with self._lock:
+            self.snapshots.pop(xid, None)
+            for snapshot in self.snapshots.values():
+                snapshot.fingerprints.pop(xid, None)
+
+    def clear(self):
+        with self._lock:
+            self.snapshots.clear()
+
+
+def duplicate_vertices(geometries: np.ndarray, tolerance: float = DUPLICATE_VERTEX_TOLERANCE) \
+        -> (np.ndarray, np.ndarray):
+    """
+    Findet aufeinanderfolgende, doppelte Stützpunkte in allen Linien und Ringen der Geometrien.
+
+    Returns
+    -------
+    np.ndarray, np.ndarray:
+        Index der Geometrie und Koordinaten je gefundenem Duplikat
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    geometries = np.where(shapely.is_missing(geometries), shapely.from_wkt('GEOMETRYCOLLECTION EMPTY'), geometries)
+
+    parts, part_owner = shapely.get_parts(geometries, return_index=True)
+    type_ids = shapely.get_type_id(parts)
+    # duplicates are searched within each line and ring, the closing vertex of a ring is not a duplicate
+    is_polygon = type_ids == shapely.GeometryType.POLYGON
+    is_line = (type_ids == shapely.GeometryType.LINESTRING) | (type_ids == shapely.GeometryType.LINEARRING)
+    rings, ring_part = shapely.get_rings(parts[is_polygon], return_index=True)
+
+    linear = np.concatenate([parts[is_line], rings])
+    linear_owner = np.concatenate([part_owner[is_line], part_owner[is_polygon][ring_part]])
+
+    coords, coord_index = shapely.get_coordinates(linear, return_index=True)
+    same_line = coord_index[1:] == coord_index[:-1]
+    same_position = (np.abs(coords[1:] - coords[:-1]) <= tolerance).all(axis=1)
+    duplicates = np.flatnonzero(same_line & same_position) + 1
+
+    return linear_owner[coord_index[duplicates]], coords[duplicates]
+
+
+def duplicate_vertex_results(features: Sequence[ValidationFeature], geometries: np.ndarray = None) \
+        -> List[ValidationResult]:
+    """
+    Prüft Objekte auf doppelte, aufeinanderfolgende Stützpunkte.
+
+    Parameters
+    ----------
+    features: Sequence[ValidationFeature]
+        zu prüfende Objekte
+    geometries: np.ndarray
+        bereits eingelesene Geometrien der Objekte, werden sonst aus dem WKB der Objekte gelesen
+
+    Returns
+    -------
+    List[ValidationResult]:
+        ein Ergebnis je betroffenem Objekt, die Geometrie des Ergebnisses enthält die Positionen aller Duplikate
+    """
+    if geometries is None:
+        geometries = _from_wkb([f.wkb for f in features])
+
+    owners, coords = duplicate_vertices(geometries)
+    # group the positions by object, lines and rings of an object are not necessarily adjacent
+    order = np.argsort(owners, kind='stable')
+    owners, coords = owners[order], coords[order]
+    objects, start = np.unique(owners, return_index=True)
+
+    results = []
+    for i, positions in zip(objects, np.split(coords, start[1:])):
+        positions = np.unique(positions, axis=0)
+        results.append(ValidationResult(
+            xid=str(features[i].xid),
+            xtype=features[i].xtype,
+            geom_wkt=_to_wkt(shapely.multipoints(positions)),
+            error_msg=f'Planinhalt besitzt doppelte Stützpunkte: {_format_positions(positions)}'
+        ))
+    return results
+
+
+def _format_positions(positions: np.ndarray, limit: int = 5) -> str:
+    text = ', '.join(f'({x} {y})' for x, y in positions[:limit].tolist())
+    if len(positions) > limit:
+        text += f' und {len(positions) - limit} weitere'
+    return text
+
+
+def _from_wkb(values: Sequence) -> np.ndarray:
+    """ Liest WKB/EWKB (binär oder hex) ein, nicht lesbare oder fehlende Geometrien werden zu None """
+    values = [bytes(v) if isinstance(v, memoryview) else v for v in values]
+    return shapely.from_wkb(np.array(values, dtype=object), on_invalid='ignore')
+
+
+def _spatial_element_wkb(element: Union[WKBElement, WKTElement, None]) -> Union[bytes, str, None]:
+    """ WKB eines Geometrieattributs, Kurvengeometrien werden linearisiert, da GEOS sie nicht unterstützt """
+    if element is None:
+        return
+    if isinstance(element, WKBElement) and _from_wkb([element.data])[0] is not None:
+        return element.data
+
+    from SAGisXPlanung.GML.geometry import geometry_from_spatial_element
+
+    geom = geometry_from_spatial_element(element)
+    if geom.isNull():
+        return
+    return bytes(geom.constGet().segmentize().asWkb())
+
+
+def _collection_extract(geom):
+    """ Entspricht ST_CollectionExtract ohne Typangabe: behält nur die Teile der höchsten Dimension """
+    if shapely.get_type_id(geom) != shapely.GeometryType.GEOMETRYCOLLECTION:
+        return geom
+    parts = shapely.get_parts(geom)
+    if len(parts) == 0:
+        return geom
+    dimensions = shapely.get_dimensions(parts)
+    return shapely.union_all(parts[dimensions == dimensions.max()])
+
+
+def _to_wkt(geom) -> Optional[str]:
+    if geom is None:
+        return
+    return shapely.to_wkt(geom, rounding_precision=-1)
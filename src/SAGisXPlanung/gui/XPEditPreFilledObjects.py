@@ -12,7 +12,7 @@ from SAGisXPlanung import Session, BASE_DIR
 from SAGisXPlanung.config import export_version
 from SAGisXPlanung.gui.widgets.QXPlanTabWidget import QXPlanTabWidget
 from SAGisXPlanung.gui.style import HighlightRowProxyStyle, HighlightRowDelegate
-from SAGisXPlanung.utils import PRE_FILLED_CLASSES, save_to_db_async, confirmObjectDeletion
+from SAGisXPlanung.utils import PRE_FILLED_CLASSES, save_to_db_async, confirmObjectDeletion, PreFilledObjectCache
 
 FORM_CLASS, _ = uic.loadUiType(os.path.join(os.path.dirname(__file__), '../ui/prefilled_object_edit.ui'))
 logger = logging.getLogger(__name__)
@@ -139,6 +139,7 @@ class XPEditPreFilledObjectsDialog(QDialog, FORM_CLASS):
         self.model.appendRow(item)
 
         await save_to_db_async(content)
+        PreFilledObjectCache.invalidate()
 
     def editAccepted(self, xid):
         content = self.tab_widget.populateContent()
@@ -156,6 +157,7 @@ class XPEditPreFilledObjectsDialog(QDialog, FORM_CLASS):
             for attr in obj.element_order(include_base=False, only_columns=True, export=True,
                                           version=export_version()):
                 setattr(obj, attr, getattr(content, attr))
+        PreFilledObjectCache.invalidate()
 
         # update data in view
         indices = self.model.match(self.model.index(0, 0), XID_ROLE, xid)
@@ -196,6 +198,7 @@ class XPEditPreFilledObjectsDialog(QDialog, FORM_CLASS):
                 return
 
             session.delete(obj_from_db)
+        PreFilledObjectCache.invalidate()
 
         # remove entry from view
         indices = self.model.match(self.model.index(0, 0), XID_ROLE, xid)
@@ -15,7 +15,7 @@ from qgis.PyQt import QtWidgets, QtGui
 from qgis.PyQt.QtWidgets import QTreeWidgetItem, QAbstractItemView
 from qgis.PyQt.QtCore import Qt, pyqtSignal, pyqtSlot, QEvent, QModelIndex, QSettings
 from qgis.gui import QgsDockWidget
-from qgis.core import (QgsGeometry, Qgis)
+from qgis.core import Qgis
 from qgis.utils import iface
 from sqlalchemy import select, exists, inspect as sqla_inspect
 from sqlalchemy.orm import lazyload, load_only, selectinload, with_polymorphic, joinedload
@@ -23,7 +23,8 @@ from sqlalchemy.orm import lazyload, load_only, selectinload, with_polymorphic,
 from SAGisXPlanung import Session, BASE_DIR, SessionAsync, compile_ui_file, Base
 from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan
 from SAGisXPlanung.BPlan.BP_Bebauung.feature_types import BP_BaugebietsTeilFlaeche
-from SAGisXPlanung.FPlan.FP_Basisobjekte.feature_types import FP_Plan
+from SAGisXPlanung.FPlan.FP_Basisobjekte.feature_types import FP_Plan, FP_Bereich
+from SAGisXPlanung.GML.geometry import geometry_from_spatial_element
 from SAGisXPlanung.LPlan.LP_Basisobjekte.feature_types import LP_Plan
 from SAGisXPlanung.RPlan.RP_Basisobjekte.feature_types import RP_Plan
 from SAGisXPlanung.XPlan.XP_Praesentationsobjekte.feature_types import XP_Nutzungsschablone, \
@@ -32,8 +33,10 @@ from SAGisXPlanung.XPlan.data_types import XP_Gemeinde
 from SAGisXPlanung.XPlan.feature_types import XP_Plan, XP_Bereich, XP_Objekt
 from SAGisXPlanung.core.mixins.mixins import PolygonGeometry, LineGeometry, MixedGeometry, PointGeometry
 from SAGisXPlanung.XPlanungItem import XPlanungItem
-from SAGisXPlanung.config import export_version, table_name_to_class
+from SAGisXPlanung.config import export_version
 from SAGisXPlanung.core.canvas_display import plan_to_map
+from SAGisXPlanung.core.flaechenschluss import uncovered_areas
+from SAGisXPlanung.core.validation import ValidationCache
 from SAGisXPlanung.ext.spinner import WaitingSpinner, loading_animation
 from SAGisXPlanung.gui.actions import EnableBuldingTemplateAction, EditBuildingTemplateAction
 from SAGisXPlanung.gui.commands import ObjectsDeletedCommand, XPUndoStack, AttributeChangedCommand
@@ -46,6 +49,7 @@ from SAGisXPlanung.gui.widgets.QExplorerView import ClassNode, XID_ROLE
 from SAGisXPlanung.gui.style.styles import TagStyledDelegate, HighlightRowProxyStyle
 from SAGisXPlanung.gui.widgets.QXPlanTabWidget import QXPlanTabWidget
 from SAGisXPlanung.utils import OBJECT_BASE_TYPES, full_version_required_warning
+from SAGisXPlanung.validation_worker import WorkerValidationEngine
 
 uifile = os.path.join(os.path.dirname(__file__), '../ui/XPlanung_plan_details.ui')
 FORM_CLASS = compile_ui_file(uifile)
@@ -642,14 +646,27 @@ class XPPlanDetailsDialog(QgsDockWidget, FORM_CLASS):
 
     @qasync.asyncSlot()
     async def fillAreasWithoutUsage(self):
+        if issubclass(self.plan_type, FP_Plan):
+            self.showAreasWithoutUsage()
+            return
+        if not hasattr(self.plan_type, 'enforceFlaechenschluss'):
+            iface.messageBar().pushMessage("XPlanung", f"Bilden des Flaechenschluss für {self.plan_type.__name__} "
+                                                       f"nicht möglich", level=Qgis.Warning)
+            return
+
         self.bFixAreas.setEnabled(False)
         with Session.begin() as session:
             plan: XP_Plan = session.query(XP_Plan).get(self.plan_xid)
             loop = asyncio.get_running_loop()
-            xplan_items = await loop.run_in_executor(None, plan.enforceFlaechenschluss)
+            xplan_items, deleted_items = await loop.run_in_executor(None, plan.enforceFlaechenschluss)
+
+            m = self.objectTree.model
+            for item in deleted_items:
+                index_list = m.match(m.index(0, 0), XID_ROLE, item.xid, -1, Qt.MatchWildcard | Qt.MatchRecursive)
+                if index_list:
+                    m.removeRows(index_list[0].row(), 1, index_list[0].parent())
 
             for item in xplan_items:
-                m = self.objectTree.model
                 # find item
                 index_list = m.match(m.index(0, 0), XID_ROLE, item.xid, -1, Qt.MatchWildcard | Qt.MatchRecursive)
                 if index_list:
@@ -665,6 +682,22 @@ class XPPlanDetailsDialog(QgsDockWidget, FORM_CLASS):
         self.bFixAreas.setEnabled(True)
         iface.messageBar().pushMessage("XPlanung", "Bilden des Flaechenschluss abgeschlossen", level=Qgis.Info)
 
+    def showAreasWithoutUsage(self):
+        """ FP-Pläne besitzen keine Klasse für Flächen ohne Darstellung, die Lücken im Flächenschluss der Bereiche
+            werden daher nur im Log der Geometrievalidierung angezeigt """
+        with Session.begin() as session:
+            areas = uncovered_areas(session, self.plan_type, self.plan_xid)
+
+        for bereich_id, geom in areas.items():
+            self.validation_finished.emit(ValidationResult(
+                xid=str(bereich_id),
+                xtype=FP_Bereich,
+                geom_wkt=geometry_from_spatial_element(geom).asWkt(),
+                intersection_type=GeometryIntersectionType.NotCovered
+            ))
+        iface.messageBar().pushMessage("XPlanung", f"{len(areas)} Bereich(e) mit Lücken im Flaechenschluss gefunden",
+                                       level=Qgis.Info)
+
     @qasync.asyncSlot()
     async def startValidation(self):
         self.validation_spinner.start()
@@ -696,10 +729,15 @@ class XPPlanDetailsDialog(QgsDockWidget, FORM_CLASS):
                 plan = await session.get(self.plan_type, self.plan_xid, opts)
 
                 # validation tasks are heavy cpu work, therefore run them in threadpool
-                # unfortunately ProcessPoolExecutor does not work inside QGIS -> can't use multiprocessing to side-step GIL
+                # unfortunately ProcessPoolExecutor does not work inside QGIS -> large plans are validated in separate
+                # worker processes to side-step the GIL
+                # only objects changed since the last validation of the plan are tested again
                 loop = asyncio.get_event_loop()
-                await loop.run_in_executor(None, self.validateFlaechenschluss, plan)
-                await loop.run_in_executor(None, self.validateUniqueVertices, plan)
+                results = await loop.run_in_executor(
+                    None, lambda: ValidationCache().validate(WorkerValidationEngine.from_plan(plan))
+                )
+                for validation_result in results:
+                    self.validation_finished.emit(validation_result)
 
         except Exception as e:
             logger.error(e)
@@ -713,167 +751,6 @@ class XPPlanDetailsDialog(QgsDockWidget, FORM_CLASS):
 
             self.validation_spinner.stop()
 
-    def validateFlaechenschluss(self, plan):
-        """
-        Validierung der Flächenschlussbedingung (d.h. die Vereinigung aller Planinhalte in Ebene 0
-        stimmt mit der Fläche des Geltungsbereichs überein <=> es existieren kleine Überlappungen/Klaffung zwischen
-        den Flächen der Planinhalte und jeder Stützpunkt liegt auf mindestens einem anderen)
-        """
-        self._validate_within_bounds(plan)
-        self._validate_overlaps(plan)
-
-        # validate that the union of all plan contents is equal to the geltungsbereich
-        p = str(plan.__class__.__name__[:2]).lower()
-        with Session.begin() as session:
-            stmt = f"""
-                SELECT 
-                    ST_AsText((ST_dump(st_difference(xp_plan."raeumlicherGeltungsbereich", plan_contents.united))).geom) as wkt, xp_plan.id
-                FROM
-                    (
-                    SELECT ST_union(a.position) as united, {p}_bereich."gehoertZuPlan_id" AS plan_id
-                    FROM 
-                    (
-                        SELECT a.id, a.flaechenschluss, a.position FROM {p}_objekt a
-                        UNION
-                        SELECT so_a.id, so_a.flaechenschluss, so_a.position FROM so_objekt so_a
-                    ) a, 
-                    xp_objekt xp_a, {p}_bereich
-                    WHERE xp_a.id = a.id AND a.flaechenschluss = True AND xp_a."gehoertZuBereich_id" = {p}_bereich.id
-                    GROUP BY {p}_bereich."gehoertZuPlan_id"
-                    ) as plan_contents,
-                    xp_plan
-                WHERE plan_contents.plan_id = xp_plan.id AND xp_plan.id = '{plan.id}';
-            """
-            try:
-                res = session.execute(stmt)
-                for row in res:
-                    validation_result = ValidationResult(
-                        xid=str(row.id),
-                        xtype=XP_Plan,
-                        geom_wkt=row.wkt,
-                        intersection_type=GeometryIntersectionType.NotCovered
-                    )
-                    self.validation_finished.emit(validation_result)
-            except Exception as e:
-                logger.error(e)
-
-    def validateUniqueVertices(self, plan: XP_Plan):
-        """ Startet die Untersuchung aller Stützpunkte von XPlanung-Geometrien auf Duplikate"""
-        self.checkUniqueVertices(plan)
-        for b in plan.bereich:
-            self.checkUniqueVertices(b)
-            for p in b.planinhalt:
-                self.checkUniqueVertices(p)
-
-    def checkUniqueVertices(self, obj):
-        """ überprüft ein XPlanung-Objekt auf doppelte Stützpunkte und schreibt das Ergebnis in das Log-Fenster"""
-        # try if geometry is not empty
-        try:
-            geom_copy = QgsGeometry(obj.geometry())
-        except AssertionError:
-            return
-        nodes_removed = geom_copy.removeDuplicateNodes()
-        if nodes_removed:
-            validation_result = ValidationResult(
-                xid=str(obj.id),
-                xtype=obj.__class__,
-                geom_wkt=geom_copy.asWkt(),
-                error_msg='Planinhalt besitzt doppelte Stützpunkte'
-            )
-            self.validation_finished.emit(validation_result)
-
-    def _validate_within_bounds(self, plan: XP_Plan):
-        """ validate if all geometries of plan contents are within the bounds of the plan """
-        plan_geom = plan.geometry()
-        plan_geom_const = plan_geom.constGet()
-        for b in plan.bereich:
-            b_geom = b.geometry()
-            b_engine = QgsGeometry.createGeometryEngine(b_geom.constGet())
-            b_engine.prepareGeometry()
-            # check that bereich is within bounds of plan
-            difference = b_engine.difference(plan_geom_const)
-            if difference is None:
-                continue
-
-            if not difference.isEmpty():
-                validation_result = ValidationResult(
-                    xid=str(b.id),
-                    xtype=b.__class__,
-                    geom_wkt=difference.asWkt(),
-                    intersection_type=GeometryIntersectionType.Plan,
-                    other_xid=str(plan.id),
-                    other_xtype=plan.__class__
-                )
-                self.validation_finished.emit(validation_result)
-
-            flaechenschluss_objekte = [p for p in b.planinhalt if p.flaechenschluss]
-            for fs_objekt in flaechenschluss_objekte:
-                geom = fs_objekt.geometry()
-                const_geom = geom.constGet()
-
-                # first check if geometries are valid at all
-                is_valid, error_description = const_geom.isValid()
-                if not is_valid:
-                    validation_result = ValidationResult(
-                        xid=str(fs_objekt.id),
-                        xtype=fs_objekt.__class__,
-                        geom_wkt=geom.asWkt(),
-                        error_msg=error_description
-                    )
-                    self.validation_finished.emit(validation_result)
-                    continue
-
-                fl_engine = QgsGeometry.createGeometryEngine(const_geom)
-                fl_engine.prepareGeometry()
-
-                # check that geometries are within correct bounds of bereich
-                difference = fl_engine.difference(b_geom.constGet())
-                if difference is None:
-                    continue
-
-                if not difference.isEmpty():
-                    validation_result = ValidationResult(
-                        xid=str(fs_objekt.id),
-                        xtype=fs_objekt.__class__,
-                        geom_wkt=difference.asWkt(),
-                        intersection_type=GeometryIntersectionType.Bereich,
-                        other_xid=str(b.id),
-                        other_xtype=b.__class__
-                    )
-                    self.validation_finished.emit(validation_result)
-
-    def _validate_overlaps(self, plan: XP_Plan):
-        """ validates if any of the plan contents overlap each other"""
-        p = str(plan.__class__.__name__[:2]).lower()
-        with Session.begin() as session:
-            stmt = f"""
-                SELECT ST_AsText(ST_CollectionExtract(ST_INTERSECTION(a.position, b.position))) AS wkt, 
-                    xp_a.id AS a_xid, xp_a.type AS a_type, xp_b.id AS b_xid, xp_b.type AS b_type, xp_plan.id
-                FROM {p}_objekt a, {p}_objekt b, xp_objekt xp_a, xp_objekt xp_b, xp_plan, {p}_bereich
-                WHERE
-                    a.ID < b.ID AND
-                    a.id = xp_a.id AND
-                    b.id = xp_b.id AND 
-                    ST_IsValid(a.position) AND ST_IsValid(b.position) AND
-                    a.flaechenschluss = True AND b.flaechenschluss = True AND
-                    xp_plan.id = {p}_bereich."gehoertZuPlan_id" AND
-                    {p}_bereich.id = xp_a."gehoertZuBereich_id" AND {p}_bereich.id = xp_b."gehoertZuBereich_id" AND
-                    xp_plan.id = '{plan.id}' AND
-                    ST_OVERLAPS(a.position, b.position);
-            """
-
-            res = session.execute(stmt).all()
-            for row in res:
-                validation_result = ValidationResult(
-                    xid=str(row.a_xid),
-                    xtype=table_name_to_class(row.a_type),
-                    geom_wkt=row.wkt,
-                    intersection_type=GeometryIntersectionType.Planinhalt,
-                    other_xid=str(row.b_xid),
-                    other_xtype=table_name_to_class(row.b_type),
-                )
-                self.validation_finished.emit(validation_result)
-
     @pyqtSlot(ValidationResult)
     def on_validation_result(self, validation_result: ValidationResult):
         tree_item = ValidationGeometryErrorTreeWidgetItem(validation_result)
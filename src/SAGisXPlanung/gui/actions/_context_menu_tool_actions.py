@@ -34,11 +34,7 @@ class MoveAnnotationItemAction(QAction):
         if not self.annotation_layer:
             return
 
-        for item_id, item in self.annotation_layer.items().items():
-            id_prop = self.annotation_layer.customProperties().value(f'xplanung/feat-{item_id}')
-            if id_prop == str(self.xplan_item.xid):
-                self.annotation_item = item
-                break
+        self.annotation_item = self.annotation_layer.item(MapLayerRegistry().featureId(str(self.xplan_item.xid)))
 
         self.beginMove()
 
@@ -10,6 +10,7 @@ from SAGisXPlanung import Session, Base
 from SAGisXPlanung.XPlanungItem import XPlanungItem
 from SAGisXPlanung.config import export_version
 from SAGisXPlanung.core.callback_registry import CallbackRegistry
+from SAGisXPlanung.core.validation import ValidationCache
 from SAGisXPlanung.gui.widgets.QExplorerView import ClassNode, XID_ROLE
 
 
@@ -47,7 +48,9 @@ class AttributeChangedCommand(QUndoCommand):
             ).values({self.attribute: value})
             session.execute(stmt)
 
-        CallbackRegistry().run_callbacks(self.xplan_item, attr, update_value)
+        # core update statements don't trigger the orm events, which mark the object for re-validation
+        ValidationCache().invalidate(str(self.xplan_item.xid))
+        CallbackRegistry().run_callbacks(self.xplan_item, self.attribute, value)
 
     def undo(self):
         self.applyValue(self.previous_value)
@@ -2,9 +2,11 @@ import asyncio
 import datetime
 import json
 import logging
+import operator
 import os
+from dataclasses import dataclass
 from operator import attrgetter
-from typing import List
+from typing import List, Tuple, Any, Optional, Dict
 
 import qasync
 
@@ -14,7 +16,7 @@ from qgis.PyQt.QtGui import QIcon, QStandardItemModel, QStandardItem
 from qgis.PyQt.QtCore import QAbstractTableModel, Qt, QModelIndex, QItemSelection, pyqtSlot, pyqtSignal
 from qgis.core import Qgis
 from qgis.utils import iface
-from sqlalchemy import select, inspect, func, delete, text
+from sqlalchemy import select, inspect, func, delete, text, event, or_, and_
 from sqlalchemy.orm import selectin_polymorphic, defer, load_only, with_polymorphic
 
 from SAGisXPlanung import Session, BASE_DIR, SessionAsync
@@ -50,6 +52,115 @@ def object_as_dict(obj, exclude_patterns=None):
     }
 
 
+@dataclass(frozen=True)
+class PlanFilter:
+    """ Filter der Planübersicht, dient gleichzeitig als Schlüssel der zwischengespeicherten Planzahlen """
+    plan_types: Tuple[type, ...]
+    search_text: str = ''
+
+    def apply(self, query):
+        if len(self.plan_types) == 1:  # filter for specific plan type
+            query = query.where(XP_Plan.type == str(self.plan_types[0].__name__).lower())
+
+        if self.search_text:
+            query = query.where(text("_sa_search_col @@ to_tsquery('german', :s) ").bindparams(s=self.search_text))
+
+        return query
+
+
+@dataclass(frozen=True)
+class PageCursor:
+    """ Sortierwert und ID der letzten Zeile einer Seite, die folgende Seite beginnt nach dieser Zeile """
+    value: Any
+    id: Any
+
+
+# total number of plans per filter, invalidated whenever a plan is inserted or deleted
+_plan_counts: Dict[PlanFilter, int] = {}
+
+
+@event.listens_for(XP_Plan, 'after_insert', propagate=True)
+@event.listens_for(XP_Plan, 'after_delete', propagate=True)
+def clear_plan_counts(*args):
+    _plan_counts.clear()
+
+
+def plan_count(plan_filter: PlanFilter) -> int:
+    """ Anzahl der Pläne, die dem Filter entsprechen """
+    if plan_filter not in _plan_counts:
+        with Session.begin() as session:
+            _plan_counts[plan_filter] = session.execute(
+                plan_filter.apply(select(func.count(XP_Plan.id)))
+            ).scalar_one()
+    return _plan_counts[plan_filter]
+
+
+def sort_attribute(polymorphic, attr_name):
+    for class_type in PLAN_BASE_TYPES:
+        try:
+            attr = attrgetter(f'{class_type.__name__}.{attr_name}')(polymorphic)
+            return attr
+        except AttributeError:
+            pass
+
+
+def page_statement(plan_filter: PlanFilter, sort_column: str, sort_order: str, limit: int,
+                   after: PageCursor = None):
+    """
+    Abfrage einer Seite der Planübersicht über Keyset-Pagination.
+
+    Statt vorherige Seiten mit OFFSET zu überspringen, beginnt die Seite direkt nach der letzten Zeile der
+    vorherigen Seite (`after`), sortiert nach der Sortierspalte und der ID. Pläne ohne Wert in der Sortierspalte
+    stehen am Ende. Der Wert der Sortierspalte wird als zusätzliche Spalte `sort_value` abgefragt, er bildet den
+    Cursor der folgenden Seite.
+    """
+    xp_plan_poly = with_polymorphic(XP_Plan, PLAN_BASE_TYPES)
+    sort_attr = sort_attribute(xp_plan_poly, sort_column)
+    stmt = plan_filter.apply(select(xp_plan_poly, sort_attr.label('sort_value')).options(
+        defer(getattr(xp_plan_poly, 'raeumlicherGeltungsbereich'))
+    ))
+
+    if after is not None:
+        compare = operator.gt if sort_order == 'asc' else operator.lt
+        if after.value is None:
+            stmt = stmt.where(sort_attr.is_(None), compare(xp_plan_poly.id, after.id))
+        else:
+            stmt = stmt.where(or_(
+                sort_attr.is_(None),
+                compare(sort_attr, after.value),
+                and_(sort_attr == after.value, compare(xp_plan_poly.id, after.id))
+            ))
+
+    return stmt.order_by(
+        sort_attr.is_(None),
+        getattr(sort_attr, sort_order)(),
+        getattr(xp_plan_poly.id, sort_order)()
+    ).limit(limit)
+
+
+def fetch_page(plan_filter: PlanFilter, sort_column: str, sort_order: str, limit: int,
+               after: PageCursor = None) -> (List[dict], Optional[PageCursor]):
+    """
+    Lädt eine Seite der Planübersicht.
+
+    Returns
+    -------
+    List[dict], PageCursor:
+        Attribute der Pläne und Cursor der folgenden Seite
+    """
+    with Session.begin() as session:
+        rows = session.execute(page_statement(plan_filter, sort_column, sort_order, limit, after)).all()
+        objects = [plan for plan, _ in rows]
+
+        # the cursor takes the value of the sorted column, which is not necessarily the attribute of the plan with
+        # this name (e.g. `bp_plan.id` is NULL for all other plan types)
+        next_cursor = None
+        if rows:
+            last_plan, sort_value = rows[-1]
+            next_cursor = PageCursor(sort_value, last_plan.id)
+        return [object_as_dict(o, exclude_patterns=['bereich', '_id']) for o in objects], next_cursor
+
+
 style = """
 QTableView {{	
 	background-color: white;
@@ -174,6 +285,9 @@ class NexusDialog(QDialog, FORM_CLASS_NEXUS):
         # ------------- LOGIC -----------------
         self.current_page_index = 0
         self.total_pages = None
+        self._page_query = None  # filter, sort and page size of the visited pages
+        self._page_cursors: List[Optional[PageCursor]] = [None]  # start of each visited page
+        self._prefetched = None  # (page request, future) of the next page
         if (s := QgsConfig.nexus_settings()) is not None:
             self.table_settings = TableSettings.from_json(s)
         else:
@@ -220,6 +334,7 @@ class NexusDialog(QDialog, FORM_CLASS_NEXUS):
         ))
 
         self.model = NexusTableModel(data)
+        self.prefetch_next_page()
         if self.table_settings.columns:
             self.model.set_column_header(self.table_settings.header_labels())
         else:
@@ -245,43 +360,54 @@ class NexusDialog(QDialog, FORM_CLASS_NEXUS):
             _end_index=min(count, self.current_page_index * max_per_page + max_per_page),
             _total=count
         ))
+        self.prefetch_next_page()
 
-    def _with_filter(self, query):
-        filter_class = self.combo_plan_type.currentData()
-        if len(filter_class) == 1:  # filter for specific plan type
-            query = query.where(XP_Plan.type == str(filter_class[0].__name__).lower())
+    def plan_filter(self) -> PlanFilter:
+        return PlanFilter(tuple(self.combo_plan_type.currentData()), self.nexus_search.text())
 
-        search_text = self.nexus_search.text()
-        if search_text:
-            query = query.where(text("_sa_search_col @@ to_tsquery('german', :s) ").bindparams(s=search_text))
+    def fetch_database(self, page: int = 0) -> (int, List[dict]):
+        plan_filter = self.plan_filter()
+        max_per_page = self.table_settings.max_entries_per_page
+        page_query = (plan_filter, self.table_settings.sort_column, self.table_settings.sort_order, max_per_page)
+        if page_query != self._page_query:
+            # pages are only reachable by walking from the first one
+            self._page_query = page_query
+            self._page_cursors = [None]
+            self._prefetched = None
+            page = self.current_page_index = 0
+        elif page >= len(self._page_cursors):
+            page = self.current_page_index = len(self._page_cursors) - 1
+
+        count = plan_count(plan_filter)
+        request = (*page_query, self._page_cursors[page])
+        if self._prefetched is not None and self._prefetched[0] == request and self._prefetched[1].done() \
+                and not self._prefetched[1].cancelled() and self._prefetched[1].exception() is None:
+            data, next_cursor = self._prefetched[1].result()
+        else:
+            data, next_cursor = fetch_page(*request)
+        self._prefetched = None
 
-        return query
+        del self._page_cursors[page + 1:]
+        if next_cursor is not None:
+            self._page_cursors.append(next_cursor)
 
-    def _sort_attr(self, polymorphic, attr_name):
-        for class_type in PLAN_BASE_TYPES:
-            try:
-                attr = attrgetter(f'{class_type.__name__}.{attr_name}')(polymorphic)
-                return attr
-            except AttributeError:
-                pass
+        self.total_pages = (count + max_per_page - 1) // max_per_page
+        return count, data
 
-    def fetch_database(self, page: int = 0) -> (int, List[dict]):
-        with (Session.begin() as session):
-            count = session.execute(self._with_filter(select(func.count(XP_Plan.id)))).scalar_one()
+    def prefetch_next_page(self):
+        """ Lädt die folgende Seite im Hintergrund, damit das Blättern ohne Datenbankabfrage erfolgt """
+        next_page = self.current_page_index + 1
+        if self.total_pages is None or next_page >= self.total_pages or next_page >= len(self._page_cursors):
+            return
 
-            max_per_page = self.table_settings.max_entries_per_page
-            xp_plan_poly = with_polymorphic(XP_Plan, PLAN_BASE_TYPES)
-            stmt = self._with_filter(select(xp_plan_poly).options(
-                defer(getattr(xp_plan_poly, 'raeumlicherGeltungsbereich'))
-            ))
-            sort_by, sort_dir = self.table_settings.sort_column, self.table_settings.sort_order
-            sort_attr = self._sort_attr(xp_plan_poly, sort_by)
-            _order_by = getattr(sort_attr, sort_dir)()
-            stmt = stmt.order_by(_order_by).offset(page * max_per_page).fetch(max_per_page)
-            objects = session.scalars(stmt).all()
+        request = (*self._page_query, self._page_cursors[next_page])
+        loop = asyncio.get_event_loop()
+        self._prefetched = (request, loop.run_in_executor(None, fetch_page, *request))
 
-            self.total_pages = (count + max_per_page - 1) // max_per_page
-            return count, [object_as_dict(o, exclude_patterns=['bereich', '_id']) for o in objects]
+    def reset_cache(self):
+        """ Verwirft gespeicherte Planzahlen und die vorgeladene Seite, z.B. nach Änderungen anderer Nutzer """
+        _plan_counts.clear()
+        self._prefetched = None
 
     @pyqtSlot(QItemSelection, QItemSelection)
     def on_selection_changed(self, selected: QItemSelection, deselected: QItemSelection):
@@ -391,11 +517,13 @@ class NexusDialog(QDialog, FORM_CLASS_NEXUS):
             loop = asyncio.get_event_loop()
             await loop.run_in_executor(None, _delete)
 
+            self.reset_cache()
             self.paginate()  # refresh views
             self.deletionOccurred.emit()  # notify other views
 
     @pyqtSlot()
     def on_reload_clicked(self):
+        self.reset_cache()
         self.paginate()
 
     @pyqtSlot()
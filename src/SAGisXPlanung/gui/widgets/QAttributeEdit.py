@@ -23,6 +23,7 @@ from SAGisXPlanung.core.mixins.mixins import ElementOrderMixin
 from SAGisXPlanung.core.mixins.enum_mixin import XPlanungEnumMixin
 from SAGisXPlanung.XPlanungItem import XPlanungItem
 from SAGisXPlanung.config import xplan_tooltip, export_version
+from SAGisXPlanung.core.database_layers import is_database_layer, reload_database_layer
 from SAGisXPlanung.gui.XPEditAttributeDialog import XPEditAttributeDialog
 from SAGisXPlanung.gui.commands import AttributeChangedCommand
 from SAGisXPlanung.gui.widgets.QRelationDropdowns import QAddRelationDropdown
@@ -168,30 +169,34 @@ class QAttributeEdit(CLS, FORM_CLASS):
         if not layer:
             logger.warning(f"QAttributeEdit::update_layer_field_value: layer is None")
             return
+        if is_database_layer(layer):
+            reload_database_layer(layer)
+            return
 
-        cp = layer.customProperties()
-        for feat in layer.getFeatures(QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setNoAttributes()):
-            id_prop = cp.value(f'xplanung/feat-{feat.id()}')
-            if id_prop == self._xplanung_item.xid:
-
-                _self = self._xplanung_item.xtype()
-                setattr(_self, attr, value)
-                value = getattr(_self, attr)
+        feat_id = MapLayerRegistry().featureId(self._xplanung_item.xid)
+        if feat_id is None:
+            return
+        request = QgsFeatureRequest(feat_id).setFlags(QgsFeatureRequest.NoGeometry).setNoAttributes()
+        feat = next(layer.getFeatures(request), None)
+        if feat is None:
+            return
 
-                if hasattr(_self, 'layer_fields'):
-                    legacy_fields = _self.layer_fields()
-                    if attr in legacy_fields:
-                        value = legacy_fields[attr]
+        _self = self._xplanung_item.xtype()
+        setattr(_self, attr, value)
+        value = getattr(_self, attr)
 
-                if type(value) is list:
-                    value = ', '.join(str(v) for v in value)
+        if hasattr(_self, 'layer_fields'):
+            legacy_fields = _self.layer_fields()
+            if attr in legacy_fields:
+                value = legacy_fields[attr]
 
-                layer.commitChanges(True)
-                with edit(layer):
-                    feat[attr] = str(value) if value is not None else None
-                    layer.updateFeature(feat)
+        if type(value) is list:
+            value = ', '.join(str(v) for v in value)
 
-                return
+        layer.commitChanges(True)
+        with edit(layer):
+            feat[attr] = str(value) if value is not None else None
+            layer.updateFeature(feat)
 
     def onAttributeChanged(self, index, attr, value):
         with Session.begin() as session:
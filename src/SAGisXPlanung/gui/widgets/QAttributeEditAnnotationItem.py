@@ -57,11 +57,12 @@ class QAttributeEditAnnotationItem(QAttributeEdit):
             if not self._annotation_layer:
                 return None
 
-        for item_id, item in self._annotation_layer.items().items():
-            id_prop = self._annotation_layer.customProperties().value(f'xplanung/feat-{item_id}')
-            if id_prop == self._xplanung_item.xid:
-                self._annotation_item = item
-                return item
+        item_id = MapLayerRegistry().featureId(self._xplanung_item.xid)
+        if item_id is None:
+            return None
+
+        self._annotation_item = self._annotation_layer.item(item_id)
+        return self._annotation_item
 
     @qasync.asyncSlot(str)
     async def onSvgSelected(self, path: str):
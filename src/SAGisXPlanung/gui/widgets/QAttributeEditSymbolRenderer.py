@@ -28,12 +28,12 @@ class QAttributeEditSymbolRenderer(QAttributeEdit):
         self.initialize_listeners()
 
     def get_feature(self):
-        for feat in self._layer.getFeatures(
-                QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setNoAttributes()):
-            id_prop = self._layer.customProperties().value(f'xplanung/feat-{feat.id()}')
-            if id_prop == self._xplanung_item.xid:
-                self._feature = feat
-                break
+        feat_id = MapLayerRegistry().featureId(self._xplanung_item.xid)
+        if feat_id is None:
+            return
+
+        request = QgsFeatureRequest(feat_id).setFlags(QgsFeatureRequest.NoGeometry).setNoAttributes()
+        self._feature = next(self._layer.getFeatures(request), None)
 
     @pyqtSlot(str)
     def onLayerRemoved(self, layer_id):
@@ -1,32 +1,13 @@
 import re
-from dataclasses import dataclass
-from enum import Enum
 
 from qgis.PyQt import QtWidgets, QtGui, sip
 from qgis.gui import QgsGeometryRubberBand
 from qgis.core import (QgsPolygon, QgsRectangle, QgsWkbTypes,  QgsLineString, QgsMultiLineString, QgsMultiPolygon,
-                    QgsCircularString, QgsCompoundCurve, QgsCurvePolygon, QgsMultiCurve, QgsMultiSurface)
+                    QgsCircularString, QgsCompoundCurve, QgsCurvePolygon, QgsMultiCurve, QgsMultiSurface, QgsPoint,
+                    QgsMultiPoint)
 from qgis.utils import iface
 
-
-class GeometryIntersectionType(Enum):
-    """ Gibt an, welcher Grund einen Überschneidungsfehler hevorgerufen hat. """
-
-    Planinhalt = 'Flächenschlussobjekt weist Überschneidung auf'
-    Bereich = 'Planinhalt liegt nicht vollständig im Bereich'
-    Plan = 'Bereich liegt nicht vollständig im Geltungsbereich des Plans'
-    NotCovered = 'Kein Flächenschluss vorliegend'
-
-
-@dataclass
-class ValidationResult:
-    xid: str
-    xtype: type
-    error_msg: str = None
-    geom_wkt: str = None
-    intersection_type: GeometryIntersectionType = None
-    other_xid: str = None
-    other_xtype: type = None
+from SAGisXPlanung.core.validation import GeometryIntersectionType, ValidationResult
 
 
 def _error_detail_message(error_msg: str, validation_result: ValidationResult) -> str:
@@ -84,7 +65,11 @@ class ValidationGeometryErrorTreeWidgetItem(ValidationBaseTreeWidgetItem):
         # QgsGeometry::fromWkt does not work here and crashes QGIS -> has something to do with the wkt cache
         # but currently not able to figure the exact problem.
         wkt = self.validation_result.geom_wkt.strip()
-        if re.match('LineString', wkt, re.I):
+        if re.match('Point', wkt, re.I):
+            self.geometry = QgsPoint()
+        elif re.match('MultiPoint', wkt, re.I):
+            self.geometry = QgsMultiPoint()
+        elif re.match('LineString', wkt, re.I):
             self.geometry = QgsLineString()
         elif re.match('MultiLineString', wkt, re.I):
             self.geometry = QgsMultiLineString()
@@ -1,20 +1,14 @@
-from enum import Enum
 from pathlib import Path
 
-from qgis.core import (QgsProcessingAlgorithm, QgsProcessingParameterFolderDestination, QgsProcessingParameterEnum)
+from qgis.core import (QgsProcessingAlgorithm, QgsProcessingParameterFolderDestination, QgsProcessingParameterEnum,
+                       QgsProcessingParameterNumber)
 
 from SAGisXPlanung import Session
-from SAGisXPlanung.GML.GMLWriter import GMLWriter
+from SAGisXPlanung.processing.parallel_export import XPlanungExportTypes, export_plans
 from SAGisXPlanung.utils import CLASSES
 
-
-class XPlanungExportTypes(Enum):
-
-    XP_Plan = 'Alle Objektklassen'
-    BP_Plan = 'Bebauungspläne'
-    FP_Plan = 'Flächennutzungspläne'
-    RP_Plan = 'Regionalpläne'
-    LP_Plan = 'Landschaftspläne'
+# every worker thread holds one pooled connection, stay within the default pool size + overflow of the engine
+MAX_EXPORT_WORKERS = 8
 
 
 class ExportAllAlgorithm(QgsProcessingAlgorithm):
@@ -29,6 +23,7 @@ class ExportAllAlgorithm(QgsProcessingAlgorithm):
     OUTPUT_FOLDER = 'OUTPUT_FOLDER'
     OUTPUT_FORMAT = 'OUTPUT_FORMAT'
     XPLANUNG_TYPES = 'XPLANUNG_TYPES'
+    WORKERS = 'WORKERS'
 
     def createInstance(self):
         return ExportAllAlgorithm()
@@ -73,7 +68,10 @@ class ExportAllAlgorithm(QgsProcessingAlgorithm):
         should provide a basic description about what the algorithm does and the
         parameters and outputs associated with it..
         """
-        return 'Alle in der SAGis XPlanung-Datenbank erfassten Pläne als XPlanGML exportieren'
+        return 'Alle in der SAGis XPlanung-Datenbank erfassten Pläne als XPlanGML exportieren.\n\n' \
+               'Mit mehr als einem parallelen Export werden die Pläne gleichzeitig in eigenen Datenbanksitzungen ' \
+               'geschrieben. Für Exporte außerhalb von QGIS steht der Kommandozeilenaufruf ' \
+               '"python -m SAGisXPlanung.processing.parallel_export" zur Verfügung.'
 
     def initAlgorithm(self, config=None):
         """
@@ -105,6 +103,17 @@ class ExportAllAlgorithm(QgsProcessingAlgorithm):
             )
         )
 
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.WORKERS,
+                'Parallele Exporte',
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=1,
+                minValue=1,
+                maxValue=MAX_EXPORT_WORKERS
+            )
+        )
+
     def processAlgorithm(self, parameters, context, feedback):
         feedback.pushInfo('Start process')
 
@@ -124,31 +133,26 @@ class ExportAllAlgorithm(QgsProcessingAlgorithm):
 
         feedback.pushDebugInfo(f'XPlanung Typ: {export_cls_type.__name__}')
 
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
+
         with Session.begin() as session:
-            all_plans = session.query(export_cls_type).all()
-            count = len(all_plans)
-
-            for i, plan in enumerate(all_plans):
-                try:
-                    writer = GMLWriter(plan)
-                    file_name = plan.name.replace("/", "-").replace('"', '\'')
-                    if export_format == 0:
-                        buffer = writer.toArchive()
-                        with open(f'{output_path}/{file_name}.zip', 'wb') as f:
-                            f.write(buffer.getvalue())
-                    elif export_format == 1:
-                        gml = writer.toGML()
-                        with open(f'{output_path}/{file_name}.gml', 'wb') as f:
-                            f.write(gml)
-                except ValueError as e:
-                    feedback.pushWarning(f'{plan.name} konnte nicht exportiert werden')
-                    feedback.pushWarning(str(e))
-                    continue
-                finally:
-                    prog = self.translateProgress(i, 0, count, 0, 100)
-                    feedback.setProgress(prog)
-
-                feedback.pushInfo(f'{plan.name}')
+            plan_ids = [plan_id for plan_id, in session.query(export_cls_type.id)]
+        count = len(plan_ids)
+
+        # workers only report back their results, feedback is exclusively updated from this thread
+        results = export_plans(plan_ids, output_path, 'zip' if export_format == 0 else 'gml', workers=workers)
+        for i, result in enumerate(results, start=1):
+            if result.error:
+                feedback.pushWarning(f'{result.plan_name or result.plan_id} konnte nicht exportiert werden')
+                feedback.pushWarning(result.error)
+            else:
+                feedback.pushInfo(f'{result.plan_name}')
+
+            feedback.setProgress(self.translateProgress(i, 0, count, 0, 100))
+            if feedback.isCanceled():
+                # closing the generator cancels all pending exports
+                results.close()
+                break
 
         return {self.OUTPUT_FOLDER: output_path}
 
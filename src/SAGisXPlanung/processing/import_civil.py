@@ -33,7 +33,7 @@ from SAGisXPlanung.XPlan.enums import (XP_BedeutungenBereich, XP_Zweckbestimmung
                                        XP_ZweckbestimmungSpielSportanlage, XP_ZweckbestimmungGewaesser)
 from SAGisXPlanung.XPlan.feature_types import XP_Objekt
 from SAGisXPlanung.gui.widgets.QPlanComboBox import QPlanComboBox
-from SAGisXPlanung.utils import query_existing, save_to_db
+from SAGisXPlanung.utils import query_existing, save_to_db, PreFilledObjectCache
 
 
 class ImportCivil3DAlgorithm(QgsProcessingAlgorithm):
@@ -107,6 +107,9 @@ class ImportCivil3DAlgorithm(QgsProcessingAlgorithm):
             feedback.reportError('Eingabedatei nicht gefunden', True)
             return {}
 
+        self.pre_filled_cache = PreFilledObjectCache()
+        self.pre_filled_objects_created = False
+
         engine = create_engine(f'sqlite:///{input_path}')
         listen(engine, 'connect', load_spatialite)
 
@@ -121,6 +124,10 @@ class ImportCivil3DAlgorithm(QgsProcessingAlgorithm):
                 plan = self.processPlan(row.id, conn, feedback)
 
                 save_to_db(plan)
+                if self.pre_filled_objects_created:
+                    # newly created pre-filled objects are only available after reloading them from database
+                    self.pre_filled_cache.clear()
+                    self.pre_filled_objects_created = False
 
         return {}
 
@@ -245,7 +252,9 @@ class ImportCivil3DAlgorithm(QgsProcessingAlgorithm):
         gemeinde.ortsteilName = res.ortsteilName
 
         # find if gemeinde already exists in database
-        existing_gemeinde = query_existing(gemeinde)
+        existing_gemeinde = query_existing(gemeinde, self.pre_filled_cache)
+        if existing_gemeinde is None:
+            self.pre_filled_objects_created = True
 
         return existing_gemeinde or gemeinde
 
@@ -0,0 +1,210 @@
+import argparse
+import importlib
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from SAGisXPlanung import XPlanVersion
+
+logger = logging.getLogger(__name__)
+
+# Models must not be imported at module level: worker processes and the headless entry point configure the
+# declarative base in `setup_headless` first, all XPlanung imports are therefore deferred into the functions.
+
+
+class XPlanungExportTypes(Enum):
+
+    XP_Plan = 'Alle Objektklassen'
+    BP_Plan = 'Bebauungspläne'
+    FP_Plan = 'Flächennutzungspläne'
+    RP_Plan = 'Regionalpläne'
+    LP_Plan = 'Landschaftspläne'
+
+
+@dataclass
+class PlanExportResult:
+    """ Ergebnis des Exports eines einzelnen Plans """
+    plan_id: str
+    plan_name: Optional[str] = None
+    file_path: Optional[str] = None
+    error: Optional[str] = None
+
+
+def setup_headless(db_url: str):
+    """
+    Initialisiert SQLAlchemy und die Datenbankverbindung außerhalb der QGIS-Oberfläche.
+    Wird im Hauptprozess des Kommandozeilenaufrufs und in jedem Worker-Prozess einmalig ausgeführt, sodass jeder
+    Prozess eine eigene Engine besitzt.
+
+    Parameters
+    ----------
+    db_url: str
+        SQLAlchemy-Verbindungs-URL, z.B. `postgresql://user:pw@host:5432/db` oder `postgresql:///?service=name`
+    """
+    import SAGisXPlanung
+    from sqlalchemy import create_engine
+
+    if SAGisXPlanung.Session is None:
+        SAGisXPlanung.setup_sqlalchemy()
+        # reload config module required so that new configured `Base` is used
+        importlib.reload(SAGisXPlanung.config)
+
+    SAGisXPlanung.Session.configure(bind=create_engine(db_url))
+
+
+def export_plan_file(plan_id, output_path: str, export_format: str = 'zip',
+                     version: XPlanVersion = XPlanVersion.FIVE_THREE) -> PlanExportResult:
+    """
+    Exportiert einen Plan in einer eigenen Session als ZIP-Archiv oder XPlanGML-Datei in den Ausgabeordner.
+
+    Parameters
+    ----------
+    plan_id:
+        ID des zu exportierenden Plans
+    output_path: str
+        Ausgabeordner
+    export_format: str
+        'zip' oder 'gml'
+    version: XPlanVersion
+        XPlanung-Version der Ausgabe
+
+    Returns
+    -------
+    PlanExportResult:
+        Ergebnis des Exports; `error` ist gesetzt, wenn der Plan nicht exportiert werden konnte
+    """
+    from SAGisXPlanung import Session
+    from SAGisXPlanung.GML.GMLWriter import GMLStreamWriter, export_file_name
+    from SAGisXPlanung.core.export_loader import ExportLoader
+
+    result = PlanExportResult(plan_id=str(plan_id))
+    with Session.begin() as session:
+        plan = ExportLoader(session).load(plan_id)
+        if plan is None:
+            result.error = f'Plan {plan_id} nicht gefunden'
+            return result
+
+        result.plan_name = plan.name
+        file_path = os.path.join(output_path, f'{export_file_name(plan.name)}.{export_format}')
+        # plans sharing a name are written to the same file, replace atomically so that concurrent workers never
+        # leave an interleaved file behind
+        part_path = f'{file_path}.{plan_id}.part'
+        try:
+            writer = GMLStreamWriter(plan, version=version, server_side_geometries=True)
+            if export_format == 'zip':
+                writer.writeArchive(part_path)
+            else:
+                writer.write(part_path)
+        except ValueError as e:
+            result.error = str(e)
+            return result
+
+    os.replace(part_path, file_path)
+    result.file_path = file_path
+    return result
+
+
+def export_plans(plan_ids: Iterable, output_path: str, export_format: str = 'zip',
+                 version: XPlanVersion = XPlanVersion.FIVE_THREE, workers: int = 1, use_processes: bool = False,
+                 db_url: str = None) -> Iterator[PlanExportResult]:
+    """
+    Exportiert mehrere Pläne, bei `workers > 1` parallel.
+    Die Ergebnisse werden in der Reihenfolge ihrer Fertigstellung geliefert, sodass der Aufrufer den Fortschritt
+    zusammenführen kann. Wird der Generator vorzeitig geschlossen, werden alle noch nicht gestarteten Exporte
+    abgebrochen.
+
+    Parameters
+    ----------
+    plan_ids: Iterable
+        IDs der zu exportierenden Pläne
+    output_path: str
+        Ausgabeordner
+    export_format: str
+        'zip' oder 'gml'
+    version: XPlanVersion
+        XPlanung-Version der Ausgabe
+    workers: int
+        Anzahl paralleler Exporte
+    use_processes: bool
+        Worker-Prozesse statt Threads verwenden. Nicht innerhalb von QGIS verfügbar, erfordert `db_url`.
+    db_url: str
+        Verbindungs-URL, mit der jeder Worker-Prozess seine eigene Engine erstellt
+    """
+    if workers <= 1:
+        for plan_id in plan_ids:
+            yield export_plan_file(plan_id, output_path, export_format, version)
+        return
+
+    if use_processes:
+        if not db_url:
+            raise ValueError('Für den Export in Worker-Prozessen wird eine Verbindungs-URL benötigt')
+        # spawn instead of fork: child processes must not inherit the connection pool of the parent
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=setup_headless, initargs=(db_url,))
+    else:
+        # threads share the engine of the plugin, but every export runs in its own session and connection
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='xplanung-export')
+
+    try:
+        futures = [executor.submit(export_plan_file, plan_id, output_path, export_format, version)
+                   for plan_id in plan_ids]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m SAGisXPlanung.processing.parallel_export',
+        description='Alle in der SAGis XPlanung-Datenbank erfassten Pläne als XPlanGML exportieren'
+    )
+    parser.add_argument('--db-url', default=os.environ.get('SAGIS_XPLANUNG_DB_URL'),
+                        help='SQLAlchemy-Verbindungs-URL (Standard: Umgebungsvariable SAGIS_XPLANUNG_DB_URL)')
+    parser.add_argument('-o', '--output', required=True, help='Ausgabeordner')
+    parser.add_argument('--type', default=XPlanungExportTypes.XP_Plan.name,
+                        choices=[x.name for x in XPlanungExportTypes], help='zu exportierende Planart')
+    parser.add_argument('--format', default='zip', choices=['zip', 'gml'], help='Ausgabeformat')
+    parser.add_argument('--xplan-version', default=XPlanVersion.FIVE_THREE.value,
+                        choices=[v.value for v in XPlanVersion], help='XPlanung-Version der Ausgabe')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='Anzahl der Worker-Prozesse')
+    args = parser.parse_args(argv)
+
+    if not args.db_url:
+        parser.error('keine Verbindungs-URL angegeben (--db-url oder SAGIS_XPLANUNG_DB_URL)')
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    setup_headless(args.db_url)
+    from SAGisXPlanung import Session
+    from SAGisXPlanung.utils import CLASSES
+
+    Path(args.output).mkdir(parents=True, exist_ok=True)
+    with Session.begin() as session:
+        plan_ids = [plan_id for plan_id, in session.query(CLASSES[args.type].id)]
+
+    count = len(plan_ids)
+    failed = 0
+    results = export_plans(plan_ids, args.output, args.format, XPlanVersion(args.xplan_version),
+                           workers=args.workers, use_processes=True, db_url=args.db_url)
+    for i, result in enumerate(results, start=1):
+        if result.error:
+            failed += 1
+            logger.warning(f'[{i}/{count}] {result.plan_name or result.plan_id} konnte nicht exportiert werden: '
+                           f'{result.error}')
+        else:
+            logger.info(f'[{i}/{count}] {result.plan_name}')
+
+    logger.info(f'{count - failed} von {count} Plänen exportiert')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -203,11 +203,16 @@ async def save_to_db_async(obj):
     await loop.run_in_executor(None, save_to_db, obj)
 
 
-def query_existing(obj):
+def query_existing(obj, cache: 'PreFilledObjectCache' = None):
     """
     Prüft ob ein gegebenes XPlanung-Objekt bereits in der Datenbank existiert.
-    Falls ja, wird dieses zurückgegeben, ansonsten None
+    Falls ja, wird dieses zurückgegeben, ansonsten None.
+    Für vorbelegte Objekte (PRE_FILLED_CLASSES) kann ein PreFilledObjectCache übergeben werden, um wiederholte
+    Abfragen der Datenbank zu vermeiden.
     """
+    if cache is not None and obj.__class__ in PRE_FILLED_CLASSES:
+        return cache.get(obj)
+
     with Session.begin() as session:
         session.expire_on_commit = False
         objects_from_db = session.query(obj.__class__).all()
@@ -215,6 +220,50 @@ def query_existing(obj):
     return obj_from_db
 
 
+class PreFilledObjectCache:
+    """
+    Zwischenspeicher der vorbelegten XPlanung-Objekte (PRE_FILLED_CLASSES), z.B. für die Dauer eines Imports.
+    Alle Objekte einer Klasse werden mit einer einzigen Abfrage geladen und über ihren natürlichen Schlüssel
+    (`natural_key()`) indiziert, sodass die Suche nach einem bereits existierenden Objekt in O(1) erfolgt.
+    """
+
+    # wird bei jeder Änderung der vorbelegten Objekte erhöht, um die Inhalte aller Caches zu verwerfen
+    generation = 0
+
+    def __init__(self):
+        self._lookup = {}
+        self._loaded_generation = PreFilledObjectCache.generation
+
+    @classmethod
+    def invalidate(cls):
+        """ Verwirft die Inhalte aller Caches, nachdem vorbelegte Objekte in der Datenbank geändert wurden """
+        cls.generation += 1
+
+    def clear(self):
+        self._lookup.clear()
+
+    def get(self, obj):
+        """ Gibt das in der Datenbank vorhandene Objekt mit gleichem natürlichen Schlüssel zurück oder None """
+        if self._loaded_generation != PreFilledObjectCache.generation:
+            self._lookup.clear()
+            self._loaded_generation = PreFilledObjectCache.generation
+
+        cls = obj.__class__
+        if (lookup := self._lookup.get(cls)) is None:
+            lookup = self._lookup[cls] = self.load(cls)
+
+        return lookup.get(obj.natural_key())
+
+    @staticmethod
+    def load(cls) -> dict:
+        lookup = {}
+        with Session.begin() as session:
+            session.expire_on_commit = False
+            for obj_from_db in session.query(cls).all():
+                lookup.setdefault(obj_from_db.natural_key(), obj_from_db)
+        return lookup
+
+
 def createXPlanungIndicators():
     xp_indicator = QgsLayerTreeViewIndicator(iface.layerTreeView())
     xp_indicator.setToolTip('Diese Gruppe stellt ein XPlanung konform erfasstes Planwerk dar.')
@@ -0,0 +1,203 @@
+"""
+Geometrievalidierung in separaten Python-Prozessen.
+
+Innerhalb von QGIS kann kein `ProcessPoolExecutor` genutzt werden, die Validierung großer Pläne konkurriert in einem
+Thread mit der Oberfläche um den GIL. Der Worker wird daher als eigener Prozess gestartet::
+
+    python -m SAGisXPlanung.validation_worker
+
+Jede Zeile auf stdin enthält einen Auftrag als JSON-Objekt mit den Geometrien (hex-kodiertes WKB) des Plans, der
+Bereiche und aller Planinhalte sowie dem Ausschnitt der Planinhalte, die der Worker prüft. Für jeden Auftrag wird eine
+Zeile mit den Ergebnissen auf stdout geschrieben.
+"""
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from SAGisXPlanung.core.validation import GeometryValidationEngine, ValidationFeature, ValidationResult, \
+    GeometryIntersectionType
+
+logger = logging.getLogger(__name__)
+
+# below this number of plan contents starting the worker processes takes longer than validating in process
+PARALLEL_MIN_OBJECTS = 5000
+WORKER_TIMEOUT = 30 * 60
+
+
+def _wkb_hex(wkb) -> Optional[str]:
+    if wkb is None or isinstance(wkb, str):
+        return wkb
+    return bytes(wkb).hex()
+
+
+def encode_task(engine: GeometryValidationEngine, objects: range, plan_checks: bool) -> str:
+    """ Auftrag für einen Worker: prüft die Planinhalte im Bereich `objects` und optional Plan und Bereiche """
+    return json.dumps({
+        'plan': [str(engine.plan.xid), _wkb_hex(engine.plan.wkb)],
+        'bereiche': [[str(b.xid), _wkb_hex(b.wkb)] for b in engine.bereiche],
+        'objects': [[str(o.xid), _wkb_hex(o.wkb), o.parent_xid, bool(o.flaechenschluss)] for o in engine.objects],
+        'range': [objects.start, objects.stop],
+        'plan_checks': plan_checks
+    })
+
+
+def run_task(line: str) -> str:
+    """ Führt einen Auftrag aus und gibt die Ergebnisse als JSON zurück """
+    task = json.loads(line)
+    engine = GeometryValidationEngine(
+        ValidationFeature(task['plan'][0], None, task['plan'][1]),
+        [ValidationFeature(xid, None, wkb) for xid, wkb in task['bereiche']],
+        [ValidationFeature(xid, None, wkb, parent_xid, fs) for xid, wkb, parent_xid, fs in task['objects']]
+    )
+
+    results = engine.validate_objects(np.arange(*task['range']))
+    if task['plan_checks']:
+        results.extend(engine.validate_plan())
+
+    return json.dumps([{
+        'xid': r.xid,
+        'error_msg': r.error_msg,
+        'geom_wkt': r.geom_wkt,
+        'intersection_type': r.intersection_type.name if r.intersection_type else None,
+        'other_xid': r.other_xid
+    } for r in results])
+
+
+def decode_results(engine: GeometryValidationEngine, line: str) -> List[ValidationResult]:
+    """ Ergebnisse eines Workers, die Klassen der Objekte werden aus der Eingabe der Engine ergänzt """
+    xtypes = {str(f.xid): f.xtype for f in [engine.plan, *engine.bereiche, *engine.objects]}
+    return [
+        ValidationResult(
+            xid=r['xid'],
+            xtype=xtypes.get(r['xid']),
+            error_msg=r['error_msg'],
+            geom_wkt=r['geom_wkt'],
+            intersection_type=GeometryIntersectionType[r['intersection_type']] if r['intersection_type'] else None,
+            other_xid=r['other_xid'],
+            other_xtype=xtypes.get(r['other_xid'])
+        )
+        for r in json.loads(line)
+    ]
+
+
+def python_executable() -> str:
+    """ Python-Interpreter der QGIS-Installation, `sys.executable` verweist unter Windows auf die QGIS-Anwendung """
+    if Path(sys.executable).name.lower().startswith('python'):
+        return sys.executable
+    for name in ('python.exe', 'python3', 'python'):
+        candidate = Path(sys.exec_prefix) / name
+        if candidate.is_file():
+            return str(candidate)
+    return shutil.which('python3') or 'python'
+
+
+def worker_environment() -> dict:
+    """
+    Umgebung der Worker. Der Import des Plugins setzt dieselben Module wie im QGIS-Prozess voraus, daher wird der
+    vollständige Suchpfad übernommen, den QGIS beim Start erweitert (QGIS-Python-Verzeichnis, Plugins,
+    Abhängigkeiten).
+    """
+    from SAGisXPlanung import BASE_DIR
+
+    python_path = [os.path.dirname(BASE_DIR), *(p for p in sys.path if p)]
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join(python_path + [env.get('PYTHONPATH', '')])
+    return env
+
+
+def validate_parallel(engine: GeometryValidationEngine, processes: int = None) -> List[ValidationResult]:
+    """
+    Validiert den Plan der Engine verteilt auf mehrere Worker-Prozesse.
+
+    Jeder Worker erhält alle Geometrien, prüft aber nur einen Teil der Planinhalte. Die Prüfungen des Plans und der
+    Bereiche übernimmt der erste Worker.
+
+    Parameters
+    ----------
+    engine: GeometryValidationEngine
+        Eingabe der Validierung
+    processes: int
+        Anzahl der Worker, standardmäßig die Anzahl der Prozessorkerne
+
+    Returns
+    -------
+    List[ValidationResult]:
+        Ergebnisse wie von `GeometryValidationEngine.validate`
+    """
+    processes = max(1, min(processes or os.cpu_count() or 1, len(engine.objects) or 1))
+    chunks = np.array_split(np.arange(len(engine.objects)), processes)
+
+    def _run(worker: subprocess.Popen, task: str) -> str:
+        # communicate reads stdout and stderr together, a worker can't block on a full stderr pipe
+        output, errors = worker.communicate(input=task, timeout=WORKER_TIMEOUT)
+        if worker.returncode != 0:
+            raise RuntimeError(f'Validierung fehlgeschlagen: {errors}')
+        return output
+
+    workers = []
+    executor = ThreadPoolExecutor(max_workers=len(chunks))
+    try:
+        tasks = []
+        for i, chunk in enumerate(chunks):
+            workers.append(subprocess.Popen(
+                [python_executable(), '-m', 'SAGisXPlanung.validation_worker'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                encoding='utf-8', env=worker_environment(),
+                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+            ))
+            objects = range(int(chunk[0]), int(chunk[-1]) + 1) if len(chunk) else range(0)
+            tasks.append(encode_task(engine, objects, plan_checks=i == 0) + '\n')
+
+        # each worker is fed and read on its own thread, so that all of them validate at the same time
+        outputs = list(executor.map(_run, workers, tasks))
+    finally:
+        # workers that timed out or are still running after an error of another worker, killing them also ends
+        # the pending `communicate` calls
+        for worker in workers:
+            if worker.poll() is None:
+                worker.kill()
+        executor.shutdown(wait=True)
+
+    results = []
+    for output in outputs:
+        # the results are the last line, imported modules might write to stdout as well
+        results.extend(decode_results(engine, output.strip().splitlines()[-1]))
+
+    # overlapping pairs spanning two chunks are found by both workers
+    unique_results = {}
+    for r in results:
+        unique_results.setdefault((r.xid, r.other_xid, r.intersection_type, r.error_msg, r.geom_wkt), r)
+    return list(unique_results.values())
+
+
+class WorkerValidationEngine(GeometryValidationEngine):
+    """ `GeometryValidationEngine`, die vollständige Validierungen großer Pläne in Worker-Prozessen ausführt """
+
+    def validate(self) -> List[ValidationResult]:
+        if len(self.objects) < PARALLEL_MIN_OBJECTS:
+            return super().validate()
+
+        try:
+            return validate_parallel(self)
+        except Exception as e:
+            logger.warning(f'Validierung in Worker-Prozessen nicht möglich, Validierung im QGIS-Prozess: {e}')
+            return super().validate()
+
+
+def main():
+    for line in sys.stdin:
+        if line.strip():
+            sys.stdout.write(run_task(line) + '\n')
+            sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
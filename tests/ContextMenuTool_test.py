@@ -8,6 +8,7 @@ from qgis.core import QgsVectorLayer, QgsFeature, QgsGeometry, QgsAnnotationLaye
 from qgis.gui import QgsHighlight, QgsMapToolIdentify
 from qgis.utils import iface
 
+from SAGisXPlanung.MapLayerRegistry import MapLayerRegistry
 from SAGisXPlanung.Tools.ContextMenuTool import ContextMenuTool, ActionType
 from SAGisXPlanung.XPlan.XP_Praesentationsobjekte.feature_types import XP_PTO
 from SAGisXPlanung.XPlanungItem import XPlanungItem
@@ -78,7 +79,7 @@ class TestContextMenuTool:
         xplan_layer = vl.clone()
         xplan_layer.setCustomProperty('xplanung/type', 'BP_BauGrenze')
         xplan_layer.setCustomProperty('xplanung/plan-name', 'Plan1')
-        xplan_layer.setCustomProperty('xplanung/feat-1', '14356316-413643-46136-413')
+        MapLayerRegistry().registerFeature(xplan_layer, 1, '14356316-413643-46136-413')
         results = [QgsMapToolIdentify.IdentifyResult(vl, feat, {'test': '1'}),
                    QgsMapToolIdentify.IdentifyResult(xplan_layer, feat, {'test': '2'})]
         QgsProject().instance().addMapLayer(al)
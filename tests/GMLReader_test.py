@@ -6,9 +6,11 @@ from geoalchemy2 import WKTElement, WKBElement
 
 from SAGisXPlanung.BPlan.BP_Bebauung.feature_types import BP_BaugebietsTeilFlaeche
 from SAGisXPlanung.BPlan.BP_Sonstiges.feature_types import BP_Wegerecht
-from SAGisXPlanung.GML.GMLReader import GMLReader
+from SAGisXPlanung.GML.GMLReader import GMLReader, GMLStreamReader
+from SAGisXPlanung.GML.schema import XPlanSchema
+from SAGisXPlanung import XPlanVersion
 from SAGisXPlanung.XPlan.XP_Praesentationsobjekte.feature_types import XP_PPO, XP_PTO, XP_Nutzungsschablone
-from SAGisXPlanung.XPlan.data_types import XP_Gemeinde, XP_Plangeber, XP_VerbundenerPlan
+from SAGisXPlanung.XPlan.data_types import XP_Gemeinde, XP_Plangeber, XP_VerbundenerPlan, XP_SpezExterneReferenz
 from SAGisXPlanung.XPlan.enums import XP_ExterneReferenzTyp, XP_ExterneReferenzArt
 
 
@@ -29,6 +31,16 @@ def gml_reader(request, mocker):
     return GMLReader(etree.tostring(gml))
 
 
+@pytest.fixture
+def gml_stream_reader(request, mocker):
+    mocker.patch(
+        'SAGisXPlanung.GML.GMLReader.query_existing',
+        side_effect=side_effect
+    )
+    with open(os.path.join(os.path.dirname(__file__), f'gml/{request.param}'), 'rb') as f:
+        return GMLStreamReader(f)
+
+
 class TestGMLReader_read_data_object:
 
     @pytest.mark.parametrize('gml_reader', ['bp_plan.gml'], indirect=True)
@@ -109,6 +121,82 @@ class TestGMLReader_readPlan:
         assert plan.externeReferenz[0].referenzName == 'Satzung Denkmalbereichssatzung "Eisenbahnersiedlung"'
 
 
+class TestGMLStreamReader_readPlan:
+
+    @pytest.mark.parametrize('gml_stream_reader', ['bp_plan.gml'], indirect=True)
+    def test_readPlan(self, gml_stream_reader):
+        plan = gml_stream_reader.plan
+        assert plan.name == 'bp_plan'
+        assert gml_stream_reader.object_count == 10
+        assert len(plan.externeReferenz) == 1
+        assert len(plan.aendert) == 1
+
+        assert len(plan.bereich) == 2
+        assert len(plan.bereich[1].planinhalt) == 4
+        assert plan.bereich[1].planinhalt[1].__class__.__name__ == 'BP_Wegerecht'
+
+        baugebiet = plan.bereich[1].planinhalt[2]
+        assert isinstance(baugebiet, BP_BaugebietsTeilFlaeche)
+        assert len(baugebiet.wirdDargestelltDurch) == 3
+        assert isinstance(baugebiet.template(), XP_Nutzungsschablone)
+        assert not baugebiet.template().hidden
+        assert isinstance(baugebiet.wirdDargestelltDurch[0], XP_PPO)
+        assert isinstance(baugebiet.wirdDargestelltDurch[1], XP_PTO)
+
+    @pytest.mark.parametrize('gml_stream_reader', ['bp_plan1.gml'], indirect=True)
+    def test_readPlan_top_level_ns_issue24(self, gml_stream_reader):
+        plan = gml_stream_reader.plan
+        assert plan.name == 'Denkmalbereichssatzung Eisenbahnersiedlung'
+        assert len(plan.externeReferenz) == 1
+
+
+class TestXPlanSchema:
+
+    def test_schema_is_cached(self):
+        schema = XPlanSchema.of(BP_Wegerecht, XPlanVersion.FIVE_THREE)
+        assert XPlanSchema.of(BP_Wegerecht, XPlanVersion.FIVE_THREE) is schema
+        assert XPlanSchema.of(BP_Wegerecht, XPlanVersion.SIX) is not schema
+
+    def test_node_schema(self):
+        schema = XPlanSchema.of(BP_BaugebietsTeilFlaeche, XPlanVersion.FIVE_THREE)
+
+        assert schema.node('gehoertZuBereich') is None
+        assert schema.node('unknownAttribute') is None
+
+        relation = schema.node('wirdDargestelltDurch')
+        assert relation.is_relation
+        assert relation.col_type is None
+
+        column = schema.node('flaechenschluss')
+        assert not column.is_relation
+        assert column.col_type.python_type == bool
+
+    def test_column_type(self):
+        schema = XPlanSchema.of(XP_SpezExterneReferenz)
+
+        assert schema.column_type('referenzName') is not None
+        assert schema.column_type('unknownAttribute') is None
+
+    def test_tables_immutable(self):
+        schema = XPlanSchema.of(BP_BaugebietsTeilFlaeche, XPlanVersion.FIVE_THREE)
+
+        with pytest.raises(TypeError):
+            schema.nodes['unknownAttribute'] = None
+        with pytest.raises(TypeError):
+            schema.columns['unknownAttribute'] = None
+        assert isinstance(schema.element_order, tuple)
+
+    def test_writer_tables(self):
+        schema = XPlanSchema.of(BP_BaugebietsTeilFlaeche, XPlanVersion.FIVE_THREE)
+
+        assert list(schema.element_order) == BP_BaugebietsTeilFlaeche.element_order(version=XPlanVersion.FIVE_THREE)
+        relations = {name for name, _ in BP_BaugebietsTeilFlaeche.relationships()}
+        assert set(schema.attributes) == set(schema.element_order) - relations
+        assert 'GRZ' in schema.attributes
+        assert schema.uom['GR'] == 'm2'
+        assert 'GRZ' not in schema.uom
+
+
 class TestGMLReader_readGeometries:
 
     @pytest.mark.parametrize('gml_reader', ['bp_plan.gml'], indirect=True)
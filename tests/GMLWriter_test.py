@@ -9,6 +9,7 @@ import pytest
 from geoalchemy2 import WKTElement, WKBElement
 from geoalchemy2.shape import from_shape, to_shape
 from lxml import etree
+from osgeo import ogr
 from shapely.geometry import Polygon, MultiPolygon, MultiLineString, Point
 
 from SAGisXPlanung.BPlan.BP_Basisobjekte.enums import BP_PlanArt, BP_Rechtscharakter
@@ -24,7 +25,8 @@ from SAGisXPlanung.BPlan.BP_Umwelt.enums import BP_Laermpegelbereich
 from SAGisXPlanung.BPlan.BP_Umwelt.feature_types import BP_Immissionsschutz
 from SAGisXPlanung.FPlan.FP_Basisobjekte.enums import FP_Rechtscharakter
 from SAGisXPlanung.FPlan.FP_Landwirtschaft_Wald_und_Gruen.feature_types import FP_WaldFlaeche
-from SAGisXPlanung.GML.GMLWriter import writeTextNode, GMLWriter
+from SAGisXPlanung.GML.GMLWriter import writeTextNode, GMLWriter, GMLStreamWriter
+from SAGisXPlanung.GML.geometry import EncodedGeometry
 from SAGisXPlanung.XPlan.XP_Praesentationsobjekte.feature_types import XP_Nutzungsschablone, XP_PTO
 from SAGisXPlanung.XPlan.data_types import XP_Gemeinde, XP_Plangeber, XP_SpezExterneReferenz, XP_ExterneReferenz, \
     XP_Hoehenangabe, XP_GesetzlicheGrundlage
@@ -32,7 +34,7 @@ from SAGisXPlanung.XPlan.enums import XP_WaldbetretungTyp, XP_ArtHoehenbezugspun
 
 
 @pytest.fixture()
-def gml_writer():
+def bp_plan():
     plan = BP_Plan()
     plan.raeumlicherGeltungsbereich = WKTElement(
         'MULTIPOLYGON (((40 40, 20 45, 45 30, 40 40)),((20 35, 45 20, 30 5, 10 10, 10 30, 20 35),(30 20, 20 25, 20 15, 30 20)))',
@@ -126,7 +128,17 @@ def gml_writer():
     bereich.planinhalt.append(bp_immissionsschutz)
 
     plan.bereich.append(bereich)
-    return GMLWriter(plan)
+    return plan
+
+
+@pytest.fixture()
+def gml_writer(bp_plan):
+    return GMLWriter(bp_plan)
+
+
+@pytest.fixture()
+def gml_stream_writer(bp_plan):
+    return GMLStreamWriter(bp_plan)
 
 
 @pytest.fixture()
@@ -190,3 +202,100 @@ class TestGMLWriter_export:
         assert len(zip_archive.namelist()) == 2
         assert any(PurePath(file_name).suffix == '.gml' for file_name in zip_archive.namelist())
         assert any(PurePath(file_name).suffix == '.tif' for file_name in zip_archive.namelist())
+
+
+class TestGMLStreamWriter_export:
+
+    def test_matches_tree_writer(self, gml_writer, gml_stream_writer, xplan_schema):
+        root = etree.fromstring(gml_stream_writer.toGML())
+
+        assert root.tag == gml_writer.root.tag
+        assert [child.tag for child in root] == [child.tag for child in gml_writer.root]
+        xplan_schema.assertValid(root[-1:][0])
+
+    def test_writeArchive(self, gml_stream_writer, tmp_path):
+        file_path = tmp_path / 'test.zip'
+
+        gml_stream_writer.writeArchive(str(file_path))
+
+        with zipfile.ZipFile(file_path) as zip_archive:
+            names = zip_archive.namelist()
+            assert names[0] == 'test.gml'
+            assert any(PurePath(file_name).suffix == '.tif' for file_name in names)
+            root = etree.fromstring(zip_archive.read('test.gml'))
+        ref = root.find('.//xplan:referenzURL', namespaces=root.nsmap)
+        assert ref.text.endswith('bp_plan.tif')
+
+    def test_writeArchive_missing_file_removed(self, gml_stream_writer, tmp_path):
+        file_path = tmp_path / 'test.zip'
+        gml_stream_writer.plan.externeReferenz[0].file = None
+
+        with pytest.raises(ValueError):
+            gml_stream_writer.writeArchive(str(file_path))
+
+        assert not file_path.exists()
+
+
+class TestGMLWriter_writeGeometry:
+
+    def test_geometry_decoded_once(self, gml_writer, mocker):
+        geom = WKBElement(Polygon([(0, 0), (1, 0), (1, 1), (0, 0)]).wkb, srid=25833)
+        create = mocker.spy(ogr, 'CreateGeometryFromWkb')
+
+        gml_writer.writeEnvelope(geom)
+        gml_writer.writeGeometry(geom)
+
+        assert create.call_count == 1
+
+    def test_spatial_reference_cached(self, gml_writer):
+        srs = gml_writer.spatialReference(25833)
+
+        assert gml_writer.spatialReference(25833) is srs
+        assert gml_writer.spatialReference(4326) is not srs
+
+
+class TestGMLWriter_serverSideGeometries:
+
+    def test_encoded_geometry_used(self, gml_writer, bp_plan, mocker):
+        bp_plan.id = uuid.uuid4()
+        fragment = '<gml:Polygon srsName="EPSG:4326" gml:id="GML_1"><gml:exterior><gml:LinearRing>' \
+                   '<gml:posList srsDimension="2">0 0 1 0 1 1 0 0</gml:posList></gml:LinearRing></gml:exterior>' \
+                   '</gml:Polygon>'
+        mocker.patch('SAGisXPlanung.GML.GMLWriter.object_session')
+        mocker.patch('SAGisXPlanung.GML.GMLWriter.inspect').return_value.attrs.__getitem__.return_value\
+            .history.has_changes.return_value = False
+        encode = mocker.patch('SAGisXPlanung.GML.GMLWriter.encode_geometries', return_value={
+            (str(bp_plan.id), 'raeumlicherGeltungsbereich'): EncodedGeometry(fragment, (0.0, 1.0, 2.0, 3.0))
+        })
+        create = mocker.spy(ogr, 'CreateGeometryFromWkt')
+
+        gml_writer.prefetchGeometries([(bp_plan, 'raeumlicherGeltungsbereich')])
+        envelope = gml_writer.writeEnvelope(bp_plan.raeumlicherGeltungsbereich)
+        geometry = gml_writer.writeGeometry(bp_plan.raeumlicherGeltungsbereich)
+
+        encode.assert_called_once()
+        create.assert_not_called()
+        assert envelope.find('.//gml:lowerCorner', namespaces=gml_writer.nsmap).text == '0.0 2.0'
+        assert geometry.tag == f"{{{gml_writer.nsmap['gml']}}}Polygon"
+        assert geometry.get(f"{{{gml_writer.nsmap['gml']}}}id") == 'GML_1'
+
+    def test_curved_geometry_falls_back_to_ogr(self, gml_writer, bp_plan, mocker):
+        bp_plan.id = uuid.uuid4()
+        mocker.patch('SAGisXPlanung.GML.GMLWriter.object_session')
+        mocker.patch('SAGisXPlanung.GML.GMLWriter.inspect').return_value.attrs.__getitem__.return_value\
+            .history.has_changes.return_value = False
+        mocker.patch('SAGisXPlanung.GML.GMLWriter.encode_geometries', return_value={
+            (str(bp_plan.id), 'raeumlicherGeltungsbereich'): EncodedGeometry(None, (0.0, 1.0, 2.0, 3.0))
+        })
+
+        gml_writer.prefetchGeometries([(bp_plan, 'raeumlicherGeltungsbereich')])
+        geometry = gml_writer.writeGeometry(bp_plan.raeumlicherGeltungsbereich)
+
+        assert geometry.tag == f"{{{gml_writer.nsmap['gml']}}}MultiSurface"
+
+    def test_transient_objects_skipped(self, gml_writer, bp_plan, mocker):
+        encode = mocker.patch('SAGisXPlanung.GML.GMLWriter.encode_geometries')
+
+        gml_writer.prefetchGeometries([(bp_plan, 'raeumlicherGeltungsbereich')])
+
+        encode.assert_not_called()
@@ -5,13 +5,15 @@ from geoalchemy2 import WKTElement
 from mock.mock import MagicMock
 from qgis._core import QgsLayerTreeNode, QgsLayerTreeGroup
 
-from qgis.core import QgsVectorLayer, QgsAnnotationLayer, QgsProject, QgsGeometry, QgsWkbTypes
+from qgis.core import QgsVectorLayer, QgsAnnotationLayer, QgsProject, QgsGeometry, QgsWkbTypes, QgsFeature
 
 from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan
+from SAGisXPlanung.BPlan.BP_Bebauung.feature_types import BP_BaugebietsTeilFlaeche
 from SAGisXPlanung.BPlan.BP_Naturschutz_Landschaftsbild_Naturhaushalt.feature_types import BP_AnpflanzungBindungErhaltung
-from SAGisXPlanung.MapLayerRegistry import MapLayerRegistry, CanvasItemRegistryItem
+from SAGisXPlanung.MapLayerRegistry import MapLayerRegistry, CanvasItemRegistryItem, XID_FIELD
 from SAGisXPlanung.XPlan.XP_Praesentationsobjekte.feature_types import XP_PTO
 from SAGisXPlanung.XPlanungItem import XPlanungItem
+from SAGisXPlanung.core.helper.layer import add_xid_field
 
 
 plan_xid = 'c52aeb9d-34e2-4eca-b56b-e3f3752c94dd'
@@ -20,6 +22,13 @@ feat1_xid = 'e52aeb9d-34e2-4eca-b56b-e3f3752c94dd'
 feat2_xid = 'f52aeb9d-34e2-4eca-b56b-e3f3752c94dd'
 
 
+def add_feature(layer: QgsVectorLayer, xid: str):
+    add_xid_field(layer)
+    feat = QgsFeature(layer.fields())
+    feat[XID_FIELD] = xid
+    layer.dataProvider().addFeatures([feat])
+
+
 @pytest.fixture()
 def xitem() -> XPlanungItem:
     return XPlanungItem(xid=str(uuid.uuid4()), xtype=XP_PTO, plan_xid=plan_xid)
@@ -30,7 +39,7 @@ def vl(request) -> QgsVectorLayer:
     layer = QgsVectorLayer('polygon?crs=epsg:4326', request.param, "memory")
     layer.setCustomProperty('xplanung/type', request.param)
     layer.setCustomProperty('xplanung/plan-xid', plan_xid)
-    layer.setCustomProperty(f'xplanung/feat-1', feat_xid)
+    add_feature(layer, feat_xid)
     return layer
 
 
@@ -39,7 +48,7 @@ def vl1() -> QgsVectorLayer:
     layer = QgsVectorLayer('point?crs=epsg:4326', "Scratch  layer", "memory")
     layer.setCustomProperty('xplanung/type', 'BP_AnpflanzungBindungErhaltung')
     layer.setCustomProperty('xplanung/plan-xid', plan_xid)
-    layer.setCustomProperty(f'xplanung/feat-1', feat1_xid)
+    add_feature(layer, feat1_xid)
     return layer
 
 
@@ -48,7 +57,7 @@ def vl2() -> QgsVectorLayer:
     layer = QgsVectorLayer('polygon?crs=epsg:4326', "Scratch  layer", "memory")
     layer.setCustomProperty('xplanung/type', 'BP_AnpflanzungBindungErhaltung')
     layer.setCustomProperty('xplanung/plan-xid', plan_xid)
-    layer.setCustomProperty(f'xplanung/feat-1', feat2_xid)
+    add_feature(layer, feat2_xid)
     return layer
 
 
@@ -71,8 +80,7 @@ def registry() -> MapLayerRegistry:
 def clear_registry_after_test(registry):
     yield
 
-    registry._layers = []
-    registry._canvasItems = []
+    registry.clear()
     QgsProject().instance().removeAllMapLayers()
 
 
@@ -156,6 +164,7 @@ class TestMapLayerRegistry:
 
     @pytest.mark.parametrize("vl", ['BP_BaugebietsTeilFlaeche'], indirect=True)
     def test_geometries_changed(self, mocker, registry, vl):
+        registry.addLayer(vl)
         mocker.patch("SAGisXPlanung.MapLayerRegistry.MapLayerRegistry.layerById").return_value = vl
 
         poly = BP_Plan()
@@ -169,6 +178,88 @@ class TestMapLayerRegistry:
 
         obj_mock.setGeometry.assert_not_called()
 
+    @pytest.mark.parametrize("vl", ['BP_BaugebietsTeilFlaeche'], indirect=True)
+    def test_register_feature(self, registry, vl):
+        registry.addLayer(vl)
+
+        registry.registerFeature(vl, 2, feat1_xid)
+
+        assert registry.layerByFeature(feat1_xid) is vl
+        assert registry.featureId(feat1_xid) == 2
+        assert registry.featureXid(vl, 2) == feat1_xid
+
+        registry.unregisterFeature(vl, 2)
+
+        assert not registry.featureIsShown(feat1_xid)
+        assert registry.featureXid(vl, 2) is None
+        assert registry.featureIsShown(feat_xid)
+
+    @pytest.mark.parametrize("vl", ['BP_BaugebietsTeilFlaeche'], indirect=True)
+    def test_add_layer_indexes_xid_attribute(self, registry, vl):
+        registry.addLayer(vl)
+
+        assert registry.featureId(feat_xid) == 1
+        assert registry.featureXid(vl, 1) == feat_xid
+        assert not [key for key in vl.customPropertyKeys() if key.startswith('xplanung/feat-')]
+
+    @pytest.mark.parametrize("vl", ['BP_BaugebietsTeilFlaeche'], indirect=True)
+    def test_unregister_features(self, registry, vl):
+        registry.addLayer(vl)
+        registry.registerFeature(vl, 2, feat1_xid)
+
+        registry.unregisterFeatures(vl)
+
+        assert not registry.featureIsShown(feat_xid)
+        assert not registry.featureIsShown(feat1_xid)
+        assert registry.featureXid(vl, 1) is None
+
+    @pytest.mark.parametrize("vl", ['BP_BaugebietsTeilFlaeche'], indirect=True)
+    def test_features_removed(self, registry, vl):
+        registry.addLayer(vl)
+
+        registry.onFeaturesRemoved(vl.id(), [1])
+
+        assert not registry.featureIsShown(feat_xid)
+
+    @pytest.mark.parametrize("vl", ['BP_BaugebietsTeilFlaeche'], indirect=True)
+    def test_remove_layer_clears_index(self, registry, vl):
+        registry.addLayer(vl)
+        xitem = XPlanungItem(xid=feat_xid, xtype=BP_BaugebietsTeilFlaeche, plan_xid=plan_xid)
+
+        registry.removeLayer(vl.id())
+
+        assert registry.layerById(vl.id()) is None
+        assert registry.layerByFeature(feat_xid) is None
+        assert registry.layerByXid(xitem) is None
+        assert registry.layer_by_display_name('BP_BaugebietsTeilFlaeche', plan_xid) is None
+
+    @pytest.mark.parametrize("vl", ['BP_Bereich'], indirect=True)
+    def test_get_layer_by_display_name_renamed(self, registry, vl):
+        registry.addLayer(vl)
+
+        vl.setName('Bereich 1')
+
+        assert registry.layer_by_display_name('BP_Bereich', plan_xid) is None
+        assert registry.layer_by_display_name('Bereich 1', plan_xid) is vl
+
+    @pytest.mark.parametrize("vl", ['BP_Bereich'], indirect=True)
+    def test_get_layer_by_display_name_renamed_after_remove(self, registry, vl):
+        registry.addLayer(vl)
+        registry.removeLayer(vl.id())
+
+        vl.setName('Bereich 1')
+
+        assert registry.layer_by_display_name('Bereich 1', plan_xid) is None
+
+    def test_get_layer_by_display_name_duplicate(self, registry, vl1, vl2):
+        registry.addLayer(vl1)
+        registry.addLayer(vl2)
+
+        assert registry.layer_by_display_name('Scratch  layer', plan_xid) is vl1
+        registry.removeLayer(vl1.id())
+        assert registry.layer_by_display_name('Scratch  layer', plan_xid) is vl2
+        assert registry.layer_by_display_name('Scratch  layer', 'other') is None
+
     def test_add_canvas_item(self, mocker, registry):
         canvas_item_mock = mocker.patch("SAGisXPlanung.core.buildingtemplate.template_item.BuildingTemplateItem").return_value
 
@@ -179,8 +270,8 @@ class TestMapLayerRegistry:
 
     def test_on_layer_visibility_changed(self, registry):
         mock_layer = MagicMock()
-        mock_layer.customPropertyKeys.return_value = ['xplanung/feat-1']
-        mock_layer.customProperty.return_value = 'feat1'
+        mock_layer.id.return_value = 'layer1'
+        registry.registerFeature(mock_layer, 1, 'feat1')
         mock_node = MagicMock()
         mock_node.layer.return_value = mock_layer
         mock_canvas_item = MagicMock()
@@ -196,8 +287,8 @@ class TestMapLayerRegistry:
 
     def test_on_group_node_visibility_changed(self, registry):
         mock_layer = MagicMock()
-        mock_layer.customPropertyKeys.return_value = ['xplanung/feat-1']
-        mock_layer.customProperty.return_value = 'feat1'
+        mock_layer.id.return_value = 'layer1'
+        registry.registerFeature(mock_layer, 1, 'feat1')
         mock_node = MagicMock()
         mock_node.layer.return_value = mock_layer
         mock_group = MagicMock(spec=QgsLayerTreeGroup)
@@ -45,7 +45,7 @@ def registry() -> MapLayerRegistry:
 def clear_registry_after_test(registry):
     yield
 
-    registry._layers = []
+    registry.clear()
     QgsProject().instance().removeAllMapLayers()
 
 
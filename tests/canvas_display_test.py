@@ -0,0 +1,174 @@
+import uuid
+
+import pytest
+from geoalchemy2 import WKTElement
+from qgis.core import QgsProject, QgsVectorDataProvider
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan, BP_Bereich
+from SAGisXPlanung.BPlan.BP_Bebauung.feature_types import BP_BauGrenze
+from SAGisXPlanung.BPlan.BP_Gemeinbedarf_Spiel_und_Sportanlagen.feature_types import BP_GemeinbedarfsFlaeche
+from SAGisXPlanung.MapLayerRegistry import MapLayerRegistry
+from SAGisXPlanung.XPlan.XP_Praesentationsobjekte.feature_types import XP_PTO
+from SAGisXPlanung.core.canvas_display import batch_canvas_features, CanvasFeatureBatch, CanvasLoader, \
+    canvas_contents, load_on_canvas, _running_tasks, _cancelled_tasks
+
+plan_xid = 'c52aeb9d-34e2-4eca-b56b-e3f3752c94dd'
+
+
+def gemeinbedarf(i: int) -> BP_GemeinbedarfsFlaeche:
+    obj = BP_GemeinbedarfsFlaeche()
+    obj.id = uuid.uuid4()
+    obj.position = WKTElement(f'MULTIPOLYGON ((({i} 0, {i} 1, {i + 1} 1, {i + 1} 0, {i} 0)))', srid=25833)
+    return obj
+
+
+@pytest.fixture(scope="session")
+def registry() -> MapLayerRegistry:
+    return MapLayerRegistry()
+
+
+@pytest.fixture(autouse=True)
+def clear_registry_after_test(registry):
+    yield
+
+    registry.clear()
+    QgsProject().instance().removeAllMapLayers()
+
+
+class TestCanvasFeatureBatch:
+
+    def test_features_added_once_per_layer(self, mocker, registry):
+        add_features = mocker.spy(QgsVectorDataProvider, 'addFeatures')
+        group = QgsProject.instance().layerTreeRoot().addGroup('TestGroup')
+        objects = [gemeinbedarf(i) for i in range(20)]
+
+        with batch_canvas_features():
+            for obj in objects:
+                obj.toCanvas(group, plan_xid=plan_xid)
+
+            assert CanvasFeatureBatch.active is not None
+            add_features.assert_not_called()
+
+        assert CanvasFeatureBatch.active is None
+        add_features.assert_called_once()
+        assert len(group.findLayers()) == 1
+
+        layer = registry.layerByFeature(str(objects[0].id))
+        assert layer.featureCount() == 20
+        assert all(registry.layerByFeature(str(obj.id)) is layer for obj in objects)
+
+    def test_flush_on_error(self, registry):
+        obj = gemeinbedarf(0)
+
+        with pytest.raises(ValueError):
+            with batch_canvas_features():
+                obj.toCanvas(None, plan_xid=plan_xid)
+                raise ValueError()
+
+        assert registry.featureIsShown(str(obj.id))
+
+
+class TestCanvasLoader:
+
+    def test_plan_strategy(self):
+        eager, children = CanvasLoader.canvas_strategy(BP_Plan)
+
+        assert set(children) == {'bereich', 'externeReferenz'}
+        assert 'verfahrensMerkmale' not in eager
+        assert 'gemeinde' in eager
+
+    def test_bereich_strategy(self):
+        eager, children = CanvasLoader.canvas_strategy(BP_Bereich)
+
+        assert set(children) == {'planinhalt', 'praesentationsobjekt', 'simple_geometry', 'refScan'}
+
+    def test_objekt_strategy(self):
+        eager, children = CanvasLoader.canvas_strategy(BP_GemeinbedarfsFlaeche)
+
+        assert children == ('wirdDargestelltDurch',)
+        # data types of plan contents are displayed as attributes
+        assert 'hoehenangabe' in eager
+
+    @pytest.mark.parametrize('object_count', [4, 40])
+    def test_query_count_independent_of_objects(self, mocker, object_count):
+        plan = BP_Plan(id=uuid.uuid4(), name='test')
+        bereich = BP_Bereich(id=uuid.uuid4(), nummer=0)
+        plan.bereich.append(bereich)
+        for i in range(object_count):
+            obj = gemeinbedarf(i) if i % 2 else BP_BauGrenze(id=uuid.uuid4())
+            obj.wirdDargestelltDurch.append(XP_PTO(id=uuid.uuid4()))
+            bereich.planinhalt.append(obj)
+        for obj in [plan, bereich, *bereich.planinhalt, *(po for o in bereich.planinhalt for po in o.wirdDargestelltDurch)]:
+            make_transient_to_detached(obj)
+        session = mocker.MagicMock()
+        session.get.return_value = plan
+
+        loaded = CanvasLoader(session).load(plan.id)
+
+        assert loaded is plan
+        queried_classes = [c.args[0] for c in session.query.call_args_list]
+        assert sorted(queried_classes, key=lambda c: c.__name__) == [BP_BauGrenze, BP_Bereich, BP_GemeinbedarfsFlaeche,
+                                                                   BP_Plan, XP_PTO]
+
+
+class TestCanvasContents:
+
+    def test_display_order(self):
+        plan = BP_Plan(id=uuid.uuid4(), name='test')
+        bereich = BP_Bereich(id=uuid.uuid4(), nummer=0)
+        plan.bereich.append(bereich)
+        objects = [gemeinbedarf(i) for i in range(3)]
+        bereich.planinhalt.extend(objects)
+        bound_po = XP_PTO(id=uuid.uuid4(), dientZurDarstellungVon_id=objects[0].id)
+        free_po = XP_PTO(id=uuid.uuid4())
+        bereich.praesentationsobjekt.extend([bound_po, free_po])
+
+        contents = list(canvas_contents(plan))
+
+        assert contents[0] is plan
+        assert contents[1:4] == objects
+        # annotations of plan contents are displayed by `XP_Objekt.toCanvas`
+        assert bound_po not in contents
+        assert free_po in contents
+        # bereich without geltungsbereich is not displayed
+        assert bereich not in contents
+
+
+class TestLoadOnCanvas:
+
+    @pytest.fixture()
+    def task_manager(self, mocker):
+        mocker.patch('SAGisXPlanung.core.canvas_display.iface')
+        application = mocker.patch('SAGisXPlanung.core.canvas_display.QgsApplication')
+        yield application.taskManager.return_value
+
+        _running_tasks.clear()
+        _cancelled_tasks.clear()
+
+    def test_task_referenced_until_finished(self, task_manager):
+        task = load_on_canvas(plan_xid)
+
+        task_manager.addTask.assert_called_once_with(task)
+        assert _running_tasks[plan_xid] is task
+
+        task.finished(True)
+        assert plan_xid not in _running_tasks
+
+    def test_reload_while_loading(self, task_manager):
+        first_task = load_on_canvas(plan_xid)
+        second_task = load_on_canvas(plan_xid)
+
+        assert first_task.isCanceled()
+        assert _running_tasks[plan_xid] is second_task
+        assert first_task in _cancelled_tasks
+
+        # the cancelled task finishes while the reload is still running
+        first_task.finished(False)
+
+        assert _running_tasks[plan_xid] is second_task
+        assert first_task not in _cancelled_tasks
+
+        second_task.finished(True)
+        assert plan_xid not in _running_tasks
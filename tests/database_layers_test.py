@@ -0,0 +1,100 @@
+import uuid
+
+import pytest
+from qgis.core import QgsVectorLayer, QgsProject, QgsWkbTypes, QgsFeature
+
+from SAGisXPlanung.BPlan.BP_Bebauung.feature_types import BP_BauGrenze
+from SAGisXPlanung.BPlan.BP_Gemeinbedarf_Spiel_und_Sportanlagen.feature_types import BP_GemeinbedarfsFlaeche
+from SAGisXPlanung.BPlan.BP_Ver_und_Entsorgung.feature_types import BP_VerEntsorgung
+from SAGisXPlanung.MapLayerRegistry import MapLayerRegistry, XID_FIELD
+from SAGisXPlanung.core.database_layers import layer_query, layer_field_names, is_database_layer
+from SAGisXPlanung.core.helper.layer import add_xid_field
+
+plan_xid = 'c52aeb9d-34e2-4eca-b56b-e3f3752c94dd'
+
+
+class TestDatabaseLayers_layerQuery:
+
+    def test_query(self):
+        query = layer_query(BP_GemeinbedarfsFlaeche, plan_xid)
+
+        assert f"'{plan_xid}'::uuid" in query
+        assert XID_FIELD in query
+        assert 'ST_AsEWKB' not in query
+        assert 'ST_Dimension' not in query
+        assert '\n' not in query
+        assert all(name in query for name in layer_field_names(BP_GemeinbedarfsFlaeche))
+
+    def test_boolean_as_text(self):
+        query = layer_query(BP_GemeinbedarfsFlaeche, plan_xid)
+
+        assert "'True'" in query and "'False'" in query
+
+    def test_geometry_dimension(self):
+        query = layer_query(BP_VerEntsorgung, plan_xid, QgsWkbTypes.LineGeometry)
+
+        assert 'ST_Dimension' in query
+
+    def test_line_class(self):
+        query = layer_query(BP_BauGrenze, plan_xid)
+
+        assert f"'{plan_xid}'::uuid" in query
+
+    def test_invalid_plan_id(self):
+        with pytest.raises(ValueError):
+            layer_query(BP_GemeinbedarfsFlaeche, "'; DROP TABLE xp_plan; --")
+
+
+class TestDatabaseLayers_registry:
+
+    @pytest.fixture()
+    def registry(self) -> MapLayerRegistry:
+        reg = MapLayerRegistry()
+        yield reg
+
+        reg.clear()
+        QgsProject().instance().removeAllMapLayers()
+
+    @pytest.fixture()
+    def layer(self) -> QgsVectorLayer:
+        layer = QgsVectorLayer('polygon?crs=epsg:25833', 'BP_GemeinbedarfsFlaeche', 'memory')
+        layer.setCustomProperty('xplanung/type', 'BP_GemeinbedarfsFlaeche')
+        layer.setCustomProperty('xplanung/plan-xid', plan_xid)
+        add_xid_field(layer)
+        return layer
+
+    def test_memory_layer(self, layer):
+        assert not is_database_layer(layer)
+
+    def test_unresolved_feature(self, registry, layer):
+        xid = str(uuid.uuid4())
+        registry.addLayer(layer, add_to_legend=False)
+        registry.registerFeature(layer, None, xid)
+
+        assert registry.featureIsShown(xid)
+        assert registry.layerByFeature(xid) is layer
+        # no feature with the xid attribute yet
+        assert registry.featureId(xid) is None
+
+    def test_resolve_feature(self, registry, layer):
+        xid = str(uuid.uuid4())
+        feat = QgsFeature(layer.fields())
+        feat[XID_FIELD] = xid
+        layer.dataProvider().addFeatures([feat])
+        registry.addLayer(layer, add_to_legend=False)
+        registry.unregisterFeatures(layer)
+        registry.registerFeature(layer, None, xid)
+
+        feat_id = registry.featureId(xid)
+
+        assert feat_id is not None
+        assert registry.featureXid(layer, feat_id) == xid
+
+    def test_unregister_unresolved(self, registry, layer):
+        xid = str(uuid.uuid4())
+        registry.addLayer(layer, add_to_legend=False)
+        registry.registerFeature(layer, None, xid)
+
+        registry.unregisterFeatures(layer)
+
+        assert not registry.featureIsShown(xid)
@@ -0,0 +1,95 @@
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import make_transient_to_detached, Session as OrmSession
+
+from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan, BP_Bereich
+from SAGisXPlanung.BPlan.BP_Bebauung.feature_types import BP_BaugebietsTeilFlaeche, BP_BauGrenze
+from SAGisXPlanung.XPlan.feature_types import XP_Objekt
+from SAGisXPlanung.core.export_loader import ExportLoader, count_queries
+
+
+def detached_plan(object_count: int) -> BP_Plan:
+    """ Erzeugt einen Plan mit einem Bereich und `object_count` Planinhalten, die wie aus der Datenbank geladen sind """
+    plan = BP_Plan(id=uuid.uuid4(), name='test')
+    bereich = BP_Bereich(id=uuid.uuid4(), nummer=0)
+    plan.bereich.append(bereich)
+    for i in range(object_count):
+        cls = BP_BaugebietsTeilFlaeche if i % 2 else BP_BauGrenze
+        bereich.planinhalt.append(cls(id=uuid.uuid4()))
+
+    for obj in [plan, bereich, *bereich.planinhalt]:
+        make_transient_to_detached(obj)
+    return plan
+
+
+class TestExportLoader_loaderStrategy:
+
+    def test_plan(self):
+        eager, children = ExportLoader.loader_strategy(BP_Plan)
+
+        assert 'bereich' in children
+        assert 'gemeinde' in eager and 'gemeinde' not in children
+        assert 'plangeber' in eager and 'plangeber' not in children
+
+    def test_bereich(self):
+        eager, children = ExportLoader.loader_strategy(BP_Bereich)
+
+        assert 'planinhalt' in children
+        assert 'praesentationsobjekt' in children
+        assert 'gehoertZuPlan' not in eager
+
+    def test_objekt(self):
+        eager, children = ExportLoader.loader_strategy(XP_Objekt)
+
+        assert 'wirdDargestelltDurch' in children
+        assert 'gehoertZuBereich' not in eager
+
+
+class TestExportLoader_load:
+
+    @pytest.mark.parametrize('object_count', [4, 40, 400])
+    def test_query_count_independent_of_objects(self, mocker, object_count):
+        plan = detached_plan(object_count)
+        session = mocker.MagicMock()
+        session.get.return_value = plan
+
+        loaded = ExportLoader(session).load(plan.id)
+
+        assert loaded is plan
+        # one query for BP_Plan, BP_Bereich, BP_BaugebietsTeilFlaeche and BP_BauGrenze each
+        assert session.query.call_count == 4
+        queried_classes = {c.args[0] for c in session.query.call_args_list}
+        assert queried_classes == {BP_Plan, BP_Bereich, BP_BaugebietsTeilFlaeche, BP_BauGrenze}
+
+    def test_plan_not_found(self, mocker):
+        session = mocker.MagicMock()
+        session.get.return_value = None
+
+        assert ExportLoader(session).load(uuid.uuid4()) is None
+        session.query.assert_not_called()
+
+
+class TestExportLoader_countQueries:
+
+    def test_count_queries(self):
+        session = OrmSession(bind=create_engine('sqlite://'))
+
+        with count_queries(session) as counter:
+            session.execute(text('SELECT 1'))
+            session.execute(text('SELECT 2'))
+        session.execute(text('SELECT 3'))
+
+        assert counter[0] == 2
+
+    def test_other_session_not_counted(self):
+        engine = create_engine('sqlite://')
+        session = OrmSession(bind=engine)
+        other_session = OrmSession(bind=engine)
+
+        with count_queries(session) as counter:
+            session.execute(text('SELECT 1'))
+            other_session.execute(text('SELECT 2'))
+
+        assert counter[0] == 1
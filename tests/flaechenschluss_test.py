@@ -0,0 +1,115 @@
+import uuid
+
+import pytest
+from geoalchemy2 import WKTElement
+
+from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan, BP_Bereich
+from SAGisXPlanung.BPlan.BP_Sonstiges.feature_types import BP_FlaecheOhneFestsetzung
+from SAGisXPlanung.FPlan.FP_Basisobjekte.feature_types import FP_Plan
+from SAGisXPlanung.core.flaechenschluss import uncovered_areas_statement, uncovered_areas, FLAECHENSCHLUSS_TABLES
+
+
+class TestFlaechenschluss_uncoveredAreasStatement:
+
+    @pytest.mark.parametrize('plan_class, prefix', [(BP_Plan, 'bp'), (FP_Plan, 'fp')])
+    def test_statement(self, plan_class, prefix):
+        stmt = str(uncovered_areas_statement(plan_class))
+
+        assert f'{prefix}_bereich' in stmt
+        assert all(table in stmt for table in FLAECHENSCHLUSS_TABLES)
+        assert 'ST_UnaryUnion(ST_Collect(' in stmt
+        assert 'ST_Snap' in stmt
+        assert all(f':{param}' in stmt for param in ['plan_id', 'exclude_types', 'tolerance'])
+
+    def test_parameters(self, mocker):
+        session = mocker.MagicMock()
+        session.execute.return_value = []
+        plan_id = uuid.uuid4()
+
+        uncovered_areas(session, BP_Plan, plan_id, exclude_types=('bp_flaeche_ohne_festsetzung',), tolerance=0.1)
+
+        stmt, params = session.execute.call_args.args
+        assert params == {'plan_id': plan_id, 'exclude_types': ['bp_flaeche_ohne_festsetzung'], 'tolerance': 0.1}
+        assert str(plan_id) not in str(stmt)
+
+    def test_empty_areas_skipped(self, mocker):
+        bereich_ids = [uuid.uuid4(), uuid.uuid4()]
+        session = mocker.MagicMock()
+        session.execute.return_value = [
+            mocker.Mock(bereich_id=bereich_ids[0], geom='geom', is_empty=False),
+            mocker.Mock(bereich_id=bereich_ids[1], geom='empty', is_empty=True)
+        ]
+
+        assert uncovered_areas(session, BP_Plan, uuid.uuid4()) == {bereich_ids[0]: 'geom'}
+
+
+class TestBP_Plan_enforceFlaechenschluss:
+
+    @pytest.fixture()
+    def plan(self) -> BP_Plan:
+        plan = BP_Plan(id=uuid.uuid4())
+        plan.bereich.append(BP_Bereich(id=uuid.uuid4()))
+        plan.bereich.append(BP_Bereich(id=uuid.uuid4()))
+        return plan
+
+    @pytest.fixture()
+    def session(self, mocker):
+        session = mocker.MagicMock()
+        mocker.patch('SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types.object_session', return_value=session)
+        return session
+
+    def test_new_area(self, mocker, plan, session):
+        geom = WKTElement('MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)))', srid=25833)
+        areas = mocker.patch('SAGisXPlanung.core.flaechenschluss.uncovered_areas',
+                             return_value={plan.bereich[0].id: geom})
+        session.query.return_value.filter.return_value = []
+
+        items, deleted = plan.enforceFlaechenschluss()
+
+        assert areas.call_args.kwargs['exclude_types'] == ['bp_flaeche_ohne_festsetzung']
+        fl = session.add.call_args.args[0]
+        assert isinstance(fl, BP_FlaecheOhneFestsetzung)
+        assert fl.gehoertZuBereich_id == plan.bereich[0].id
+        assert fl.position is geom
+        assert fl.flaechenschluss
+        assert [(item.xid, item.parent_xid) for item in items] == [(str(fl.id), str(plan.bereich[0].id))]
+        assert deleted == []
+
+    def test_existing_area(self, mocker, plan, session):
+        geom = WKTElement('MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)))', srid=25833)
+        mocker.patch('SAGisXPlanung.core.flaechenschluss.uncovered_areas', return_value={plan.bereich[1].id: geom})
+        existing = BP_FlaecheOhneFestsetzung(id=uuid.uuid4(), gehoertZuBereich_id=plan.bereich[1].id)
+        session.query.return_value.filter.return_value = [existing]
+
+        items, deleted = plan.enforceFlaechenschluss()
+
+        session.add.assert_not_called()
+        session.delete.assert_not_called()
+        assert existing.position is geom
+        assert [item.xid for item in items] == [str(existing.id)]
+        assert deleted == []
+
+    def test_covered_bereich(self, mocker, plan, session):
+        mocker.patch('SAGisXPlanung.core.flaechenschluss.uncovered_areas', return_value={})
+        existing = BP_FlaecheOhneFestsetzung(id=uuid.uuid4(), gehoertZuBereich_id=plan.bereich[0].id)
+        session.query.return_value.filter.return_value = [existing]
+
+        items, deleted = plan.enforceFlaechenschluss()
+
+        session.delete.assert_called_once_with(existing)
+        assert items == []
+        assert [(item.xid, item.parent_xid) for item in deleted] == [(str(existing.id), str(plan.bereich[0].id))]
+
+    def test_duplicate_areas(self, mocker, plan, session):
+        geom = WKTElement('MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)))', srid=25833)
+        mocker.patch('SAGisXPlanung.core.flaechenschluss.uncovered_areas', return_value={plan.bereich[0].id: geom})
+        existing = [BP_FlaecheOhneFestsetzung(id=uuid.uuid4(), gehoertZuBereich_id=plan.bereich[0].id)
+                    for _ in range(2)]
+        session.query.return_value.filter.return_value = existing
+
+        items, deleted = plan.enforceFlaechenschluss()
+
+        assert existing[0].position is geom
+        session.delete.assert_called_once_with(existing[1])
+        assert [item.xid for item in items] == [str(existing[0].id)]
+        assert [item.xid for item in deleted] == [str(existing[1].id)]
@@ -1,7 +1,25 @@
+import uuid
+
+import pytest
 from qgis.core import QgsGeometry, QgsWkbTypes
 
-from SAGisXPlanung.GML.geometry import enforce_wkb_constraints, geometry_from_spatial_element, geom_type_as_layer_url
+from SAGisXPlanung.GML.geometry import enforce_wkb_constraints, ewkb_to_wkb, geometry_from_spatial_element, \
+    geom_type_as_layer_url, correct_geometry_locally, correct_geometries, encode_geometries, EncodedGeometry
+from SAGisXPlanung.config import GeometryCorrectionMethod, GeometryValidationConfig
 from geoalchemy2 import WKBElement, WKTElement
+from geoalchemy2.shape import to_shape
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session as OrmSession
+
+from SAGisXPlanung.BPlan.BP_Bebauung.feature_types import BP_BaugebietsTeilFlaeche
+from SAGisXPlanung.XPlan.feature_types import correct_geometries_before_flush, correct_geometry_trigger, \
+    CORRECTED_GEOMETRIES_KEY
+
+
+def objekt() -> BP_BaugebietsTeilFlaeche:
+    obj = BP_BaugebietsTeilFlaeche(id=uuid.uuid4())
+    obj.position = WKTElement('MULTIPOLYGON (((0 0, 0 1, 1 1, 1 0, 0 0)))', srid=25833)
+    return obj
 
 
 class TestGeometry_enforce_wkb_constraints:
@@ -19,6 +37,27 @@ class TestGeometry_enforce_wkb_constraints:
         assert enforce_wkb_constraints(wkb) == wkb
 
 
+class TestGeometry_ewkb_to_wkb:
+
+    @pytest.mark.parametrize('ewkb,wkb', [
+        # little endian EWKB with SRID 4326
+        ('0103000020E6100000010000000500000000000000000000000000000000000000000000000000F03F0000000000000000000000000000F03F000000000000F03F0000000000000000000000000000F03F00000000000000000000000000000000',
+         '0103000000010000000500000000000000000000000000000000000000000000000000F03F0000000000000000000000000000F03F000000000000F03F0000000000000000000000000000F03F00000000000000000000000000000000'),
+        # big endian EWKB point with SRID 25833
+        ('002000000100006469' + '3FF0000000000000' + '4000000000000000',
+         '0000000001' + '3FF0000000000000' + '4000000000000000'),
+        # plain WKB stays untouched
+        ('0101000000000000000000F03F000000000000F03F', '0101000000000000000000F03F000000000000F03F'),
+    ])
+    def test_ewkb_to_wkb(self, ewkb, wkb):
+        assert ewkb_to_wkb(bytes.fromhex(ewkb)) == bytes.fromhex(wkb)
+
+    def test_matches_hex_variant(self):
+        ewkb = '0103000020E6100000010000000500000000000000000000000000000000000000000000000000F03F0000000000000000000000000000F03F000000000000F03F0000000000000000000000000000F03F00000000000000000000000000000000'
+
+        assert ewkb_to_wkb(memoryview(bytes.fromhex(ewkb))).hex().upper() == enforce_wkb_constraints(ewkb)
+
+
 class TestGeometry_geometry_from_spatial_element:
 
     def test_enforce_wkb_constraints_using_wkt_element(self):
@@ -43,3 +82,121 @@ class TestGeometry_geom_type_as_layer_url:
         assert geom_type_as_layer_url(QgsWkbTypes.PointGeometry).lower() == 'point'
         assert geom_type_as_layer_url(QgsWkbTypes.LineGeometry).lower() == 'linestring'
         assert geom_type_as_layer_url(QgsWkbTypes.PolygonGeometry).lower() == 'polygon'
+
+
+class TestGeometry_correct_geometry_locally:
+
+    def test_correct_polygon(self):
+        # clockwise exterior ring with repeated vertex
+        wkt_element = WKTElement('POLYGON ((0 0, 0 1, 1 1, 1 1, 1 0, 0 0))', srid=25833)
+
+        corrected = correct_geometry_locally(wkt_element, GeometryCorrectionMethod.PreserveTopology)
+
+        assert isinstance(corrected, WKBElement)
+        assert corrected.srid == 25833
+        shape = to_shape(corrected)
+        assert len(shape.exterior.coords) == 5
+        assert shape.exterior.is_ccw
+
+    def test_ignore_non_polygon(self):
+        wkt_element = WKTElement('LINESTRING (0 0, 1 1, 1 1)', srid=25833)
+        assert correct_geometry_locally(wkt_element, GeometryCorrectionMethod.RigorousRemoval) is None
+
+
+class TestGeometry_correct_geometries:
+
+    def test_correct_geometries_locally(self, mocker):
+        mocker.patch('SAGisXPlanung.GML.geometry.QgsConfig.geometry_validation_config', return_value=
+                     GeometryValidationConfig(correct_geometries=True,
+                                              correct_method=GeometryCorrectionMethod.PreserveTopology,
+                                              correct_locally=True))
+        connection = mocker.MagicMock()
+        polygon = WKTElement('POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))', srid=25833)
+        point = WKTElement('POINT (1 1)', srid=25833)
+
+        corrected = correct_geometries(connection, [(geometry_from_spatial_element(polygon), polygon),
+                                                    (geometry_from_spatial_element(point), point)])
+
+        connection.execute.assert_not_called()
+        assert isinstance(corrected[0], WKBElement)
+        assert corrected[1] is None
+
+    def test_correct_geometries_in_database(self, mocker):
+        mocker.patch('SAGisXPlanung.GML.geometry.QgsConfig.geometry_validation_config', return_value=
+                     GeometryValidationConfig(correct_geometries=True,
+                                              correct_method=GeometryCorrectionMethod.PreserveTopology))
+        corrected_polygon = mocker.MagicMock()
+        connection = mocker.MagicMock()
+        connection.execute.return_value = [(corrected_polygon, 1)]
+        elements = [WKTElement('POINT (1 1)', srid=25833), WKTElement('POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))', srid=25833)]
+
+        corrected = correct_geometries(connection, [(geometry_from_spatial_element(e), e) for e in elements])
+
+        connection.execute.assert_called_once()
+        assert corrected == [None, corrected_polygon]
+
+
+class TestGeometry_correctGeometriesBeforeFlush:
+
+    @pytest.fixture()
+    def session(self, mocker):
+        mocker.patch('SAGisXPlanung.XPlan.feature_types.correct_geometries', side_effect=lambda c, g: [None] * len(g))
+        session = OrmSession(bind=create_engine('sqlite://'))
+        yield session
+        session.close()
+
+    def test_corrected_objects_skipped(self, mocker, session):
+        correct_geometry = mocker.patch('SAGisXPlanung.XPlan.feature_types.correct_geometry', return_value=None)
+        corrected, joined = objekt(), objekt()
+        session.add(corrected)
+
+        correct_geometries_before_flush(session, None, None)
+        correct_geometry_trigger(None, session.connection(), corrected)
+        session.add(joined)
+        correct_geometry_trigger(None, session.connection(), joined)
+
+        correct_geometry.assert_called_once()
+        assert correct_geometry.call_args.args[2] is joined.position
+
+    def test_reset_after_rollback(self, session):
+        obj = objekt()
+        session.add(obj)
+
+        correct_geometries_before_flush(session, None, None)
+        assert obj in session.info[CORRECTED_GEOMETRIES_KEY]
+
+        # a failed flush doesn't reach after_flush_postexec
+        session.rollback()
+        assert CORRECTED_GEOMETRIES_KEY not in session.info
+
+
+class TestGeometry_encode_geometries:
+
+    def test_encode_geometries(self, mocker):
+        from sqlalchemy.dialects import postgresql
+        from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan, BP_Bereich
+
+        plan = BP_Plan()
+        plan.id = uuid.uuid4()
+        bereiche = [BP_Bereich(id=uuid.uuid4()) for _ in range(2)]
+        row = mocker.MagicMock(id=plan.id, attr='raeumlicherGeltungsbereich', gml='<gml:Polygon/>',
+                               xmin=0, xmax=1, ymin=2, ymax=3)
+        connection = mocker.MagicMock()
+        connection.execute.return_value = [row]
+
+        result = encode_geometries(connection, [(plan, 'raeumlicherGeltungsbereich')] +
+                                   [(b, 'geltungsbereich') for b in bereiche])
+
+        # one set based statement for all objects, selecting from the tables holding the geometry columns
+        connection.execute.assert_called_once()
+        sql = str(connection.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert sql.count('ST_AsGML') == 2
+        assert 'FROM xp_plan' in sql and 'FROM xp_bereich' in sql
+        assert 'bp_plan' not in sql
+        assert result == {(str(plan.id), 'raeumlicherGeltungsbereich'): EncodedGeometry('<gml:Polygon/>', (0, 1, 2, 3))}
+
+    def test_encode_no_objects(self, mocker):
+        connection = mocker.MagicMock()
+
+        assert encode_geometries(connection, []) == {}
+        connection.execute.assert_not_called()
@@ -0,0 +1,44 @@
+import pytest
+from qgis.core import QgsVectorLayer, QgsFeature
+
+from SAGisXPlanung.MapLayerRegistry import XID_FIELD
+from SAGisXPlanung.core.helper.layer import add_xid_field, migrate_feature_properties
+
+feat_xid = 'd52aeb9d-34e2-4eca-b56b-e3f3752c94dd'
+
+
+@pytest.fixture()
+def legacy_layer() -> QgsVectorLayer:
+    layer = QgsVectorLayer('polygon?crs=epsg:25833', 'BP_BaugebietsTeilFlaeche', 'memory')
+    layer.dataProvider().addFeatures([QgsFeature(layer.fields())])
+    layer.setCustomProperty('xplanung/type', 'BP_BaugebietsTeilFlaeche')
+    layer.setCustomProperty('xplanung/feat-1', feat_xid)
+    return layer
+
+
+class TestLayerHelper_addXidField:
+
+    def test_hidden_field(self):
+        layer = QgsVectorLayer('polygon?crs=epsg:25833', 'test', 'memory')
+
+        field_index = add_xid_field(layer)
+
+        assert layer.fields().indexOf(XID_FIELD) == field_index
+        assert layer.editorWidgetSetup(field_index).type() == 'Hidden'
+        assert next(c for c in layer.attributeTableConfig().columns() if c.name == XID_FIELD).hidden
+
+
+class TestLayerHelper_migrateFeatureProperties:
+
+    def test_migrate(self, legacy_layer):
+        migrate_feature_properties(legacy_layer)
+
+        assert next(legacy_layer.getFeatures())[XID_FIELD] == feat_xid
+        assert legacy_layer.customPropertyKeys() == ['xplanung/type']
+
+    def test_migrate_twice(self, legacy_layer):
+        migrate_feature_properties(legacy_layer)
+        migrate_feature_properties(legacy_layer)
+
+        assert legacy_layer.fields().count() == 1
+        assert next(legacy_layer.getFeatures())[XID_FIELD] == feat_xid
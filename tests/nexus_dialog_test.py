@@ -0,0 +1,141 @@
+import uuid
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan
+from SAGisXPlanung.FPlan.FP_Basisobjekte.feature_types import FP_Plan
+from SAGisXPlanung.gui.nexus_dialog import PlanFilter, PageCursor, page_statement, plan_count, clear_plan_counts, \
+    fetch_page
+from SAGisXPlanung.utils import PLAN_BASE_TYPES
+
+
+def compile_statement(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+class TestNexusDialog_pageStatement:
+
+    def test_first_page(self):
+        sql = compile_statement(page_statement(PlanFilter(tuple(PLAN_BASE_TYPES)), 'name', 'asc', 10))
+
+        assert 'OFFSET' not in sql
+        assert 'LIMIT' in sql
+        assert 'ORDER BY' in sql
+
+    def test_seek(self):
+        cursor = PageCursor('Plan', uuid.uuid4())
+
+        stmt = page_statement(PlanFilter(tuple(PLAN_BASE_TYPES)), 'name', 'asc', 10, after=cursor)
+        sql = compile_statement(stmt)
+
+        assert 'OFFSET' not in sql
+        assert 'xp_plan.name > ' in sql
+        assert 'xp_plan.id > ' in sql
+        assert cursor.value in stmt.compile().params.values()
+
+    def test_seek_descending(self):
+        sql = compile_statement(page_statement(PlanFilter(tuple(PLAN_BASE_TYPES)), 'name', 'desc', 10,
+                                               after=PageCursor('Plan', uuid.uuid4())))
+
+        assert 'xp_plan.name < ' in sql
+        assert 'DESC' in sql
+
+    def test_seek_null_value(self):
+        sql = compile_statement(page_statement(PlanFilter(tuple(PLAN_BASE_TYPES)), 'name', 'asc', 10,
+                                               after=PageCursor(None, uuid.uuid4())))
+
+        assert 'xp_plan.name IS NULL' in sql
+        assert 'xp_plan.name >' not in sql
+
+    def test_filter(self):
+        sql = compile_statement(page_statement(PlanFilter((BP_Plan,), 'test'), 'name', 'asc', 10))
+
+        assert 'xp_plan.type = ' in sql
+        assert 'to_tsquery' in sql
+
+
+class TestNexusDialog_planCount:
+
+    @pytest.fixture()
+    def session(self, mocker):
+        session = mocker.MagicMock()
+        session_factory = mocker.patch('SAGisXPlanung.gui.nexus_dialog.Session')
+        session_factory.begin.return_value.__enter__.return_value = session
+        session.execute.return_value.scalar_one.return_value = 42
+        yield session
+
+        clear_plan_counts()
+
+    def test_cached_per_filter(self, session):
+        assert plan_count(PlanFilter((BP_Plan,))) == 42
+        assert plan_count(PlanFilter((BP_Plan,))) == 42
+        assert session.execute.call_count == 1
+
+        plan_count(PlanFilter((BP_Plan,), 'test'))
+        assert session.execute.call_count == 2
+
+    def test_invalidated(self, session):
+        plan_count(PlanFilter((BP_Plan,)))
+
+        clear_plan_counts()
+        plan_count(PlanFilter((BP_Plan,)))
+
+        assert session.execute.call_count == 2
+
+
+class TestNexusDialog_fetchPage:
+
+    @pytest.fixture()
+    def session(self, mocker):
+        session = mocker.MagicMock()
+        session_factory = mocker.patch('SAGisXPlanung.gui.nexus_dialog.Session')
+        session_factory.begin.return_value.__enter__.return_value = session
+        mocker.patch('SAGisXPlanung.gui.nexus_dialog.object_as_dict', side_effect=lambda o, **kwargs: {'id': o.id})
+        yield session
+
+    def test_sort_value_selected(self):
+        sql = compile_statement(page_statement(PlanFilter(tuple(PLAN_BASE_TYPES)), 'id', 'asc', 10))
+
+        assert 'bp_plan.id AS sort_value' in sql
+
+    def test_cursor_page_ends_on_other_plan_type(self, session):
+        # sorting by `id` uses `bp_plan.id`, which is NULL for the FP plan
+        bp_plan = BP_Plan(id=uuid.uuid4())
+        fp_plan = FP_Plan(id=uuid.uuid4())
+        session.execute.return_value.all.return_value = [(bp_plan, bp_plan.id), (fp_plan, None)]
+
+        data, cursor = fetch_page(PlanFilter(tuple(PLAN_BASE_TYPES)), 'id', 'asc', 2)
+
+        assert data == [{'id': bp_plan.id}, {'id': fp_plan.id}]
+        assert cursor == PageCursor(None, fp_plan.id)
+
+    def test_cursor_shared_column(self, session):
+        fp_plan = FP_Plan(id=uuid.uuid4(), name='FP')
+        session.execute.return_value.all.return_value = [(fp_plan, None)]
+
+        _, cursor = fetch_page(PlanFilter(tuple(PLAN_BASE_TYPES)), 'planArt', 'asc', 1)
+
+        assert cursor == PageCursor(None, fp_plan.id)
+
+    def test_cursor_sort_value(self, session):
+        bp_plan = BP_Plan(id=uuid.uuid4(), staedtebaulicherVertrag=True)
+        session.execute.return_value.all.return_value = [(bp_plan, True)]
+
+        _, cursor = fetch_page(PlanFilter((BP_Plan,)), 'staedtebaulicherVertrag', 'asc', 1)
+
+        assert cursor == PageCursor(True, bp_plan.id)
+
+    def test_next_page_after_other_plan_type(self):
+        cursor = PageCursor(None, uuid.uuid4())
+
+        sql = compile_statement(page_statement(PlanFilter(tuple(PLAN_BASE_TYPES)), 'id', 'asc', 10, after=cursor))
+
+        # only plans without sort value after the cursor, the previous rows are not repeated
+        assert 'bp_plan.id IS NULL AND xp_plan.id > ' in sql
+        assert 'bp_plan.id > ' not in sql
+
+    def test_empty_page(self, session):
+        session.execute.return_value.all.return_value = []
+
+        assert fetch_page(PlanFilter(tuple(PLAN_BASE_TYPES)), 'name', 'asc', 10) == ([], None)
@@ -0,0 +1,95 @@
+import os
+import threading
+import uuid
+
+import pytest
+
+from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan
+from SAGisXPlanung.processing import parallel_export
+from SAGisXPlanung.processing.parallel_export import export_plans, export_plan_file, PlanExportResult
+
+
+class TestParallelExport_exportPlanFile:
+
+    def test_export_gml(self, mocker, tmp_path):
+        plan = BP_Plan()
+        plan.id = uuid.uuid4()
+        plan.name = 'Plan "A"/1'
+        session_mock = mocker.MagicMock()
+        session_mock.get.return_value = plan
+        mocker.patch("SAGisXPlanung.Session.begin").return_value.__enter__.return_value = session_mock
+
+        def write(path):
+            with open(path, 'wb') as f:
+                f.write(b'<gml/>')
+
+        writer = mocker.patch("SAGisXPlanung.GML.GMLWriter.GMLStreamWriter")
+        writer.return_value.write.side_effect = write
+
+        result = export_plan_file(plan.id, str(tmp_path), 'gml')
+
+        assert result.error is None
+        assert result.file_path == os.path.join(str(tmp_path), "Plan 'A'-1.gml")
+        with open(result.file_path, 'rb') as f:
+            assert f.read() == b'<gml/>'
+        assert os.listdir(tmp_path) == ["Plan 'A'-1.gml"]
+
+    def test_export_error(self, mocker, tmp_path):
+        plan = BP_Plan()
+        plan.id = uuid.uuid4()
+        plan.name = 'test'
+        session_mock = mocker.MagicMock()
+        session_mock.get.return_value = plan
+        mocker.patch("SAGisXPlanung.Session.begin").return_value.__enter__.return_value = session_mock
+        writer = mocker.patch("SAGisXPlanung.GML.GMLWriter.GMLStreamWriter")
+        writer.return_value.writeArchive.side_effect = ValueError('Datei test.pdf konnte nicht gefunden werden')
+
+        result = export_plan_file(plan.id, str(tmp_path), 'zip')
+
+        assert result.error == 'Datei test.pdf konnte nicht gefunden werden'
+        assert result.file_path is None
+        assert not os.listdir(tmp_path)
+
+
+class TestParallelExport_exportPlans:
+
+    @pytest.mark.parametrize('workers', [1, 4])
+    def test_all_plans_exported(self, mocker, workers):
+        thread_names = set()
+
+        def export(plan_id, *args):
+            thread_names.add(threading.current_thread().name)
+            return PlanExportResult(plan_id=plan_id, plan_name=f'plan {plan_id}')
+
+        mocker.patch.object(parallel_export, 'export_plan_file', side_effect=export)
+        plan_ids = [str(i) for i in range(20)]
+
+        results = list(export_plans(plan_ids, 'out', 'gml', workers=workers))
+
+        assert sorted(r.plan_id for r in results) == sorted(plan_ids)
+        if workers > 1:
+            assert all(name.startswith('xplanung-export') for name in thread_names)
+        else:
+            assert thread_names == {threading.current_thread().name}
+
+    def test_close_cancels_pending(self, mocker):
+        started = []
+        release = threading.Event()
+
+        def export(plan_id, *args):
+            started.append(plan_id)
+            release.wait(timeout=5)
+            return PlanExportResult(plan_id=plan_id)
+
+        mocker.patch.object(parallel_export, 'export_plan_file', side_effect=export)
+
+        results = export_plans([str(i) for i in range(50)], 'out', workers=2)
+        release.set()
+        next(results)
+        results.close()
+
+        assert len(started) < 50
+
+    def test_processes_require_url(self):
+        with pytest.raises(ValueError):
+            next(export_plans(['1', '2'], 'out', workers=2, use_processes=True))
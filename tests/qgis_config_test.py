@@ -0,0 +1,55 @@
+import pytest
+from qgis.core import QgsFeatureRenderer, QgsSingleSymbolRenderer, QgsFillSymbol, QgsWkbTypes
+
+from SAGisXPlanung.config import QgsConfig
+
+
+class RendererTestClass:
+    pass
+
+
+@pytest.fixture()
+def renderer_key():
+    yield f'{QgsConfig.STYLES}/{RendererTestClass.__name__}'
+
+    QgsConfig.remove_section(f'{QgsConfig.STYLES}/{RendererTestClass.__name__}')
+
+
+def fill_renderer(color: str) -> QgsSingleSymbolRenderer:
+    return QgsSingleSymbolRenderer(QgsFillSymbol.createSimple({'color': color}))
+
+
+class TestQgsConfig_classRenderer:
+
+    def test_renderer_parsed_once(self, mocker, renderer_key):
+        QgsConfig.set_class_renderer(RendererTestClass, QgsWkbTypes.PolygonGeometry, fill_renderer('red'))
+        load = mocker.spy(QgsFeatureRenderer, 'load')
+
+        first = QgsConfig.class_renderer(RendererTestClass, QgsWkbTypes.PolygonGeometry)
+        second = QgsConfig.class_renderer(RendererTestClass, QgsWkbTypes.PolygonGeometry)
+
+        assert load.call_count == 1
+        # every caller gets its own renderer, layers take ownership of them
+        assert first is not second
+        assert first.symbol().color() == second.symbol().color()
+
+    def test_missing_renderer(self, renderer_key):
+        assert QgsConfig.class_renderer(RendererTestClass, QgsWkbTypes.LineGeometry) is None
+        assert QgsConfig.class_renderer(RendererTestClass, None) is None
+
+    def test_invalidated_by_set(self, renderer_key):
+        QgsConfig.set_class_renderer(RendererTestClass, QgsWkbTypes.PolygonGeometry, fill_renderer('red'))
+        QgsConfig.class_renderer(RendererTestClass, QgsWkbTypes.PolygonGeometry)
+
+        QgsConfig.set_class_renderer(RendererTestClass, QgsWkbTypes.PolygonGeometry, fill_renderer('blue'))
+        renderer = QgsConfig.class_renderer(RendererTestClass, QgsWkbTypes.PolygonGeometry)
+
+        assert renderer.symbol().color().name() == '#0000ff'
+
+    def test_invalidated_by_remove(self, renderer_key):
+        QgsConfig.set_class_renderer(RendererTestClass, QgsWkbTypes.PolygonGeometry, fill_renderer('red'))
+        QgsConfig.class_renderer(RendererTestClass, QgsWkbTypes.PolygonGeometry)
+
+        QgsConfig.remove_section(renderer_key)
+
+        assert QgsConfig.class_renderer(RendererTestClass, QgsWkbTypes.PolygonGeometry) is None
@@ -1,5 +1,10 @@
+import pytest
+
+from SAGisXPlanung import XPlanVersion
 from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan
 from SAGisXPlanung.BPlan.BP_Gemeinbedarf_Spiel_und_Sportanlagen.feature_types import BP_GemeinbedarfsFlaeche
+from SAGisXPlanung.core.mixins.mixins import ElementOrderMixin
+from SAGisXPlanung.utils import CLASSES
 
 class TestElementOrderMixin:
     def test_element_order_with_geom_exclude(self):
@@ -15,3 +20,27 @@ class TestElementOrderMixin:
         _class = BP_Plan()
         attribute_names = _class.element_order(include_base=False)
         assert 'uuid' not in attribute_names
+
+    @pytest.mark.parametrize('version', list(XPlanVersion))
+    @pytest.mark.parametrize('only_columns', [True, False])
+    @pytest.mark.parametrize('export', [True, False])
+    @pytest.mark.parametrize('include_base', [True, False])
+    def test_cached_matches_uncached(self, version, only_columns, export, include_base):
+        ElementOrderMixin.clear_element_order_cache()
+        kwargs = dict(include_base=include_base, only_columns=only_columns, export=export, version=version)
+
+        for cls in CLASSES.values():
+            if not issubclass(cls, ElementOrderMixin):
+                continue
+            for with_geometry in [True, False]:
+                uncached = cls._element_order(**kwargs, with_geometry=with_geometry, cached=False)
+
+                assert cls.element_order(**kwargs, with_geometry=with_geometry) == uncached
+                # second call is served from the cache
+                assert cls.element_order(**kwargs, with_geometry=with_geometry) == uncached
+
+    def test_cached_result_is_copy(self):
+        attribute_names = BP_Plan.element_order()
+        attribute_names.append('test')
+
+        assert 'test' not in BP_Plan.element_order()
@@ -0,0 +1,46 @@
+from SAGisXPlanung.XPlan.data_types import XP_Gemeinde, XP_Plangeber
+from SAGisXPlanung.utils import PreFilledObjectCache, query_existing
+
+
+def gemeinde(ags, name, ortsteil=None) -> XP_Gemeinde:
+    g = XP_Gemeinde()
+    g.ags = ags
+    g.gemeindeName = name
+    g.ortsteilName = ortsteil
+    return g
+
+
+class TestPreFilledObjectCache:
+
+    def test_lookup_loads_once_per_class(self, mocker):
+        existing = gemeinde('12345678', 'Berlin')
+        session_mock = mocker.MagicMock()
+        session_mock.query.return_value.all.return_value = [existing, gemeinde('87654321', 'Potsdam')]
+        mocker.patch("SAGisXPlanung.Session.begin").return_value.__enter__.return_value = session_mock
+
+        cache = PreFilledObjectCache()
+
+        assert query_existing(gemeinde('12345678', 'Berlin'), cache) is existing
+        assert query_existing(gemeinde('12345678', 'Berlin', 'Mitte'), cache) is None
+        assert session_mock.query.call_count == 1
+
+        plangeber = XP_Plangeber()
+        plangeber.name = 'Berlin'
+        session_mock.query.return_value.all.return_value = []
+        assert cache.get(plangeber) is None
+        assert session_mock.query.call_count == 2
+
+    def test_invalidate(self, mocker):
+        session_mock = mocker.MagicMock()
+        session_mock.query.return_value.all.return_value = []
+        mocker.patch("SAGisXPlanung.Session.begin").return_value.__enter__.return_value = session_mock
+
+        cache = PreFilledObjectCache()
+        assert cache.get(gemeinde('12345678', 'Berlin')) is None
+
+        existing = gemeinde('12345678', 'Berlin')
+        session_mock.query.return_value.all.return_value = [existing]
+        assert cache.get(gemeinde('12345678', 'Berlin')) is None
+
+        PreFilledObjectCache.invalidate()
+        assert cache.get(gemeinde('12345678', 'Berlin')) is existing
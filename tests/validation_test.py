@@ -0,0 +1,246 @@
+import numpy as np
+import pytest
+import shapely
+
+from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan, BP_Bereich
+from SAGisXPlanung.BPlan.BP_Bebauung.feature_types import BP_BaugebietsTeilFlaeche
+from SAGisXPlanung.core.validation import GeometryValidationEngine, ValidationFeature, GeometryIntersectionType, \
+    duplicate_vertices, ValidationResult, ValidationCache, duplicate_vertex_results
+
+plan_xid = 'c52aeb9d-34e2-4eca-b56b-e3f3752c94dd'
+bereich_xid = 'd52aeb9d-34e2-4eca-b56b-e3f3752c94dd'
+
+
+def wkb(wkt: str) -> bytes:
+    return shapely.to_wkb(shapely.from_wkt(wkt))
+
+
+def objekt(xid: str, wkt: str, flaechenschluss=True) -> ValidationFeature:
+    return ValidationFeature(xid, BP_BaugebietsTeilFlaeche, wkb(wkt), parent_xid=bereich_xid,
+                             flaechenschluss=flaechenschluss)
+
+
+def engine(*objects: ValidationFeature, bereich='POLYGON ((0 0, 10 0, 10 10, 0 10, 0 0))') -> GeometryValidationEngine:
+    plan = ValidationFeature(plan_xid, BP_Plan, wkb('POLYGON ((0 0, 10 0, 10 10, 0 10, 0 0))'))
+    bereiche = [ValidationFeature(bereich_xid, BP_Bereich, wkb(bereich))]
+    return GeometryValidationEngine(plan, bereiche, objects)
+
+
+class TestGeometryValidationEngine:
+
+    def test_valid_plan(self):
+        e = engine(
+            objekt('a', 'POLYGON ((0 0, 5 0, 5 10, 0 10, 0 0))'),
+            objekt('b', 'POLYGON ((5 0, 10 0, 10 10, 5 10, 5 0))')
+        )
+
+        assert e.validate() == []
+
+    def test_bereich_outside_plan(self):
+        results = engine(bereich='POLYGON ((0 0, 11 0, 11 10, 0 10, 0 0))').validate_within_bounds()
+
+        assert len(results) == 1
+        assert results[0].xid == bereich_xid
+        assert results[0].intersection_type == GeometryIntersectionType.Plan
+
+    def test_objekt_outside_bereich(self):
+        results = engine(objekt('a', 'POLYGON ((5 0, 12 0, 12 10, 5 10, 5 0))')).validate_within_bounds()
+
+        assert len(results) == 1
+        assert results[0].intersection_type == GeometryIntersectionType.Bereich
+        assert results[0].other_xid == bereich_xid
+
+    def test_invalid_geometry(self):
+        results = engine(objekt('a', 'POLYGON ((0 0, 2 2, 0 2, 2 0, 0 0))')).validate_within_bounds()
+
+        assert len(results) == 1
+        assert 'Self-intersection' in results[0].error_msg
+
+    def test_overlaps(self):
+        results = engine(
+            objekt('b', 'POLYGON ((4 0, 10 0, 10 10, 4 10, 4 0))'),
+            objekt('a', 'POLYGON ((0 0, 6 0, 6 10, 0 10, 0 0))'),
+            # no flaechenschluss, not considered
+            objekt('c', 'POLYGON ((0 0, 6 0, 6 10, 0 10, 0 0))', flaechenschluss=False)
+        ).validate_overlaps()
+
+        assert len(results) == 1
+        assert (results[0].xid, results[0].other_xid) == ('a', 'b')
+        assert shapely.from_wkt(results[0].geom_wkt).equals(shapely.box(4, 0, 6, 10))
+
+    def test_not_covered(self):
+        results = engine(objekt('a', 'POLYGON ((0 0, 5 0, 5 10, 0 10, 0 0))')).validate_coverage()
+
+        assert len(results) == 1
+        assert results[0].xid == plan_xid
+        assert results[0].intersection_type == GeometryIntersectionType.NotCovered
+        assert shapely.from_wkt(results[0].geom_wkt).equals(shapely.box(5, 0, 10, 10))
+
+    def test_duplicate_vertices(self):
+        results = engine(
+            objekt('a', 'POLYGON ((0 0, 5 0, 5 0, 5 10, 0 10, 0 0))'),
+            objekt('b', 'POLYGON ((5 0, 10 0, 10 10, 5 10, 5 0))')
+        ).validate_duplicate_vertices()
+
+        assert [r.xid for r in results] == ['a']
+        assert shapely.from_wkt(results[0].geom_wkt).equals(shapely.from_wkt('MULTIPOINT (5 0)'))
+        assert '(5.0 0.0)' in results[0].error_msg
+
+    def test_missing_geometry(self):
+        e = engine(ValidationFeature('a', BP_BaugebietsTeilFlaeche, None, parent_xid=bereich_xid,
+                                     flaechenschluss=True))
+
+        assert e.validate_within_bounds() == []
+        assert e.validate_overlaps() == []
+
+    @pytest.mark.parametrize('count', [100, 2500])
+    def test_overlaps_grid(self, count):
+        size = int(np.sqrt(count))
+        objects = [objekt(f'{x:04}{y:04}', shapely.box(x, y, x + 1.1, y + 1).wkt)
+                   for x in range(size) for y in range(size)]
+
+        results = engine(*objects, bereich=shapely.box(0, 0, size + 1, size).wkt).validate_overlaps()
+
+        # every column overlaps its right neighbour
+        assert len(results) == (size - 1) * size
+
+
+class TestDuplicateVertices:
+
+    def test_results_per_object(self):
+        features = [
+            objekt('a', 'MULTILINESTRING ((0 0, 1 1, 1 1), (5 5, 6 6, 6 6))'),
+            objekt('b', 'POLYGON ((0 0, 4 0, 4 4, 4 4, 0 4, 0 0), (1 1, 1 1, 2 1, 2 2, 1 1))'),
+            objekt('c', 'POLYGON ((0 0, 4 0, 4 4, 0 4, 0 0))')
+        ]
+
+        results = duplicate_vertex_results(features)
+
+        assert [r.xid for r in results] == ['a', 'b']
+        assert shapely.from_wkt(results[0].geom_wkt).equals(shapely.from_wkt('MULTIPOINT (1 1, 6 6)'))
+        assert shapely.from_wkt(results[1].geom_wkt).equals(shapely.from_wkt('MULTIPOINT (4 4, 1 1)'))
+
+    def test_positions_limited_in_message(self):
+        coords = ', '.join(f'{i} 0, {i} 0' for i in range(8))
+        results = duplicate_vertex_results([objekt('a', f'LINESTRING ({coords})')])
+
+        assert len(shapely.get_parts(shapely.from_wkt(results[0].geom_wkt))) == 8
+        assert results[0].error_msg.endswith('und 3 weitere')
+
+    def test_positions(self):
+        geometries = shapely.from_wkt([
+            'LINESTRING (0 0, 1 1, 1 1, 2 2)',
+            'POLYGON ((0 0, 4 0, 4 4, 0 4, 0 0), (1 1, 1 1, 2 1, 2 2, 1 1))',
+            'POINT (1 1)',
+            None
+        ])
+
+        owners, coords = duplicate_vertices(geometries)
+
+        assert owners.tolist() == [0, 1]
+        assert coords.tolist() == [[1, 1], [1, 1]]
+
+    def test_ring_closure_not_duplicate(self):
+        geometries = shapely.from_wkt(['MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)), ((0 0, 1 0, 1 1, 0 0)))'])
+
+        owners, coords = duplicate_vertices(geometries)
+
+        assert len(owners) == 0
+
+
+def result_key(r: ValidationResult):
+    return r.xid, str(r.other_xid), str(r.intersection_type), str(r.error_msg), r.geom_wkt
+
+
+class TestGeometryValidationEngine_incremental:
+
+    @pytest.fixture()
+    def objects(self):
+        return [
+            objekt('a', 'POLYGON ((0 0, 4 0, 4 10, 0 10, 0 0))'),
+            objekt('b', 'POLYGON ((4 0, 8 0, 8 10, 4 10, 4 0))'),
+            objekt('c', 'POLYGON ((8 0, 10 0, 10 10, 8 10, 8 0))'),
+            objekt('d', 'POLYGON ((0 0, 1 0, 1 0, 1 1, 0 0))', flaechenschluss=False)
+        ]
+
+    def test_first_validation(self, objects):
+        e = engine(*objects)
+
+        snapshot = e.validate_incremental(None)
+
+        assert sorted(map(result_key, snapshot.results)) == sorted(map(result_key, e.validate()))
+        assert snapshot.fingerprints.keys() == {plan_xid, bereich_xid, 'a', 'b', 'c', 'd'}
+
+    def test_unchanged(self, mocker, objects):
+        snapshot = engine(*objects).validate_incremental(None)
+        e = engine(*objects)
+        overlaps = mocker.spy(e, 'validate_overlaps')
+
+        result = e.validate_incremental(snapshot)
+
+        assert overlaps.call_count == 0
+        assert result.results == snapshot.results
+
+    def test_changed_object(self, mocker, objects):
+        snapshot = engine(*objects).validate_incremental(None)
+        objects[1] = objekt('b', 'POLYGON ((3 0, 9 0, 9 11, 3 10, 3 0))')
+        e = engine(*objects)
+        duplicates = mocker.spy(e, 'validate_duplicate_vertices')
+
+        result = e.validate_incremental(snapshot)
+
+        assert sorted(map(result_key, result.results)) == sorted(map(result_key, e.validate()))
+        assert {(r.xid, r.other_xid) for r in result.results if r.intersection_type == GeometryIntersectionType.Planinhalt} \
+            == {('a', 'b'), ('b', 'c')}
+        # 'd' is unchanged, its duplicate vertex is taken from the previous result
+        assert duplicates.call_args_list[0].args[0].tolist() == [1]
+
+    def test_removed_object(self, objects):
+        objects[1] = objekt('b', 'POLYGON ((3 0, 9 0, 9 10, 3 10, 3 0))')
+        snapshot = engine(*objects).validate_incremental(None)
+        del objects[1]
+        e = engine(*objects)
+
+        result = e.validate_incremental(snapshot)
+
+        assert sorted(map(result_key, result.results)) == sorted(map(result_key, e.validate()))
+        assert not any(r.intersection_type == GeometryIntersectionType.Planinhalt for r in result.results)
+
+    def test_changed_bereich(self, mocker, objects):
+        snapshot = engine(*objects).validate_incremental(None)
+        e = engine(*objects, bereich='POLYGON ((0 0, 9 0, 9 10, 0 10, 0 0))')
+        validate = mocker.spy(e, 'validate')
+
+        result = e.validate_incremental(snapshot)
+
+        assert validate.call_count == 1
+        assert any(r.intersection_type == GeometryIntersectionType.Bereich for r in result.results)
+
+
+class TestValidationCache:
+
+    @pytest.fixture()
+    def cache(self) -> ValidationCache:
+        cache = ValidationCache()
+        yield cache
+
+        cache.clear()
+
+    def test_invalidate(self, mocker, cache):
+        objects = [objekt('a', 'POLYGON ((0 0, 5 0, 5 10, 0 10, 0 0))'),
+                   objekt('b', 'POLYGON ((5 0, 10 0, 10 10, 5 10, 5 0))')]
+        cache.validate(engine(*objects))
+
+        cache.invalidate('a')
+        e = engine(*objects)
+        within_bounds = mocker.spy(e, 'validate_within_bounds')
+
+        assert cache.validate(e) == []
+        assert within_bounds.call_args.args[0].tolist() == [0]
+
+    def test_invalidate_plan(self, cache):
+        cache.validate(engine())
+
+        cache.invalidate(plan_xid)
+
+        assert plan_xid not in cache.snapshots
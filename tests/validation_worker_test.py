@@ -0,0 +1,80 @@
+import subprocess
+
+import shapely
+
+from SAGisXPlanung.BPlan.BP_Basisobjekte.feature_types import BP_Plan, BP_Bereich
+from SAGisXPlanung.BPlan.BP_Bebauung.feature_types import BP_BaugebietsTeilFlaeche
+from SAGisXPlanung.core.validation import GeometryValidationEngine, ValidationFeature
+from SAGisXPlanung.validation_worker import encode_task, run_task, decode_results, WorkerValidationEngine, \
+    validate_parallel
+
+plan_xid = 'c52aeb9d-34e2-4eca-b56b-e3f3752c94dd'
+bereich_xid = 'd52aeb9d-34e2-4eca-b56b-e3f3752c94dd'
+
+
+def grid_engine(size: int, engine_class=GeometryValidationEngine) -> GeometryValidationEngine:
+    objects = [ValidationFeature(f'{x:04}{y:04}', BP_BaugebietsTeilFlaeche,
+                                 shapely.to_wkb(shapely.box(x, y, x + 1.1, y + 1)),
+                                 parent_xid=bereich_xid, flaechenschluss=True)
+               for x in range(size) for y in range(size)]
+    plan = ValidationFeature(plan_xid, BP_Plan, shapely.to_wkb(shapely.box(0, 0, size + 2, size)))
+    bereiche = [ValidationFeature(bereich_xid, BP_Bereich, shapely.to_wkb(shapely.box(0, 0, size + 1, size)))]
+    return engine_class(plan, bereiche, objects)
+
+
+def result_key(r):
+    return r.xid, r.xtype, str(r.other_xid), r.other_xtype, str(r.intersection_type), str(r.error_msg), r.geom_wkt
+
+
+class TestValidationWorker:
+
+    def test_chunks_equal_full_validation(self):
+        engine = grid_engine(10)
+        tasks = [encode_task(engine, range(0, 45), plan_checks=True),
+                 encode_task(engine, range(45, 100), plan_checks=False)]
+
+        results = [r for task in tasks for r in decode_results(engine, run_task(task))]
+
+        # overlaps between objects of both chunks are reported by both tasks
+        assert set(map(result_key, results)) == set(map(result_key, engine.validate()))
+
+    def test_result_types(self):
+        engine = grid_engine(2)
+
+        results = decode_results(engine, run_task(encode_task(engine, range(0, 4), plan_checks=True)))
+
+        assert {r.xtype for r in results} == {BP_BaugebietsTeilFlaeche, BP_Plan}
+
+    def test_small_plan_in_process(self, mocker):
+        validate_parallel = mocker.patch('SAGisXPlanung.validation_worker.validate_parallel')
+
+        grid_engine(2, WorkerValidationEngine).validate()
+
+        validate_parallel.assert_not_called()
+
+    def test_fallback(self, mocker):
+        mocker.patch('SAGisXPlanung.validation_worker.PARALLEL_MIN_OBJECTS', 1)
+        mocker.patch('SAGisXPlanung.validation_worker.validate_parallel', side_effect=OSError)
+        engine = grid_engine(3, WorkerValidationEngine)
+
+        assert set(map(result_key, engine.validate())) == set(map(result_key, grid_engine(3).validate()))
+
+    def test_fallback_on_timeout(self, mocker):
+        mocker.patch('SAGisXPlanung.validation_worker.PARALLEL_MIN_OBJECTS', 1)
+        mocker.patch('SAGisXPlanung.validation_worker.validate_parallel',
+                     side_effect=subprocess.TimeoutExpired('python', 1))
+        engine = grid_engine(3, WorkerValidationEngine)
+
+        assert set(map(result_key, engine.validate())) == set(map(result_key, grid_engine(3).validate()))
+
+
+class TestValidationWorker_validateParallel:
+
+    def test_worker_processes(self):
+        engine = grid_engine(6)
+
+        results = validate_parallel(engine, processes=2)
+
+        # overlaps between both chunks are reported once
+        assert len(results) == len(engine.validate())
+        assert set(map(result_key, results)) == set(map(result_key, engine.validate()))